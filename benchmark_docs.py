@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Benchmark the document generators and helpers
+"""
+
+import argparse
+import datetime
+import functools
+import gc
+import importlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import docx
+
+from build_docs import GENERATORS, output_paths
+from build_telemetry import git_commit
+from doc_helpers import (new_document, register_styles, add_heading, add_paragraph,
+                         add_code_block, add_table_with_header)
+from doc_model import ModelDocument, render_outputs
+from docx_package import COMPRESSION_PROFILES, document_bytes
+from streaming_docx import StreamingDocument
+
+DEFAULT_HISTORY = 'benchmark_history.json'
+DEFAULT_SCALES = (10, 100, 1000)
+
+# Size of the unscaled synthetic workload
+BASE_SECTIONS = 2
+BASE_ROWS = 10
+BASE_LINES = 10
+
+def synthetic_section(doc, index, rows, lines):
+    """Add one synthetic section shaped like a generator test case"""
+    add_heading(doc, f'{index}. Synthetic Test Case {index}', 1)
+    add_paragraph(doc, 'Objective:', bold=True)
+    add_paragraph(doc, 'Validate cluster behaviour when a synthetic node fails and rejoins.')
+    for step in range(5):
+        doc.add_paragraph(f'Step {step}: perform synthetic action {step}', style='List Bullet')
+    add_code_block(doc, '\n'.join(f'rabbitmqctl -n rabbit@node{i % 3 + 1} cluster_status'
+                                  for i in range(lines)))
+    add_table_with_header(doc, ['Test Case', 'Status', 'Duration', 'Notes'],
+                          [[f'TC{i}', 'Pass', f'{i % 60}.{i % 1000:03d}s', ''] for i in range(rows)])
+    doc.add_page_break()
+
+def synthetic_document(doc, sections=BASE_SECTIONS, rows=BASE_ROWS, lines=BASE_LINES):
+    """Fill doc with a synthetic workload"""
+    for index in range(sections):
+        synthetic_section(doc, index + 1, rows, lines)
+    return doc
+
+def generator_case(name, backend):
+    """Build and save one real document end to end"""
+    module_name, func_name, _output = GENERATORS[name]
+    module = importlib.import_module(module_name)
+    create = getattr(module, func_name)
+
+    def run(tmpdir):
+        if backend == 'stream':
+            create(doc=StreamingDocument(os.path.join(tmpdir, 'out.docx'))).save()
+        elif backend == 'formats':
+            model = create(doc=ModelDocument())
+            model.close()
+            paths = output_paths('out.docx', tmpdir, ('docx', 'md', 'html'))
+            render_outputs(model.blocks, paths, new_document())[0].save(paths['docx'])
+        else:
+            create().save(io.BytesIO())
+    return run
+
+def synthetic_case(backend, **sizes):
+    """Build and save a synthetic document end to end"""
+    def run(tmpdir):
+        if backend == 'stream':
+            synthetic_document(StreamingDocument(os.path.join(tmpdir, 'out.docx')), **sizes).save()
+        else:
+            synthetic_document(new_document(), **sizes).save(io.BytesIO())
+    return run
+
+def table_case(rows):
+    """Time add_table_with_header alone, on a fresh document each repeat"""
+    data = [[f'TC{i}', 'Pass', f'{i}.000s', ''] for i in range(rows)]
+    return new_document, lambda tmpdir, doc: add_table_with_header(
+        doc, ['Test Case', 'Status', 'Duration', 'Notes'], data)
+
+def code_block_case(lines):
+    """Time add_code_block alone, on a fresh document each repeat"""
+    text = '\n'.join(f'redis-cli -h 192.168.1.{101 + i % 3} INFO replication' for i in range(lines))
+    return new_document, lambda tmpdir, doc: add_code_block(doc, text)
+
+@functools.lru_cache(maxsize=1)
+def save_document(sections):
+    """The synthetic document save cases package; packaging leaves it unchanged, so they share it"""
+    return synthetic_document(new_document(), sections=sections)
+
+def save_case(profile, threads, sections):
+    """Time packaging a synthetic document alone, building it only when the case runs"""
+    levels = COMPRESSION_PROFILES[profile]
+    return (lambda: save_document(sections),
+            lambda tmpdir, doc: document_bytes(doc, levels, threads))
+
+def template_cases():
+    """Per-document startup: parsing the default template against the cached copies"""
+    yield 'template.Document', lambda tmpdir: docx.Document()
+    yield 'template.Document+register_styles', lambda tmpdir: register_styles(docx.Document())
+    yield 'template.new_document', lambda tmpdir: new_document()
+    yield 'template.new_document.private_styles', lambda tmpdir: new_document(private_styles=True)
+    yield ('template.StreamingDocument',
+           lambda tmpdir: StreamingDocument(os.path.join(tmpdir, 'out.docx')).close())
+
+def benchmark_cases(scales):
+    """Yield (name, callable) for every benchmark"""
+    yield from template_cases()
+    for name in GENERATORS:
+        for backend in ('docx', 'stream', 'formats'):
+            yield f'generator.{name}.{backend}', generator_case(name, backend)
+
+    for rows in (BASE_ROWS,) + tuple(BASE_ROWS * scale for scale in scales):
+        yield f'helper.add_table_with_header.rows={rows}', table_case(rows)
+    for lines in (BASE_LINES,) + tuple(BASE_LINES * scale for scale in scales):
+        yield f'helper.add_code_block.lines={lines}', code_block_case(lines)
+
+    # Scale outermost, so each save document is built once and one is alive at a time
+    for scale in (1,) + scales:
+        for profile in COMPRESSION_PROFILES:
+            for threads in sorted({1, os.cpu_count() or 1}):
+                yield (f'save.{profile}.threads={threads}.sections_x{scale}',
+                       save_case(profile, threads, BASE_SECTIONS * scale))
+
+    for backend in ('docx', 'stream'):
+        yield f'synthetic.base.{backend}', synthetic_case(backend)
+        for scale in scales:
+            yield (f'synthetic.sections_x{scale}.{backend}',
+                   synthetic_case(backend, sections=BASE_SECTIONS * scale))
+            yield (f'synthetic.rows_x{scale}.{backend}',
+                   synthetic_case(backend, rows=BASE_ROWS * scale))
+            yield (f'synthetic.lines_x{scale}.{backend}',
+                   synthetic_case(backend, lines=BASE_LINES * scale))
+
+def time_case(case, repeat, tmpdir):
+    """Run case repeat times and return the individual timings
+
+    case is a function of tmpdir, or a (setup, run) pair: setup() runs
+    untimed before every repeat and run(tmpdir, state) gets its result.
+    """
+    setup, func = case if isinstance(case, tuple) else (None, case)
+    timings = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        gc.collect()
+        start = time.perf_counter()
+        if setup:
+            func(tmpdir, state)
+        else:
+            func(tmpdir)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def load_history(path):
+    """Load the benchmark history, oldest run first"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+def save_history(path, history):
+    """Write the benchmark history atomically"""
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp, path)
+
+def print_results(results, previous=None):
+    """Print the results, with the change against a previous run if given"""
+    baseline = previous['results'] if previous else {}
+    label = f" vs {previous.get('commit') or previous['timestamp']}" if previous else ''
+    print(f"{'Benchmark':<52} {'Min':>10} {'Median':>10}  Change{label}")
+    for name, result in results.items():
+        change = ''
+        if name in baseline:
+            delta = result['min'] / baseline[name]['min'] - 1
+            change = f'{delta:+.1%}'
+        print(f"{name:<52} {result['min'] * 1000:>8.2f}ms {result['median'] * 1000:>8.2f}ms  {change}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the document generators')
+    parser.add_argument('-k', '--filter', default='',
+                        help='only run benchmarks whose name contains this text')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='timed runs per benchmark (default: 3)')
+    parser.add_argument('--scales', default=','.join(map(str, DEFAULT_SCALES)),
+                        help='comma-separated synthetic scale factors (default: 10,100,1000)')
+    parser.add_argument('--history', default=DEFAULT_HISTORY,
+                        help=f'JSON history file (default: {DEFAULT_HISTORY})')
+    parser.add_argument('--no-save', action='store_true',
+                        help='do not append this run to the history file')
+    parser.add_argument('--list', action='store_true', help='list benchmarks and exit')
+    args = parser.parse_args(argv)
+
+    scales = tuple(int(scale) for scale in args.scales.split(',') if scale)
+    cases = [(name, func) for name, func in benchmark_cases(scales) if args.filter in name]
+    if args.list:
+        for name, _func in cases:
+            print(name)
+        return 0
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name, func in cases:
+            time_case(func, 1, tmpdir)  # warm up imports and caches
+            timings = time_case(func, args.repeat, tmpdir)
+            results[name] = {
+                'min': min(timings),
+                'median': statistics.median(timings),
+                'runs': timings,
+            }
+
+    history = load_history(args.history)
+    print_results(results, history[-1] if history else None)
+
+    if not args.no_save:
+        history.append({
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'python_docx': docx.__version__,
+            'repeat': args.repeat,
+            'results': results,
+        })
+        save_history(args.history, history)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
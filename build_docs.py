@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Build all generated documentation in parallel
+"""
+
+import argparse
+import importlib
+import os
+import re
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Imported here so forked workers inherit an already-loaded python-docx
+import docx  # noqa: F401
+
+from build_telemetry import (DEFAULT_LOG, append_records, build_records, output_metrics,
+                             peak_rss_kib, reset_peak_rss)
+from doc_drift import check_drift, document_pairs
+from doc_helpers import new_document
+from doc_model import ModelDocument, render_outputs
+from docx_package import COMPRESSION_PROFILES, save_document
+from section_cache import DEFAULT_CACHE_DIR, SectionCache, select_sections
+from section_profile import SectionProfiler, folded_stacks, format_report
+from streaming_docx import StreamingDocument
+
+BACKENDS = ('docx', 'stream')
+FORMATS = ('docx', 'md', 'html')
+
+# The hand-maintained runbooks share some .md names with the generator outputs
+FORMAT_SUFFIXES = {'docx': '.docx', 'md': '.generated.md', 'html': '.html'}
+
+# name -> (generator module, generator function, output file)
+GENERATORS = {
+    'rabbitmq': ('create_rabbitmq_doc', 'create_rabbitmq_document',
+                 'RabbitMQ_4.1.x_RHEL8_Installation_Guide.docx'),
+    'redis': ('create_redis_doc', 'create_redis_document',
+              'Redis_8.x_RHEL8_Installation_Guide.docx'),
+    'failover': ('create_rabbitmq_failover_doc', 'create_failover_document',
+                 'RabbitMQ_Cluster_Failover_Test_Cases.docx'),
+}
+
+def output_paths(output, output_dir, formats):
+    """{format: path} for a generator output in each requested format"""
+    stem = os.path.join(output_dir, os.path.splitext(output)[0])
+    return {fmt: stem + FORMAT_SUFFIXES[fmt] for fmt in formats}
+
+def build_model(name, output_dir, formats, backend='docx', compression='default'):
+    """Build a document model once and render it to every requested format"""
+    module_name, func_name, output = GENERATORS[name]
+    paths = output_paths(output, output_dir, formats)
+
+    reset_peak_rss()
+    start = time.perf_counter()
+    model = getattr(importlib.import_module(module_name), func_name)(doc=ModelDocument())
+    model.close()
+    built = time.perf_counter()
+    doc = None
+    if 'docx' in paths:
+        doc = StreamingDocument(paths['docx']) if backend == 'stream' else new_document()
+    title = next((block.text for block in model.blocks if getattr(block, 'style', None) == 'Title'), name)
+    doc, changed = render_outputs(model.blocks, paths, doc, title)
+    if doc is not None:
+        changed = save_document(doc, paths['docx'], COMPRESSION_PROFILES[compression]) or changed
+    saved = time.perf_counter()
+
+    return {
+        'name': name,
+        'output': ', '.join(paths.values()),
+        'build': built - start,
+        'save': saved - built,
+        'total': saved - start,
+        'cached': '-',
+        'changed': changed,
+        'profile': None,
+        'metrics': dict(output_metrics(paths.values()), peak_rss_kib=peak_rss_kib()),
+    }
+
+def build_one(name, output_dir, cache_dir=None, backend='docx', profile=False,
+              formats=('docx',), compression='default'):
+    """Build and save a single document, returning its timings"""
+    if tuple(formats) != ('docx',):
+        return build_model(name, output_dir, formats, backend, compression)
+    module_name, func_name, output = GENERATORS[name]
+    path = os.path.join(output_dir, output)
+    # The section cache splices python-docx elements, so it only applies there;
+    # profiles measure building the sections, not splicing cached copies
+    cache = SectionCache(cache_dir) if cache_dir and backend == 'docx' and not profile else None
+    profiler = SectionProfiler(name) if profile else None
+
+    reset_peak_rss()
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if profiler:
+        tracemalloc.start()
+    if backend == 'stream':
+        doc = getattr(module, func_name)(doc=StreamingDocument(path))
+    else:
+        doc = getattr(module, func_name)(cache=cache, profiler=profiler)
+    if profiler:
+        tracemalloc.stop()
+    built = time.perf_counter()
+    changed = save_document(doc, path, COMPRESSION_PROFILES[compression])
+    saved = time.perf_counter()
+
+    return {
+        'name': name,
+        'output': path,
+        'build': built - start,
+        'save': saved - built,
+        'total': saved - start,
+        'cached': f'{cache.hits}/{cache.hits + cache.misses}' if cache else '-',
+        'cache_hits': cache.hits if cache else None,
+        'cache_misses': cache.misses if cache else None,
+        'changed': changed,
+        'profile': profiler.records if profiler else None,
+        'metrics': dict(output_metrics([path]), peak_rss_kib=peak_rss_kib()),
+    }
+
+def build_all(names, output_dir='.', jobs=None, cache_dir=None, backend='docx',
+              profile=False, formats=('docx',), compression='default'):
+    """Build the named documents, in a process pool when jobs > 1"""
+    if jobs is None:
+        jobs = min(len(names), os.cpu_count() or 1)
+
+    if jobs <= 1:
+        return [build_one(name, output_dir, cache_dir, backend, profile, formats, compression)
+                for name in names]
+
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(build_one, name, output_dir, cache_dir, backend, profile, formats,
+                               compression)
+                   for name in names]
+        for future in as_completed(futures):
+            results.append(future.result())
+    results.sort(key=lambda result: names.index(result['name']))
+    return results
+
+def print_summary(results, wall):
+    """Print the per-document timing summary"""
+    print(f"{'Document':<10} {'Build':>8} {'Save':>8} {'Total':>8} {'Cached':>7}  Output")
+    for result in results:
+        print(f"{result['name']:<10} {result['build']:>7.3f}s {result['save']:>7.3f}s "
+              f"{result['total']:>7.3f}s {result['cached']:>7}  {result['output']}"
+              f"{'' if result['changed'] else ' (unchanged)'}")
+    serial = sum(result['total'] for result in results)
+    print(f'Wall time: {wall:.3f}s (serial sum {serial:.3f}s)')
+
+def write_profiles(results, stacks_path):
+    """Print each section profile and write the combined folded stacks"""
+    with open(stacks_path, 'w') as f:
+        for result in results:
+            print()
+            print(format_report(result['name'], result['profile']))
+            for line in folded_stacks(result['name'], result['profile']):
+                f.write(line + '\n')
+    print(f'\nFolded stacks written to {stacks_path}')
+
+def extract_path(output, sections):
+    """File name for an extract: the full output's name plus the selected section titles"""
+    # The title section is always selected; it names the extract only when it is alone
+    titles = [title for title, _func in sections[1:]] or [sections[0][0]]
+    slug = '_'.join(re.sub(r'\W+', '_', title).strip('_') for title in titles)
+    return f'{os.path.splitext(output)[0]}_{slug}.docx'
+
+def generator_main(create, sections, output, label, argv=None):
+    """Command line of a single generator module"""
+    parser = argparse.ArgumentParser(description=f'Generate the {label}')
+    parser.add_argument('--only', action='append', metavar='SECTION',
+                        help='build just this section after the title page; repeatable. '
+                             "Give a section number ('18'), its title, or a unique part of it")
+    parser.add_argument('--list-sections', action='store_true', help='list the sections and exit')
+    parser.add_argument('-o', '--output',
+                        help=f'file to write (default: {output}, or a name derived from '
+                             'the --only sections)')
+    args = parser.parse_args(argv)
+
+    if args.list_sections:
+        for title, _func in sections:
+            print(title)
+        return 0
+    if args.only:
+        try:
+            output = extract_path(output, select_sections(sections, args.only))
+        except ValueError as e:
+            parser.error(str(e))
+    output = args.output or output
+
+    reset_peak_rss()
+    start = time.perf_counter()
+    doc = create(only=args.only)
+    built = time.perf_counter()
+    changed = save_document(doc, output)
+    saved = time.perf_counter()
+    names = [name for name, (_module, func_name, _output) in GENERATORS.items()
+             if func_name == create.__name__]
+    if names and not args.only:
+        # Extracts are not comparable with full builds, so only full builds are logged
+        result = {'name': names[0], 'build': built - start, 'save': saved - built,
+                  'total': saved - start,
+                  'metrics': dict(output_metrics([output]), peak_rss_kib=peak_rss_kib())}
+        append_records(DEFAULT_LOG, build_records([result], 'docx', ('docx',), 'default'))
+    if changed:
+        print(f'{label} created successfully!')
+    else:
+        print(f'{label} unchanged, file not rewritten')
+    if args.only:
+        print(f'{output} ({saved - start:.3f}s)')
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the generated .docx guides')
+    parser.add_argument('documents', nargs='*', metavar='DOCUMENT',
+                        help=f"documents to build: {', '.join(GENERATORS)} (default: all)")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: one per document)')
+    parser.add_argument('-o', '--output-dir', default='.',
+                        help='directory to write the .docx files to')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help=f'section cache directory (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='render every section from scratch')
+    parser.add_argument('--backend', choices=BACKENDS, default='docx',
+                        help='docx builds the python-docx object tree; stream writes '
+                             'document.xml as it is generated (no section cache)')
+    parser.add_argument('--formats', default='docx',
+                        help='comma-separated output formats: docx, md, html (default: docx); '
+                             'more than docx builds a document model once and renders it '
+                             'to all of them in one pass')
+    parser.add_argument('--compression', choices=list(COMPRESSION_PROFILES), default='default',
+                        help='per-part deflate levels: draft is fastest, publish smallest '
+                             '(docx backend only; default: default)')
+    parser.add_argument('--watch', action='store_true',
+                        help='after building, stay running and rebuild outputs whose '
+                             'generator or Markdown source changes')
+    parser.add_argument('--check-drift', nargs='?', const='content', choices=('content', 'structure'),
+                        help='after building, compare each guide with the Markdown runbook of the '
+                             'same name and exit 1 if they differ; structure ignores changes '
+                             'within sections (default: content)')
+    parser.add_argument('--telemetry-log', default=DEFAULT_LOG,
+                        help='JSON-lines log each build appends its timings, peak RSS, output size '
+                             f'and item counts to (default: {DEFAULT_LOG}); check it with '
+                             'build_telemetry.py')
+    parser.add_argument('--no-telemetry', action='store_true', help='do not append to the telemetry log')
+    parser.add_argument('--profile', action='store_true',
+                        help='record time, allocations and item counts per section; '
+                             'sections are built without the cache')
+    parser.add_argument('--profile-stacks', default='build_profile.folded',
+                        help='folded stack file written by --profile '
+                             '(default: build_profile.folded)')
+    args = parser.parse_args(argv)
+
+    names = args.documents or list(GENERATORS)
+    unknown = [name for name in names if name not in GENERATORS]
+    if unknown:
+        parser.error(f"unknown document(s): {', '.join(unknown)}")
+    formats = tuple(fmt for fmt in args.formats.split(',') if fmt)
+    unknown = [fmt for fmt in formats if fmt not in FORMATS]
+    if unknown or not formats:
+        parser.error(f"unknown format(s): {', '.join(unknown) or args.formats!r}")
+    if args.profile and args.backend != 'docx':
+        parser.error('--profile requires the docx backend')
+    if args.compression != 'default' and args.backend != 'docx':
+        parser.error('--compression requires the docx backend')
+    if args.profile and formats != ('docx',):
+        parser.error('--profile only applies to docx-only builds')
+    if args.check_drift and 'docx' not in formats:
+        parser.error('--check-drift compares the .docx outputs')
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    cache_dir = None if args.no_cache else args.cache_dir
+    results = build_all(names, args.output_dir, args.jobs, cache_dir, args.backend, args.profile,
+                        formats, args.compression)
+    print_summary(results, time.perf_counter() - start)
+    if not args.no_telemetry and not args.profile:
+        append_records(args.telemetry_log, build_records(results, args.backend, formats,
+                                                         args.compression))
+    if args.profile:
+        write_profiles(results, args.profile_stacks)
+    drifted = 0
+    if args.check_drift:
+        built = {os.path.join(args.output_dir, GENERATORS[name][2]) for name in names}
+        pairs = [pair for pair in document_pairs(args.output_dir) if pair[1] in built]
+        print()
+        drifted = check_drift(pairs, structure_only=args.check_drift == 'structure')
+        print(f'{drifted} of {len(pairs)} guide(s) drifted from their runbooks')
+    if args.watch:
+        # Imported here because watch_docs imports this module
+        from watch_docs import watch
+        return watch(names, None, args.output_dir, cache_dir, args.backend, formats,
+                     args.compression, check_drift=args.check_drift, drifted=drifted)
+    return 1 if drifted else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Build telemetry log and regression check for the generated guides
+"""
+
+import argparse
+import datetime
+import json
+import os
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import zipfile
+
+DEFAULT_LOG = 'build_telemetry.jsonl'
+DEFAULT_WINDOW = 10
+DEFAULT_MIN_RUNS = 3
+
+# Allowed increase over the rolling baseline, in percent
+DEFAULT_THRESHOLDS = {
+    'total': 25.0,
+    'peak_rss_kib': 10.0,
+    'bytes': 5.0,
+    'paragraphs': 5.0,
+    'runs': 5.0,
+    'tables': 5.0,
+}
+METRICS = tuple(DEFAULT_THRESHOLDS)
+
+# Builds are only compared with builds of the same kind; 'cache' is the
+# section cache state from cache_state(), since warm builds are several
+# times faster than cold ones
+KEY_FIELDS = ('name', 'backend', 'formats', 'compression', 'cache')
+
+_ITEM = re.compile(rb'<w:(p|r|tbl)[ >/]')
+
+def git_commit():
+    """Current commit id, or None outside a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def reset_peak_rss():
+    """Start a new peak RSS window for this process, where Linux allows it"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def peak_rss_kib():
+    """Peak resident set size since the last reset_peak_rss(), in KiB
+
+    Falls back to the process-lifetime peak where /proc is unavailable.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def docx_counts(path):
+    """(paragraphs, runs, tables) in a .docx body, counted on the raw XML"""
+    counts = {b'p': 0, b'r': 0, b'tbl': 0}
+    with zipfile.ZipFile(path) as package:
+        for match in _ITEM.finditer(package.read('word/document.xml')):
+            counts[match.group(1)] += 1
+    return counts[b'p'], counts[b'r'], counts[b'tbl']
+
+def output_metrics(paths):
+    """Byte size of the outputs plus item counts of the .docx, if one was built"""
+    metrics = {'bytes': sum(os.path.getsize(path) for path in paths)}
+    docx_paths = [path for path in paths if path.endswith('.docx')]
+    if docx_paths:
+        metrics['paragraphs'], metrics['runs'], metrics['tables'] = docx_counts(docx_paths[0])
+    return metrics
+
+def cache_state(hits, misses):
+    """'off', 'cold', 'partial' or 'warm' for a build's section cache lookups"""
+    if hits is None:
+        return 'off'
+    if not hits:
+        return 'cold'
+    return 'warm' if not misses else 'partial'
+
+def build_records(results, backend, formats, compression):
+    """Telemetry records for a list of build_docs results"""
+    context = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'backend': backend,
+        'formats': ','.join(formats),
+        'compression': compression,
+    }
+    records = []
+    for result in results:
+        hits, misses = result.get('cache_hits'), result.get('cache_misses')
+        looked_up = (hits or 0) + (misses or 0)
+        record = dict(context, name=result['name'], build=result['build'], save=result['save'],
+                      total=result['total'], cache=cache_state(hits, misses),
+                      cache_hit_ratio=hits / looked_up if looked_up else None)
+        record.update(result.get('metrics') or {})
+        records.append(record)
+    return records
+
+def append_records(path, records):
+    """Append records to the JSON-lines log"""
+    with open(path, 'a') as f:
+        for record in records:
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+
+def load_records(path):
+    """All records in the log, oldest first; unreadable lines are skipped"""
+    records = []
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return records
+
+def build_key(record):
+    return tuple(record.get(field) for field in KEY_FIELDS)
+
+def check_regressions(records, thresholds=DEFAULT_THRESHOLDS, window=DEFAULT_WINDOW,
+                      min_runs=DEFAULT_MIN_RUNS):
+    """Compare the latest record of each kind of build with the median of the ones before it
+
+    Returns (rows, regressions) where each row is (record, metric, value,
+    baseline, change) and regressions are the rows over their threshold.
+    Kinds with fewer than min_runs earlier records are skipped.
+    """
+    by_key = {}
+    for record in records:
+        by_key.setdefault(build_key(record), []).append(record)
+
+    rows, regressions = [], []
+    for history in by_key.values():
+        latest, earlier = history[-1], history[-1 - window:-1]
+        if len(earlier) < min_runs:
+            continue
+        for metric, threshold in thresholds.items():
+            values = [record[metric] for record in earlier if record.get(metric) is not None]
+            if latest.get(metric) is None or len(values) < min_runs:
+                continue
+            baseline = statistics.median(values)
+            change = (latest[metric] / baseline - 1) * 100 if baseline else 0.0
+            row = (latest, metric, latest[metric], baseline, change)
+            rows.append(row)
+            if change > threshold:
+                regressions.append(row)
+    return rows, regressions
+
+def format_value(metric, value):
+    if metric in ('build', 'save', 'total'):
+        return f'{value * 1000:.1f}ms'
+    if metric == 'bytes':
+        return f'{value / 1024:.1f}KiB'
+    if metric == 'peak_rss_kib':
+        return f'{value / 1024:.1f}MiB'
+    return f'{value:g}'
+
+def parse_thresholds(overrides, default=None):
+    """DEFAULT_THRESHOLDS with a global default and METRIC=PCT overrides applied"""
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    if default is not None:
+        thresholds = {metric: default for metric in thresholds}
+    for override in overrides or ():
+        metric, _, value = override.partition('=')
+        if metric not in thresholds:
+            raise ValueError(f"unknown metric {metric!r}; choose from {', '.join(METRICS)}")
+        thresholds[metric] = float(value)
+    return thresholds
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Check the latest builds against a rolling baseline of earlier ones')
+    parser.add_argument('--log', default=DEFAULT_LOG, help=f'telemetry log (default: {DEFAULT_LOG})')
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                        help=f'earlier builds in the baseline median (default: {DEFAULT_WINDOW})')
+    parser.add_argument('--min-runs', type=int, default=DEFAULT_MIN_RUNS,
+                        help=f'earlier builds needed before checking (default: {DEFAULT_MIN_RUNS})')
+    parser.add_argument('--threshold', type=float,
+                        help='allowed increase in percent for every metric (default: '
+                             + ', '.join(f'{metric} {pct:g}%' for metric, pct in
+                                         DEFAULT_THRESHOLDS.items()) + ')')
+    parser.add_argument('--metric', action='append', metavar='METRIC=PCT',
+                        help='allowed increase for one metric, e.g. total=50; repeatable')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='show every metric, not just regressions')
+    args = parser.parse_args(argv)
+
+    try:
+        thresholds = parse_thresholds(args.metric, args.threshold)
+    except ValueError as e:
+        parser.error(str(e))
+    records = load_records(args.log)
+    if not records:
+        print(f'No telemetry in {args.log}; build with build_docs.py first')
+        return 0
+
+    rows, regressions = check_regressions(records, thresholds, args.window, args.min_runs)
+    for record, metric, value, baseline, change in (rows if args.verbose else regressions):
+        flag = 'REGRESSION' if change > thresholds[metric] else 'ok'
+        print(f"{record['name']:<10} {record['backend']:<7} {metric:<13} "
+              f"{format_value(metric, value):>10} vs {format_value(metric, baseline):>10} "
+              f"{change:+7.1f}%  (limit +{thresholds[metric]:g}%)  {flag}")
+    checked = len({build_key(record) for record, *_rest in rows})
+    print(f'{len(regressions)} regression(s) across {checked} kind(s) of build '
+          f'({len(records)} records in {args.log})')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Catalog of the shell commands used in the runbooks and generated guides
+"""
+
+import argparse
+import difflib
+import marshal
+import os
+import re
+import shlex
+import struct
+import sys
+import zlib
+
+from search_docs import document_blocks, document_sources, file_hash, file_state, walk_sections
+
+DEFAULT_CATALOG = '.command_catalog'
+CATALOG_VERSION = 1
+
+# Lines not run through sudo only count as commands when their tool is
+# listed here or appears after sudo somewhere else
+KNOWN_TOOLS = {
+    'redis-cli', 'redis-server', 'redis-sentinel', 'redis-benchmark', 'redis-check-aof',
+    'redis-check-rdb', 'rabbitmqctl', 'rabbitmq-diagnostics', 'rabbitmq-plugins',
+    'rabbitmq-queues', 'rabbitmq-upgrade', 'rabbitmqadmin', 'systemctl', 'journalctl',
+    'firewall-cmd', 'sysctl', 'chronyc', 'timedatectl', 'getenforce', 'sestatus', 'curl',
+    'wget', 'nslookup', 'telnet', 'nc', 'ping', 'ss', 'netstat', 'free', 'df', 'ulimit',
+    'hostname', 'pidof', 'ps', 'top', 'iostat', 'vmstat', 'tar', 'make', 'python3', 'pip3',
+}
+
+# Tools whose first positional argument names what they do
+SUBCOMMAND_TOOLS = {
+    'rabbitmqctl', 'rabbitmq-diagnostics', 'rabbitmq-plugins', 'rabbitmq-queues',
+    'rabbitmq-upgrade', 'rabbitmqadmin', 'redis-cli', 'systemctl', 'dnf', 'yum', 'semanage',
+    'hostnamectl', 'timedatectl', 'tuned-adm', 'chronyc', 'sysctl', 'make',
+}
+
+# Subcommands that take a second word, e.g. "CONFIG SET" or "declare queue"
+TWO_WORD_SUBCOMMANDS = {
+    'redis-cli': {'acl', 'client', 'cluster', 'config', 'debug', 'latency', 'memory', 'object',
+                  'script', 'sentinel', 'slowlog'},
+    'rabbitmqadmin': {'close', 'declare', 'delete', 'export', 'get', 'import', 'list', 'publish',
+                      'purge', 'show'},
+}
+
+# Redis commands are case-insensitive
+CASE_INSENSITIVE = {'redis-cli'}
+
+# Options that take a value, for tools with options before the subcommand
+VALUE_FLAGS = {
+    'sudo': {'-u', '-g'},
+    'watch': {'-n'},
+    'timeout': {'-s', '-k'},
+    'redis-cli': {'-h', '-p', '-a', '-n', '-u', '-r', '-i', '--user', '--pass'},
+    'rabbitmqctl': {'-n', '-p', '-t', '--node', '--vhost', '--timeout'},
+    'rabbitmq-diagnostics': {'-n', '-t', '--node', '--timeout'},
+    'rabbitmq-plugins': {'-n', '--node'},
+    'rabbitmq-queues': {'-n', '-p', '--node', '--vhost'},
+    'rabbitmq-upgrade': {'-n', '--node'},
+    'rabbitmqadmin': {'-H', '-P', '-u', '-p', '-V', '-f', '--host', '--port', '--username',
+                      '--password', '--vhost', '--format'},
+    'journalctl': {'-u', '-n', '-p', '--since', '--until'},
+}
+
+# Prefixes that run the command after them
+WRAPPERS = {'sudo', 'env', 'nohup', 'time', 'exec', 'timeout', 'watch'}
+SHELL_KEYWORDS = {'if', 'then', 'else', 'elif', 'while', 'until', 'do', '!'}
+SKIPPED_KEYWORDS = {'for', 'done', 'fi', 'case', 'esac', 'function', '[', '[[', '{', '}'}
+
+_SEPARATORS = {'|', '||', '&&', ';', ';;', '&', '(', ')', '$'}
+_REDIRECTS = {'>', '>>', '<', '<<', '<<<', '>&', '&>', '<&', '>|'}
+_FD_REDIRECT = re.compile(r'(?<![\w-])\d+(?=[<>])')
+_ASSIGNMENT = re.compile(r'^[A-Za-z_]\w*=')
+_SUBCOMMAND = re.compile(r'^[A-Za-z][\w.:-]*$')
+_HEADER = struct.Struct('<I')
+
+def logical_lines(text):
+    """Code block lines with backslash continuations joined"""
+    pending = ''
+    for line in text.splitlines():
+        stripped = line.rstrip()
+        if stripped.endswith('\\'):
+            pending += stripped[:-1] + ' '
+            continue
+        yield (pending + line).strip()
+        pending = ''
+    if pending.strip():
+        yield pending.strip()
+
+def split_commands(line):
+    """Token lists of the simple commands in a shell line, redirections removed"""
+    lexer = shlex.shlex(_FD_REDIRECT.sub('', line), posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    try:
+        tokens = list(lexer)
+    except ValueError:
+        # Unbalanced quotes: fall back to whitespace splitting
+        tokens = line.split('#', 1)[0].split()
+    commands, current, skip = [], [], False
+    for token in tokens:
+        if skip:
+            skip = False
+        elif token in _SEPARATORS:
+            if current:
+                commands.append(current)
+            current = []
+        elif token in _REDIRECTS:
+            skip = True
+        else:
+            current.append(token)
+    if current:
+        commands.append(current)
+    return commands
+
+def parse_command(tokens, known_tools, privileged=False):
+    """(tool, subcommand, flags) for each command in a token list
+
+    Wrappers such as sudo and watch are unwrapped; a quoted command given
+    to watch is parsed recursively. Commands are only reported when they
+    ran under sudo or their tool is in known_tools.
+    """
+    tokens = list(tokens)
+    while tokens and (tokens[0] in SHELL_KEYWORDS or _ASSIGNMENT.match(tokens[0])):
+        tokens.pop(0)
+    if not tokens or tokens[0] in SKIPPED_KEYWORDS:
+        return []
+    tool = os.path.basename(tokens[0])
+    if tool in WRAPPERS:
+        privileged = privileged or tool == 'sudo'
+        rest = _skip_options(tokens[1:], VALUE_FLAGS.get(tool, ()))
+        if tool == 'timeout' and rest:
+            rest = rest[1:]
+        if len(rest) == 1 and ' ' in rest[0]:
+            return [command for inner in split_commands(rest[0])
+                    for command in parse_command(inner, known_tools, privileged)]
+        return parse_command(rest, known_tools, privileged)
+    if not privileged and tool not in known_tools:
+        return []
+
+    flags, positional = [], []
+    value_flags = VALUE_FLAGS.get(tool, ())
+    args = iter(tokens[1:])
+    for arg in args:
+        if arg.startswith('-') and len(arg) > 1 and not arg[1:].isdigit():
+            flag = arg.split('=', 1)[0]
+            flags.append(flag)
+            if flag in value_flags and '=' not in arg and not positional:
+                next(args, None)
+        else:
+            positional.append(arg)
+
+    subcommand = ''
+    if tool in SUBCOMMAND_TOOLS and positional:
+        word = positional[0].split('=', 1)[0]
+        if _SUBCOMMAND.match(word):
+            subcommand = word.lower() if tool in CASE_INSENSITIVE else word
+            second = positional[1] if len(positional) > 1 else ''
+            if subcommand.lower() in TWO_WORD_SUBCOMMANDS.get(tool, ()) and _SUBCOMMAND.match(second):
+                subcommand += ' ' + (second.lower() if tool in CASE_INSENSITIVE else second)
+    return [(tool, subcommand, flags)]
+
+def _skip_options(tokens, value_flags):
+    """Tokens after a wrapper's own options"""
+    i = 0
+    while i < len(tokens) and tokens[i].startswith('-') and len(tokens[i]) > 1:
+        i += 2 if tokens[i] in value_flags else 1
+    return tokens[i:]
+
+def code_lines(name, blocks):
+    """(document, section, subsection, line) for every logical line of every code block"""
+    for _number, section, subsection, block in walk_sections(blocks):
+        if getattr(block, 'style', None) == 'Code':
+            for line in logical_lines(block.text):
+                if line and not line.startswith('#'):
+                    yield name, section, subsection, line
+
+def sudo_tools(lines):
+    """Tools that appear after sudo anywhere, so their unprefixed uses count too"""
+    tools = set()
+    for *_where, line in lines:
+        for tokens in split_commands(line):
+            for tool, _subcommand, _flags in parse_command(tokens, (), False):
+                tools.add(tool)
+    return tools
+
+def build_catalog(lines, known_tools=KNOWN_TOOLS):
+    """{tool: {subcommand: (count, {flag: count}, uses)}} from code lines
+
+    uses lists each distinct (document, section, subsection, line) once.
+    """
+    known = set(known_tools) | sudo_tools(lines)
+    catalog = {}
+    for name, section, subsection, line in lines:
+        for tokens in split_commands(line):
+            for tool, subcommand, flags in parse_command(tokens, known):
+                entry = catalog.setdefault(tool, {}).setdefault(subcommand, [0, {}, {}])
+                entry[0] += 1
+                for flag in flags:
+                    entry[1][flag] = entry[1].get(flag, 0) + 1
+                entry[2][(name, section, subsection, line)] = None
+    return {tool: {subcommand: (count, flags, tuple(uses))
+                   for subcommand, (count, flags, uses) in subcommands.items()}
+            for tool, subcommands in catalog.items()}
+
+class CommandCatalog:
+    """The catalog on disk: a small header, then one compressed record per tool
+
+    Opening a catalog reads only the header (tool names, counts and record
+    offsets); a tool's record is read and decompressed on first lookup.
+    """
+
+    def __init__(self, path=DEFAULT_CATALOG, root=None):
+        self.path = path
+        self.root = root or os.path.dirname(os.path.abspath(__file__))
+        self.header = None
+        self._records = {}
+        try:
+            with open(path, 'rb') as f:
+                (length,) = _HEADER.unpack(f.read(_HEADER.size))
+                header = marshal.loads(f.read(length))
+            if header.get('version') == CATALOG_VERSION and header.get('root') == self.root:
+                self.header = header
+        except (FileNotFoundError, EOFError, ValueError, TypeError, struct.error):
+            pass
+
+    def _stale(self):
+        for path, (state, digest) in self.header['deps'].items():
+            current = file_state(path)
+            if current != state and (current is None or file_hash(path) != digest):
+                return True
+        return False
+
+    def refresh(self, force=False):
+        """Rebuild the catalog if any source changed; True if it was rebuilt"""
+        if not force and self.header is not None and not self._stale():
+            return False
+        sources = document_sources(self.root)
+        deps = {path for _kind, _target, paths in sources.values() for path in paths
+                if os.path.exists(path)}
+        states = {path: (file_state(path), file_hash(path)) for path in sorted(deps)}
+        lines = [line for name, (kind, target, paths) in sources.items()
+                 if all(os.path.exists(path) for path in paths)
+                 for line in code_lines(name, document_blocks(kind, target, self.root))]
+        self.write(build_catalog(lines), states)
+        return True
+
+    def write(self, catalog, deps):
+        """Write a built catalog atomically and reopen it"""
+        records, tools, offset = [], {}, 0
+        for tool in sorted(catalog):
+            record = zlib.compress(marshal.dumps(catalog[tool]), 9)
+            count = sum(entry[0] for entry in catalog[tool].values())
+            tools[tool] = (offset, len(record), count, len(catalog[tool]))
+            records.append(record)
+            offset += len(record)
+        header = marshal.dumps({'version': CATALOG_VERSION, 'root': self.root,
+                                'deps': deps, 'tools': tools})
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(_HEADER.pack(len(header)))
+            f.write(header)
+            f.writelines(records)
+        os.replace(tmp, self.path)
+        self.__init__(self.path, self.root)
+
+    def tools(self):
+        """{tool: (invocations, subcommands)} without loading any records"""
+        return {tool: (count, subcommands)
+                for tool, (_offset, _length, count, subcommands) in self.header['tools'].items()}
+
+    def lookup(self, tool):
+        """{subcommand: (count, {flag: count}, uses)} for a tool, or None if unknown"""
+        if tool not in self._records:
+            location = self.header['tools'].get(tool)
+            if location is None:
+                return None
+            offset, length, _count, _subcommands = location
+            with open(self.path, 'rb') as f:
+                (header_length,) = _HEADER.unpack(f.read(_HEADER.size))
+                f.seek(_HEADER.size + header_length + offset)
+                self._records[tool] = marshal.loads(zlib.decompress(f.read(length)))
+        return self._records[tool]
+
+def format_flags(flags):
+    return ' '.join(f'{flag}({count})' if count > 1 else flag
+                    for flag, count in sorted(flags.items(), key=lambda item: (-item[1], item[0])))
+
+def print_uses(uses, limit):
+    for name, section, subsection, line in uses[:limit]:
+        where = f'{section} › {subsection}' if subsection else section
+        print(f'    {name} › {where}')
+        print(f'        {line}')
+    if len(uses) > limit:
+        print(f'    ... {len(uses) - limit} more (use -n to show them)')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Look up the commands used in the runbooks and guides')
+    parser.add_argument('tool', nargs='?', help='tool to show, e.g. rabbitmqctl (default: list tools)')
+    parser.add_argument('subcommand', nargs='*',
+                        help='subcommand to show with the sections that use it, e.g. forget_cluster_node')
+    parser.add_argument('--flag', help='only subcommands used with this flag, e.g. --flag=--add-port')
+    parser.add_argument('-n', '--limit', type=int, default=10,
+                        help='uses to show per subcommand (default: 10)')
+    parser.add_argument('--catalog', default=DEFAULT_CATALOG,
+                        help=f'catalog file (default: {DEFAULT_CATALOG})')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the catalog')
+    args = parser.parse_args(argv)
+
+    catalog = CommandCatalog(args.catalog)
+    if catalog.refresh(force=args.rebuild):
+        print(f'Catalog rebuilt: {args.catalog}', file=sys.stderr)
+
+    tools = catalog.tools()
+    if args.tool is None:
+        for tool, (count, subcommands) in sorted(tools.items(), key=lambda item: (-item[1][0], item[0])):
+            detail = f', {subcommands} subcommands' if tool in SUBCOMMAND_TOOLS else ''
+            print(f'{count:5d}  {tool}{detail}')
+        return 0
+
+    tool = os.path.basename(args.tool)
+    entries = catalog.lookup(tool)
+    if entries is None:
+        close = difflib.get_close_matches(tool, tools, n=3)
+        hint = f" (did you mean {', '.join(close)}?)" if close else ''
+        print(f'{tool}: not in the catalog{hint}', file=sys.stderr)
+        return 1
+
+    if args.subcommand:
+        wanted = ' '.join(args.subcommand)
+        if tool in CASE_INSENSITIVE:
+            wanted = wanted.lower()
+        if wanted not in entries:
+            close = difflib.get_close_matches(wanted, [name for name in entries if name], n=3)
+            hint = f" (did you mean {', '.join(close)}?)" if close else ''
+            print(f'{tool} {wanted}: not in the catalog{hint}', file=sys.stderr)
+            return 1
+        entries = {wanted: entries[wanted]}
+    if args.flag:
+        entries = {name: entry for name, entry in entries.items() if args.flag in entry[1]}
+
+    detailed = bool(args.subcommand) or len(entries) == 1
+    for subcommand, (count, flags, uses) in sorted(entries.items(), key=lambda item: (-item[1][0], item[0])):
+        label = f'{tool} {subcommand}'.rstrip()
+        print(f'{count:5d}  {label}' + (f'  [{format_flags(flags)}]' if flags else ''))
+        if detailed:
+            print_uses(uses, args.limit)
+    return 0 if entries else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,63 +3,16 @@
 Generate RabbitMQ 4.1.x Documentation for RHEL 8
 """
 
-from docx import Document
-from docx.shared import Pt, RGBColor, Inches
+import sys
+
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 
-def add_heading(doc, text, level=1):
-    """Add a formatted heading"""
-    heading = doc.add_heading(text, level=level)
-    heading.alignment = WD_ALIGN_PARAGRAPH.LEFT
-    return heading
-
-def add_paragraph(doc, text, bold=False, italic=False):
-    """Add a formatted paragraph"""
-    para = doc.add_paragraph()
-    run = para.add_run(text)
-    run.font.size = Pt(11)
-    run.font.name = 'Calibri'
-    if bold:
-        run.bold = True
-    if italic:
-        run.italic = True
-    return para
-
-def add_code_block(doc, text):
-    """Add a code block with monospace font"""
-    para = doc.add_paragraph()
-    run = para.add_run(text)
-    run.font.name = 'Courier New'
-    run.font.size = Pt(9)
-    para.style = 'Intense Quote'
-    return para
-
-def add_table_with_header(doc, headers, rows):
-    """Add a formatted table"""
-    table = doc.add_table(rows=1, cols=len(headers))
-    table.style = 'Light Grid Accent 1'
-
-    # Add headers
-    hdr_cells = table.rows[0].cells
-    for i, header in enumerate(headers):
-        hdr_cells[i].text = header
-        for paragraph in hdr_cells[i].paragraphs:
-            for run in paragraph.runs:
-                run.font.bold = True
-
-    # Add rows
-    for row_data in rows:
-        row_cells = table.add_row().cells
-        for i, cell_data in enumerate(row_data):
-            row_cells[i].text = cell_data
-
-    return table
-
-def create_rabbitmq_document():
-    """Create the RabbitMQ documentation"""
-    doc = Document()
-
-    # Title Page
+from doc_helpers import (new_document, add_heading, add_paragraph, add_code_block,
+                         add_table_with_header)
+from section_cache import build_sections, select_sections
+
+def add_title_page(doc):
+    """Add the title page"""
     title = doc.add_heading('RabbitMQ 4.1.x', 0)
     title.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
@@ -71,7 +24,8 @@ def create_rabbitmq_document():
 
     doc.add_page_break()
 
-    # Table of Contents
+def add_table_of_contents(doc):
+    """Add the table of contents"""
     add_heading(doc, 'Table of Contents', 1)
     toc_items = [
         '1. Introduction',
@@ -90,7 +44,8 @@ def create_rabbitmq_document():
 
     doc.add_page_break()
 
-    # 1. Introduction
+def add_introduction(doc):
+    """Add section 1: Introduction"""
     add_heading(doc, '1. Introduction', 1)
     add_paragraph(doc,
         'RabbitMQ is a robust, open-source message broker that implements the Advanced Message '
@@ -114,7 +69,8 @@ def create_rabbitmq_document():
 
     doc.add_page_break()
 
-    # 2. Purpose and Use Cases
+def add_purpose_and_use_cases(doc):
+    """Add section 2: Purpose and Use Cases"""
     add_heading(doc, '2. Purpose and Use Cases', 1)
 
     add_paragraph(doc, 'RabbitMQ Purpose:', bold=True)
@@ -145,7 +101,8 @@ def create_rabbitmq_document():
 
     doc.add_page_break()
 
-    # 3. System Prerequisites
+def add_system_prerequisites(doc):
+    """Add section 3: System Prerequisites"""
     add_heading(doc, '3. System Prerequisites', 1)
 
     add_paragraph(doc, 'Hardware Requirements:', bold=True)
@@ -184,7 +141,8 @@ def create_rabbitmq_document():
 
     doc.add_page_break()
 
-    # 4. Operating System Requirements
+def add_os_requirements(doc):
+    """Add section 4: Operating System Requirements and Configuration"""
     add_heading(doc, '4. Operating System Requirements and Configuration', 1)
 
     add_paragraph(doc,
@@ -393,7 +351,8 @@ def create_rabbitmq_document():
 
     doc.add_page_break()
 
-    # 5. Single Node Installation
+def add_single_node_installation(doc):
+    """Add section 5: Single Node Installation"""
     add_heading(doc, '5. Single Node Installation', 1)
 
     add_paragraph(doc, 'Step 1: Install Erlang', bold=True)
@@ -450,7 +409,8 @@ def create_rabbitmq_document():
 
     doc.add_page_break()
 
-    # 6. Cluster Configuration
+def add_rabbitmq_cluster_configuration(doc):
+    """Add section 6: RabbitMQ Cluster Configuration"""
     add_heading(doc, '6. RabbitMQ Cluster Configuration', 1)
 
     add_paragraph(doc,
@@ -545,7 +505,8 @@ def create_rabbitmq_document():
 
     doc.add_page_break()
 
-    # 7. Post-Installation Configuration
+def add_post_installation_configuration(doc):
+    """Add section 7: Post-Installation Configuration"""
     add_heading(doc, '7. Post-Installation Configuration', 1)
 
     add_paragraph(doc, '7.1 RabbitMQ Configuration File', bold=True)
@@ -587,7 +548,8 @@ def create_rabbitmq_document():
 
     doc.add_page_break()
 
-    # 8. Verification and Testing
+def add_verification_and_testing(doc):
+    """Add section 8: Verification and Testing"""
     add_heading(doc, '8. Verification and Testing', 1)
 
     add_paragraph(doc, '8.1 Check Service Status', bold=True)
@@ -615,7 +577,8 @@ def create_rabbitmq_document():
 
     doc.add_page_break()
 
-    # 9. Best Practices
+def add_best_practices(doc):
+    """Add section 9: Best Practices"""
     add_heading(doc, '9. Best Practices', 1)
 
     best_practices = [
@@ -657,7 +620,8 @@ def create_rabbitmq_document():
 
     doc.add_page_break()
 
-    # 10. Troubleshooting
+def add_troubleshooting(doc):
+    """Add section 10: Troubleshooting"""
     add_heading(doc, '10. Troubleshooting', 1)
 
     troubleshooting = [
@@ -687,7 +651,8 @@ def create_rabbitmq_document():
 
     doc.add_page_break()
 
-    # Footer
+def add_document_information(doc):
+    """Add the document information footer"""
     add_heading(doc, 'Document Information', 1)
     doc_info = [
         ['Field', 'Value'],
@@ -699,9 +664,31 @@ def create_rabbitmq_document():
     ]
     add_table_with_header(doc, doc_info[0], doc_info[1:])
 
-    return doc
+SECTIONS = [
+    ('Title Page', add_title_page),
+    ('Table of Contents', add_table_of_contents),
+    ('1. Introduction', add_introduction),
+    ('2. Purpose and Use Cases', add_purpose_and_use_cases),
+    ('3. System Prerequisites', add_system_prerequisites),
+    ('4. Operating System Requirements and Configuration', add_os_requirements),
+    ('5. Single Node Installation', add_single_node_installation),
+    ('6. RabbitMQ Cluster Configuration', add_rabbitmq_cluster_configuration),
+    ('7. Post-Installation Configuration', add_post_installation_configuration),
+    ('8. Verification and Testing', add_verification_and_testing),
+    ('9. Best Practices', add_best_practices),
+    ('10. Troubleshooting', add_troubleshooting),
+    ('Document Information', add_document_information),
+]
+
+def create_rabbitmq_document(cache=None, doc=None, profiler=None, only=None):
+    """Create the RabbitMQ documentation, or an extract of the named sections"""
+    if doc is None:
+        doc = new_document()
+    sections = select_sections(SECTIONS, only) if only else SECTIONS
+    return build_sections(doc, sections, cache, profiler)
 
 if __name__ == '__main__':
-    doc = create_rabbitmq_document()
-    doc.save('RabbitMQ_4.1.x_RHEL8_Installation_Guide.docx')
-    print("RabbitMQ documentation created successfully!")
+    # Only the command line needs build_docs; builds import this module from it
+    from build_docs import generator_main
+    sys.exit(generator_main(create_rabbitmq_document, SECTIONS, 'RabbitMQ_4.1.x_RHEL8_Installation_Guide.docx',
+                            'RabbitMQ documentation'))
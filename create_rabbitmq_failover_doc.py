@@ -3,80 +3,17 @@
 Generate RabbitMQ Failover Scenarios and Test Cases Documentation
 """
 
-from docx import Document
-from docx.shared import Pt, RGBColor, Inches
+import sys
+
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 
-def add_heading(doc, text, level=1):
-    """Add a formatted heading"""
-    heading = doc.add_heading(text, level=level)
-    heading.alignment = WD_ALIGN_PARAGRAPH.LEFT
-    return heading
-
-def add_paragraph(doc, text, bold=False, italic=False):
-    """Add a formatted paragraph"""
-    para = doc.add_paragraph()
-    run = para.add_run(text)
-    run.font.size = Pt(11)
-    run.font.name = 'Calibri'
-    if bold:
-        run.bold = True
-    if italic:
-        run.italic = True
-    return para
-
-def add_code_block(doc, text):
-    """Add a code block with monospace font"""
-    para = doc.add_paragraph()
-    run = para.add_run(text)
-    run.font.name = 'Courier New'
-    run.font.size = Pt(9)
-    para.style = 'Intense Quote'
-    return para
-
-def add_table_with_header(doc, headers, rows):
-    """Add a formatted table"""
-    table = doc.add_table(rows=1, cols=len(headers))
-    table.style = 'Light Grid Accent 1'
-
-    # Add headers
-    hdr_cells = table.rows[0].cells
-    for i, header in enumerate(headers):
-        hdr_cells[i].text = header
-        for paragraph in hdr_cells[i].paragraphs:
-            for run in paragraph.runs:
-                run.font.bold = True
-
-    # Add rows
-    for row_data in rows:
-        row_cells = table.add_row().cells
-        for i, cell_data in enumerate(row_data):
-            row_cells[i].text = cell_data
-
-    return table
-
-def add_warning_box(doc, text):
-    """Add a warning/note box"""
-    para = doc.add_paragraph()
-    run = para.add_run('⚠️  WARNING: ' + text)
-    run.font.size = Pt(11)
-    run.font.bold = True
-    run.font.color.rgb = RGBColor(204, 102, 0)
-    return para
-
-def add_note_box(doc, text):
-    """Add an info/note box"""
-    para = doc.add_paragraph()
-    run = para.add_run('📝 NOTE: ' + text)
-    run.font.size = Pt(11)
-    run.font.color.rgb = RGBColor(0, 102, 204)
-    return para
-
-def create_failover_document():
-    """Create the RabbitMQ failover scenarios documentation"""
-    doc = Document()
-
-    # Title Page
+from doc_helpers import (new_document, add_heading, add_paragraph, add_code_block,
+                         add_table_with_header, add_warning_box, add_note_box)
+from section_cache import build_sections, select_sections
+from sequence_tracker import LOSS_LIMIT
+
+def add_title_page(doc):
+    """Add the title page"""
     title = doc.add_heading('RabbitMQ Cluster Failover', 0)
     title.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
@@ -88,7 +25,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # Table of Contents
+def add_table_of_contents(doc):
+    """Add the table of contents"""
     add_heading(doc, 'Table of Contents', 1)
     toc_items = [
         '1. Introduction',
@@ -117,7 +55,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 1. Introduction
+def add_introduction(doc):
+    """Add section 1: Introduction"""
     add_heading(doc, '1. Introduction', 1)
     add_paragraph(doc,
         'This document provides comprehensive failover scenarios and test cases for a three-node '
@@ -141,7 +80,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 2. Test Environment Setup
+def add_test_environment_setup(doc):
+    """Add section 2: Test Environment Setup"""
     add_heading(doc, '2. Test Environment Setup', 1)
 
     add_paragraph(doc, 'Required Infrastructure:', bold=True)
@@ -174,7 +114,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 3. Prerequisites and Assumptions
+def add_prerequisites_and_assumptions(doc):
+    """Add section 3: Prerequisites and Assumptions"""
     add_heading(doc, '3. Prerequisites and Assumptions', 1)
 
     add_paragraph(doc, 'Prerequisites:', bold=True)
@@ -208,7 +149,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 4. Cluster Architecture Overview
+def add_cluster_architecture_overview(doc):
+    """Add section 4: Cluster Architecture Overview"""
     add_heading(doc, '4. Cluster Architecture Overview', 1)
 
     add_paragraph(doc, 'Three-Node Cluster Configuration:', bold=True)
@@ -246,7 +188,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 5. Failover Scenarios Overview
+def add_failover_scenarios_overview(doc):
+    """Add section 5: Failover Scenarios Overview"""
     add_heading(doc, '5. Failover Scenarios Overview', 1)
 
     add_paragraph(doc, 'Test Scenarios Summary:', bold=True)
@@ -267,7 +210,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 6. Test Case 1: Master Node Failure
+def add_test_case_1_master_node_failure(doc):
+    """Add section 6: Test Case 1: Master Node Failure"""
     add_heading(doc, '6. Test Case 1: Master Node Failure', 1)
 
     add_paragraph(doc, 'Objective:', bold=True)
@@ -371,7 +315,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 7. Test Case 2: Replica Node Failure
+def add_test_case_2_replica_node_failure(doc):
+    """Add section 7: Test Case 2: Replica Node Failure"""
     add_heading(doc, '7. Test Case 2: Replica Node Failure', 1)
 
     add_paragraph(doc, 'Objective:', bold=True)
@@ -442,7 +387,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 8. Test Case 3: Network Partition (Split-Brain)
+def add_test_case_3_network_partition(doc):
+    """Add section 8: Test Case 3: Network Partition (Split-Brain)"""
     add_heading(doc, '8. Test Case 3: Network Partition (Split-Brain)', 1)
 
     add_paragraph(doc, 'Objective:', bold=True)
@@ -553,7 +499,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 9. Test Case 4: Graceful Node Shutdown
+def add_test_case_4_graceful_node_shutdown(doc):
+    """Add section 9: Test Case 4: Graceful Node Shutdown"""
     add_heading(doc, '9. Test Case 4: Graceful Node Shutdown', 1)
 
     add_paragraph(doc, 'Objective:', bold=True)
@@ -632,7 +579,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 10. Test Case 5: Multiple Node Failure
+def add_test_case_5_multiple_node_failure(doc):
+    """Add section 10: Test Case 5: Multiple Node Failure"""
     add_heading(doc, '10. Test Case 5: Multiple Node Failure', 1)
 
     add_paragraph(doc, 'Objective:', bold=True)
@@ -700,7 +648,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 11. Test Case 6: Disk Space Exhaustion
+def add_test_case_6_disk_space_exhaustion(doc):
+    """Add section 11: Test Case 6: Disk Space Exhaustion"""
     add_heading(doc, '11. Test Case 6: Disk Space Exhaustion', 1)
 
     add_paragraph(doc, 'Objective:', bold=True)
@@ -775,7 +724,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 12. Test Case 7: Memory Pressure
+def add_test_case_7_memory_pressure(doc):
+    """Add section 12: Test Case 7: Memory Pressure"""
     add_heading(doc, '12. Test Case 7: Memory Pressure', 1)
 
     add_paragraph(doc, 'Objective:', bold=True)
@@ -849,7 +799,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 13. Test Case 8: Rolling Restart
+def add_test_case_8_rolling_restart(doc):
+    """Add section 13: Test Case 8: Rolling Restart"""
     add_heading(doc, '13. Test Case 8: Rolling Restart', 1)
 
     add_paragraph(doc, 'Objective:', bold=True)
@@ -928,7 +879,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 14. Test Case 9: Queue Mirroring Validation
+def add_test_case_9_queue_mirroring_validation(doc):
+    """Add section 14: Test Case 9: Queue Mirroring Validation"""
     add_heading(doc, '14. Test Case 9: Queue Mirroring Validation', 1)
 
     add_paragraph(doc, 'Objective:', bold=True)
@@ -1001,7 +953,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 15. Test Case 10: Client Connection Failover
+def add_test_case_10_client_connection_failover(doc):
+    """Add section 15: Test Case 10: Client Connection Failover"""
     add_heading(doc, '15. Test Case 10: Client Connection Failover', 1)
 
     add_paragraph(doc, 'Objective:', bold=True)
@@ -1094,7 +1047,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 16. Monitoring and Validation Commands
+def add_monitoring_and_validation_commands(doc):
+    """Add section 16: Monitoring and Validation Commands"""
     add_heading(doc, '16. Monitoring and Validation Commands', 1)
 
     add_paragraph(doc, 'Essential Monitoring Commands:', bold=True)
@@ -1134,7 +1088,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 17. Common Issues and Troubleshooting
+def add_common_issues_and_troubleshooting(doc):
+    """Add section 17: Common Issues and Troubleshooting"""
     add_heading(doc, '17. Common Issues and Troubleshooting', 1)
 
     issues = [
@@ -1166,7 +1121,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 18. Recovery Procedures
+def add_recovery_procedures(doc):
+    """Add section 18: Recovery Procedures"""
     add_heading(doc, '18. Recovery Procedures', 1)
 
     add_paragraph(doc, 'Scenario: Node Won\'t Start After Crash', bold=True)
@@ -1238,7 +1194,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 19. Best Practices for Production
+def add_best_practices_for_production(doc):
+    """Add section 19: Best Practices for Production"""
     add_heading(doc, '19. Best Practices for Production', 1)
 
     practices = [
@@ -1299,7 +1256,34 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # 20. Test Results Template
+# Rows of the Test Case Results table, in order; failover_harness.py fills them in
+TEST_CASES = [
+    'TC1: Master Node Failure',
+    'TC2: Replica Node Failure',
+    'TC3: Network Partition',
+    'TC4: Graceful Shutdown',
+    'TC5: Multiple Node Failure',
+    'TC6: Disk Space Exhaustion',
+    'TC7: Memory Pressure',
+    'TC8: Rolling Restart',
+    'TC9: Queue Mirroring',
+    'TC10: Client Failover',
+]
+
+def accounting_loss(accounting):
+    """(lost messages, loss percent) from the Total row of a loss accounting table"""
+    total = dict(zip(accounting[0], accounting[-1]))
+    return int(total['Lost']), float(total['Loss'].rstrip('%'))
+
+def add_test_results_template(doc, results=None, execution=None, accounting=None):
+    """Add section 20: Test Results Template
+
+    results maps test case names to (status, duration, notes) and
+    execution maps Test Execution Record fields to values; with them the
+    section is a filled-in record rather than a blank template. accounting
+    is a message loss table, header row first, from sequence_tracker.py;
+    lost messages fail the assessment over LOSS_LIMIT and qualify it below.
+    """
     add_heading(doc, '20. Test Results Template', 1)
 
     add_paragraph(doc, 'Test Execution Record:', bold=True)
@@ -1312,25 +1296,23 @@ def create_failover_document():
         ['Cluster Configuration', '3 nodes / Other'],
         ['HA Policy', 'ha-all / ha-exactly:2']
     ]
+    if execution:
+        test_info[1:] = [[field, execution.get(field, value)] for field, value in test_info[1:]]
     add_table_with_header(doc, test_info[0], test_info[1:])
 
     doc.add_paragraph()
     add_paragraph(doc, 'Test Case Results:', bold=True)
-    results_template = [
-        ['Test Case', 'Status', 'Duration', 'Notes'],
-        ['TC1: Master Node Failure', 'Pass/Fail', '', ''],
-        ['TC2: Replica Node Failure', 'Pass/Fail', '', ''],
-        ['TC3: Network Partition', 'Pass/Fail', '', ''],
-        ['TC4: Graceful Shutdown', 'Pass/Fail', '', ''],
-        ['TC5: Multiple Node Failure', 'Pass/Fail', '', ''],
-        ['TC6: Disk Space Exhaustion', 'Pass/Fail', '', ''],
-        ['TC7: Memory Pressure', 'Pass/Fail', '', ''],
-        ['TC8: Rolling Restart', 'Pass/Fail', '', ''],
-        ['TC9: Queue Mirroring', 'Pass/Fail', '', ''],
-        ['TC10: Client Failover', 'Pass/Fail', '', '']
-    ]
+    results_template = [['Test Case', 'Status', 'Duration', 'Notes']]
+    for name in TEST_CASES:
+        status, duration, notes = (results or {}).get(name, ('Pass/Fail', '', ''))
+        results_template.append([name, status, duration, notes])
     add_table_with_header(doc, results_template[0], results_template[1:])
 
+    if accounting:
+        doc.add_paragraph()
+        add_paragraph(doc, 'Message Loss Accounting:', bold=True)
+        add_table_with_header(doc, accounting[0], accounting[1:])
+
     doc.add_paragraph()
     add_paragraph(doc, 'Success Criteria:', bold=True)
     criteria = [
@@ -1353,18 +1335,36 @@ def create_failover_document():
         ['2', '', 'High/Medium/Low', ''],
         ['3', '', 'High/Medium/Low', '']
     ]
+    if results:
+        failed = [(name, notes) for name, (status, _duration, notes) in results.items()
+                  if status != 'Pass']
+        issues = [(f'{name}: {notes}', 'High') for name, notes in failed]
+        lost, loss = accounting_loss(accounting) if accounting else (0, 0.0)
+        if lost:
+            over = loss >= LOSS_LIMIT
+            issues.append((f'Message loss: {lost} message(s) lost ({loss:.4f}%, '
+                           f'{"over" if over else "within"} the {LOSS_LIMIT:g}% limit)',
+                           'High' if over else 'Medium'))
+        issues_template[1:] = ([[str(i), description, severity, '']
+                                for i, (description, severity) in enumerate(issues, 1)]
+                               or [['-', 'None', '', '']])
     add_table_with_header(doc, issues_template[0], issues_template[1:])
 
     doc.add_paragraph()
     add_paragraph(doc, 'Overall Assessment:', bold=True)
-    add_paragraph(doc, '[Pass / Fail / Pass with Conditions]')
+    if results:
+        add_paragraph(doc, 'Fail' if failed or loss >= LOSS_LIMIT else
+                      'Pass' if len(results) == len(TEST_CASES) and not lost else 'Pass with Conditions')
+    else:
+        add_paragraph(doc, '[Pass / Fail / Pass with Conditions]')
     doc.add_paragraph()
     add_paragraph(doc, 'Recommendations:', bold=True)
     add_paragraph(doc, '[List any recommendations for improvement]')
 
     doc.add_page_break()
 
-    # Appendix
+def add_appendix(doc):
+    """Add the sample test scripts appendix"""
     add_heading(doc, 'Appendix: Sample Test Scripts', 1)
 
     add_paragraph(doc, 'Sample Producer Script (producer.py):', bold=True)
@@ -1453,7 +1453,8 @@ def create_failover_document():
 
     doc.add_page_break()
 
-    # Footer
+def add_document_information(doc):
+    """Add the document information footer"""
     add_heading(doc, 'Document Information', 1)
     doc_info = [
         ['Field', 'Value'],
@@ -1465,9 +1466,43 @@ def create_failover_document():
     ]
     add_table_with_header(doc, doc_info[0], doc_info[1:])
 
-    return doc
+SECTIONS = [
+    ('Title Page', add_title_page),
+    ('Table of Contents', add_table_of_contents),
+    ('1. Introduction', add_introduction),
+    ('2. Test Environment Setup', add_test_environment_setup),
+    ('3. Prerequisites and Assumptions', add_prerequisites_and_assumptions),
+    ('4. Cluster Architecture Overview', add_cluster_architecture_overview),
+    ('5. Failover Scenarios Overview', add_failover_scenarios_overview),
+    ('6. Test Case 1: Master Node Failure', add_test_case_1_master_node_failure),
+    ('7. Test Case 2: Replica Node Failure', add_test_case_2_replica_node_failure),
+    ('8. Test Case 3: Network Partition (Split-Brain)', add_test_case_3_network_partition),
+    ('9. Test Case 4: Graceful Node Shutdown', add_test_case_4_graceful_node_shutdown),
+    ('10. Test Case 5: Multiple Node Failure', add_test_case_5_multiple_node_failure),
+    ('11. Test Case 6: Disk Space Exhaustion', add_test_case_6_disk_space_exhaustion),
+    ('12. Test Case 7: Memory Pressure', add_test_case_7_memory_pressure),
+    ('13. Test Case 8: Rolling Restart', add_test_case_8_rolling_restart),
+    ('14. Test Case 9: Queue Mirroring Validation', add_test_case_9_queue_mirroring_validation),
+    ('15. Test Case 10: Client Connection Failover', add_test_case_10_client_connection_failover),
+    ('16. Monitoring and Validation Commands', add_monitoring_and_validation_commands),
+    ('17. Common Issues and Troubleshooting', add_common_issues_and_troubleshooting),
+    ('18. Recovery Procedures', add_recovery_procedures),
+    ('19. Best Practices for Production', add_best_practices_for_production),
+    ('20. Test Results Template', add_test_results_template),
+    ('Appendix: Sample Test Scripts', add_appendix),
+    ('Document Information', add_document_information),
+]
+
+def create_failover_document(cache=None, doc=None, profiler=None, only=None):
+    """Create the RabbitMQ failover scenarios documentation, or an extract of the named sections"""
+    if doc is None:
+        doc = new_document()
+    sections = select_sections(SECTIONS, only) if only else SECTIONS
+    return build_sections(doc, sections, cache, profiler)
 
 if __name__ == '__main__':
-    doc = create_failover_document()
-    doc.save('RabbitMQ_Cluster_Failover_Test_Cases.docx')
-    print("RabbitMQ failover scenarios documentation created successfully!")
+    # Only the command line needs build_docs; builds import this module from it
+    from build_docs import generator_main
+    sys.exit(generator_main(create_failover_document, SECTIONS,
+                            'RabbitMQ_Cluster_Failover_Test_Cases.docx',
+                            'RabbitMQ failover scenarios documentation'))
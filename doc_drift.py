@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Report structural drift between the Markdown runbooks and the generated guides
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import Counter
+
+DOCUMENT_PART = 'word/document.xml'
+FRONT_MATTER = '(front matter)'
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+# Section numbers and "Step 3:" style labels, ignored when matching headings;
+# the label id is a number, a letter or a short prefixed number ("TC1"), so
+# "Test Case Results:" is left alone
+_NUMBERING = re.compile(r'^(\d+(\.\d+)*\.?\s+)?((step|test case|scenario|phase)\s+'
+                        r'(\d+|[a-z]{1,2}\d*):\s*)?', re.IGNORECASE)
+
+# The generators mark subsections with bold paragraphs ("Objective:",
+# "Step 1: Record Initial State") where the runbooks use headings
+_RUN_IN_HEADING = re.compile(r'.{1,80}:$|(Step|Scenario|Phase)\s+\w+:\s.{1,80}$')
+RUN_IN_LEVEL = 2
+
+# Code paragraph styles; guides built before the Code style used Intense Quote
+CODE_STYLES = {'Code', 'IntenseQuote'}
+
+def normalize(text):
+    """Text with runs of whitespace collapsed, for comparison"""
+    return ' '.join(text.split())
+
+def heading_key(title):
+    """Heading text without its number, label or trailing colon, lower-cased"""
+    text = normalize(title)
+    # A bare label ("Step 3:") is kept rather than reduced to nothing
+    return (_NUMBERING.sub('', text) or text).rstrip(':').lower()
+
+def block_item(text, style, bold):
+    """(kind, level, text) for a non-table block; bold is True when every run is bold"""
+    from doc_model import heading_level
+
+    level = heading_level(style)
+    if level is not None:
+        return 'heading', level, text
+    if style in CODE_STYLES:
+        return 'code', None, text
+    if bold and _RUN_IN_HEADING.match(text.strip()):
+        return 'heading', RUN_IN_LEVEL, text
+    return 'text', None, text
+
+def docx_items(path):
+    """Yield (kind, level, text) for each body block of a .docx, streaming document.xml
+
+    kind is 'heading' (level 0 for the title), 'code', 'text' or 'row'.
+    Bold run-in headings count as headings. Elements are discarded as soon
+    as they are read, so memory stays flat however large the document is.
+    """
+    with zipfile.ZipFile(path) as package, package.open(DOCUMENT_PART) as xml:
+        body = None
+        table_depth = 0
+        cells, row = [], []
+        for event, elem in ET.iterparse(xml, events=('start', 'end')):
+            tag = elem.tag
+            if event == 'start':
+                if tag == _W + 'body':
+                    body = elem
+                elif tag == _W + 'tbl':
+                    table_depth += 1
+                continue
+            if tag == _W + 'p':
+                text = _paragraph_text(elem)
+                if table_depth:
+                    cells.append(text)
+                elif text.strip():
+                    style = elem.find(f'{_W}pPr/{_W}pStyle')
+                    style = style.get(_W + 'val') if style is not None else None
+                    yield block_item(text, style, _all_bold(elem))
+            elif tag == _W + 'tc':
+                row.append('\n'.join(cells))
+                cells = []
+            elif tag == _W + 'tr':
+                yield 'row', None, ' | '.join(row)
+                row = []
+            elif tag == _W + 'tbl':
+                table_depth -= 1
+            if body is not None and table_depth == 0 and tag in (_W + 'p', _W + 'tbl'):
+                # Finished a top-level block: drop it from the partial tree
+                body.clear()
+
+def _paragraph_text(p):
+    parts = []
+    for elem in p.iter():
+        if elem.tag == _W + 't':
+            parts.append(elem.text or '')
+        elif elem.tag == _W + 'tab':
+            parts.append('\t')
+        elif elem.tag in (_W + 'br', _W + 'cr') and elem.get(_W + 'type') in (None, 'textWrapping'):
+            parts.append('\n')
+    return ''.join(parts)
+
+def _all_bold(p):
+    """Whether every run with text in a paragraph is bold or Strong"""
+    runs = [r for r in p.iter(_W + 'r') if r.find(_W + 't') is not None]
+    for r in runs:
+        style = r.find(f'{_W}rPr/{_W}rStyle')
+        bold = r.find(f'{_W}rPr/{_W}b')
+        if not ((style is not None and style.get(_W + 'val') == 'Strong')
+                or (bold is not None and bold.get(_W + 'val') not in ('0', 'false'))):
+            return False
+    return bool(runs)
+
+def markdown_items(path):
+    """Yield (kind, level, text) for each block of a Markdown runbook, as md_to_docx renders it"""
+    from doc_model import ModelDocument, Table
+    from md_to_docx import convert_markdown
+
+    model = ModelDocument()
+    with open(path, encoding='utf-8') as f:
+        convert_markdown(f, model)
+    model.close()
+    for block in model.blocks:
+        if isinstance(block, Table):
+            for cells in [block.headers] + list(block.rows):
+                yield 'row', None, ' | '.join(cells)
+            continue
+        text = block.text
+        if not text.strip():
+            continue
+        runs = [run for run in block.runs if run.text]
+        yield block_item(text, block.style,
+                         all(run.style == 'Strong' or run.b for run in runs))
+
+def document_items(path):
+    """Block stream of a .md or .docx file"""
+    return markdown_items(path) if path.endswith('.md') else docx_items(path)
+
+class Section:
+    """A heading and the normalized (kind, text) items under it"""
+    __slots__ = ('title', 'level', 'items', 'children')
+
+    def __init__(self, title, level):
+        self.title = title
+        self.level = level
+        self.items = []
+        self.children = []
+
+def outline(items):
+    """Top-level sections (title and Heading1) with their subsections, in one pass"""
+    sections = [Section(FRONT_MATTER, 0)]
+    current = sections[0]
+    for kind, level, text in items:
+        if kind == 'heading':
+            if level <= 1:
+                current = Section(text, level)
+                sections.append(current)
+            else:
+                current = Section(text, level)
+                sections[-1].children.append(current)
+            continue
+        current.items.append((kind, normalize(text)))
+    return sections
+
+def align(left, right):
+    """Pair two section lists by heading, in linear time
+
+    Sections whose heading (without its number) matches are anchors, kept
+    in order; unmatched sections between two anchors are paired up by
+    position as renames. Yields (left, right) with None for a section only
+    on one side.
+    """
+    keys = {}
+    positions = Counter()
+    for index, section in enumerate(right):
+        key = heading_key(section.title)
+        positions[key] += 1
+        keys.setdefault((key, positions[key]), index)
+
+    anchors = []
+    seen = Counter()
+    last = -1
+    for index, section in enumerate(left):
+        key = heading_key(section.title)
+        seen[key] += 1
+        match = keys.get((key, seen[key]))
+        if match is not None and match > last:
+            anchors.append((index, match))
+            last = match
+
+    i = j = 0
+    for a, b in anchors + [(len(left), len(right))]:
+        gap_left, gap_right = left[i:a], right[j:b]
+        for k in range(max(len(gap_left), len(gap_right))):
+            yield (gap_left[k] if k < len(gap_left) else None,
+                   gap_right[k] if k < len(gap_right) else None)
+        if a < len(left):
+            yield left[a], right[b]
+        i, j = a + 1, b + 1
+
+def item_changes(left, right):
+    """(removed, added) items: multiset difference, each in document order"""
+    left_counts, right_counts = Counter(left), Counter(right)
+    removed = _ordered(left, left_counts - right_counts)
+    added = _ordered(right, right_counts - left_counts)
+    return removed, added
+
+def _ordered(items, extra):
+    result = []
+    for item in items:
+        if extra[item] > 0:
+            extra[item] -= 1
+            result.append(item)
+    return result
+
+class DriftReport:
+    """Differences between two documents, section by section"""
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+        self.aligned = 0
+        self.renamed = []
+        self.removed = []
+        self.added = []
+        self.changed = []
+
+    @property
+    def structural(self):
+        return len(self.renamed) + len(self.removed) + len(self.added)
+
+    @property
+    def drift(self):
+        return self.structural + len(self.changed)
+
+    def compare(self, left_sections, right_sections, parent=''):
+        for left, right in align(left_sections, right_sections):
+            if left is None:
+                self.added.append(_path(parent, right.title))
+                continue
+            if right is None:
+                self.removed.append(_path(parent, left.title))
+                continue
+            self.aligned += 1
+            if heading_key(left.title) != heading_key(right.title):
+                self.renamed.append((_path(parent, left.title), right.title))
+            removed, added = item_changes(left.items, right.items)
+            if removed or added:
+                self.changed.append((_path(parent, left.title), removed, added))
+            self.compare(left.children, right.children, _path(parent, left.title))
+        return self
+
+    def format(self, limit=5, structure_only=False):
+        lines = [f'{self.left} ↔ {self.right}: {self.aligned} sections aligned, '
+                 f'{len(self.renamed)} renamed, {len(self.removed)} only in {_kind(self.left)}, '
+                 f'{len(self.added)} only in {_kind(self.right)}, '
+                 f'{len(self.changed)} with different content']
+        for title, other in self.renamed:
+            lines.append(f'  ~ {title}  →  {other}')
+        for title in self.removed:
+            lines.append(f'  - {title}')
+        for title in self.added:
+            lines.append(f'  + {title}')
+        if structure_only:
+            return '\n'.join(lines)
+        for title, removed, added in self.changed:
+            lines.append(f'  ≠ {title} (-{len(removed)} +{len(added)})')
+            for sign, items in (('-', removed), ('+', added)):
+                for kind, text in items[:limit]:
+                    lines.append(f'      {sign} {kind}: {_clip(text)}')
+                if len(items) > limit:
+                    lines.append(f'      {sign} ... {len(items) - limit} more')
+        return '\n'.join(lines)
+
+def _path(parent, title):
+    return f'{parent} › {title}' if parent else title
+
+def _kind(path):
+    return os.path.splitext(path)[1] or path
+
+def _clip(text, width=100):
+    return text if len(text) <= width else text[:width - 1] + '…'
+
+def compare_documents(left, right):
+    """DriftReport for two .md/.docx files"""
+    return DriftReport(left, right).compare(outline(document_items(left)),
+                                            outline(document_items(right)))
+
+def document_pairs(generated_dir='.', root=None):
+    """(runbook, generated guide) pairs that share a name stem"""
+    from build_docs import GENERATORS
+    from md_to_docx import MARKDOWN_SOURCES
+
+    root = root or os.path.dirname(os.path.abspath(__file__))
+    sources = {os.path.splitext(source)[0]: source for source in MARKDOWN_SOURCES}
+    pairs = []
+    for _module, _func, output in GENERATORS.values():
+        source = sources.get(os.path.splitext(output)[0])
+        if source:
+            pairs.append((os.path.join(root, source), os.path.join(generated_dir, output)))
+    return pairs
+
+def check_drift(pairs, limit=5, structure_only=False, out=sys.stdout):
+    """Compare each pair and print its report; returns the number of pairs that drifted"""
+    drifted = 0
+    for left, right in pairs:
+        report = compare_documents(left, right)
+        drift = report.structural if structure_only else report.drift
+        if drift:
+            drifted += 1
+        print(report.format(limit, structure_only), file=out)
+    return drifted
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Report drift between runbooks and generated guides')
+    parser.add_argument('files', nargs='*', metavar='FILE',
+                        help='two .md/.docx files to compare (default: every runbook that has a '
+                             'generated guide of the same name)')
+    parser.add_argument('-d', '--generated-dir', default='.',
+                        help='directory holding the generated guides (default: .)')
+    parser.add_argument('--structure-only', action='store_true',
+                        help='only report added, removed and renamed sections')
+    parser.add_argument('-n', '--limit', type=int, default=5,
+                        help='changed items to show per section (default: 5)')
+    args = parser.parse_args(argv)
+
+    if args.files and len(args.files) != 2:
+        parser.error('give exactly two files to compare, or none')
+    pairs = [tuple(args.files)] if args.files else document_pairs(args.generated_dir)
+    missing = [path for pair in pairs for path in pair if not os.path.exists(path)]
+    if missing:
+        parser.error(f"not found: {', '.join(missing)}")
+
+    start = time.perf_counter()
+    drifted = check_drift(pairs, args.limit, args.structure_only)
+    print(f'{drifted} of {len(pairs)} document pair(s) drifted '
+          f'({time.perf_counter() - start:.3f}s)')
+    return 1 if drifted else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
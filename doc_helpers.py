@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Shared formatting helpers for the document generators
+"""
+
+import copy
+import re
+from xml.sax.saxutils import escape
+
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from docx.shared import Emu, Inches, Pt, RGBColor
+from docx.table import Table
+
+# Styles created once per document:
+# (name, type, base style, font name, font size, bold, color)
+STYLES = [
+    ('Body', WD_STYLE_TYPE.PARAGRAPH, 'Normal', 'Calibri', Pt(11), None, None),
+    ('Code', WD_STYLE_TYPE.PARAGRAPH, 'Intense Quote', 'Courier New', Pt(9), None, None),
+    ('Warning', WD_STYLE_TYPE.PARAGRAPH, 'Body', None, None, True, RGBColor(204, 102, 0)),
+    ('Note', WD_STYLE_TYPE.PARAGRAPH, 'Body', None, None, None, RGBColor(0, 102, 204)),
+    ('Inline Code', WD_STYLE_TYPE.CHARACTER, 'Default Paragraph Font', 'Courier New', None,
+     None, None),
+]
+
+def register_styles(doc):
+    """Create the shared named styles in a document if they are missing"""
+    styles = doc.styles
+    for name, style_type, base, font_name, size, bold, color in STYLES:
+        if name in styles:
+            continue
+        style = styles.add_style(name, style_type)
+        style.base_style = styles[base]
+        style.quick_style = True
+        if font_name:
+            style.font.name = font_name
+        if size:
+            style.font.size = size
+        if bold:
+            style.font.bold = True
+        if color:
+            style.font.color.rgb = color
+    return doc
+
+# Pre-styled template, parsed once per process by _base_document()
+_base = None
+
+def _base_document():
+    global _base
+    if _base is None:
+        _base = register_styles(Document())
+    return _base
+
+def new_document(private_styles=False):
+    """Create an empty document with the shared styles registered
+
+    Documents are deep copies of a template parsed once per process. The
+    large styles.xml part is shared with that template rather than copied,
+    so treat doc.styles as read-only unless private_styles is set.
+    """
+    base = _base_document()
+    memo = {}
+    if not private_styles:
+        styles_part = base.part._styles_part
+        memo[id(styles_part)] = styles_part
+    return copy.deepcopy(base, memo)
+
+# Styles are applied by style id on the underlying element: assigning by
+# name (or style object) makes python-docx rescan styles.xml on every call.
+
+def styled_paragraph(doc, text, style_id):
+    """Add a paragraph referencing a style by id"""
+    para = doc.add_paragraph(text)
+    para._p.style = style_id
+    return para
+
+def styled_run(para, text, style_id=None):
+    """Add a run referencing a character style by id"""
+    run = para.add_run(text)
+    if style_id:
+        run._r.style = style_id
+    return run
+
+def add_heading(doc, text, level=1):
+    """Add a formatted heading"""
+    heading = styled_paragraph(doc, text, f'Heading{level}' if level else 'Title')
+    heading.alignment = WD_ALIGN_PARAGRAPH.LEFT
+    return heading
+
+def add_paragraph(doc, text, bold=False, italic=False):
+    """Add a formatted paragraph"""
+    para = styled_paragraph(doc, '', 'Body')
+    run = para.add_run(text)
+    if bold:
+        run._r.style = 'Strong'
+        if italic:
+            run.italic = True
+    elif italic:
+        run._r.style = 'Emphasis'
+    return para
+
+def add_code_block(doc, text):
+    """Add a code block with monospace font"""
+    return styled_paragraph(doc, text, 'Code')
+
+# Table style and look flags matching python-docx's 'Light Grid Accent 1' tables
+TABLE_PR = ('<w:tblPr><w:tblStyle w:val="LightGrid-Accent1"/><w:tblW w:type="auto" w:w="0"/>'
+            '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" '
+            'w:noHBand="0" w:noVBand="1" w:val="04A0"/></w:tblPr>')
+
+_RUN_BREAKS = re.compile(r'([\t\r\n])')
+
+def run_content_xml(text):
+    """Serialize run text the way python-docx does: tabs and newlines become w:tab/w:br"""
+    parts = []
+    for piece in _RUN_BREAKS.split(text):
+        if piece == '\t':
+            parts.append('<w:tab/>')
+        elif piece in ('\r', '\n'):
+            parts.append('<w:br/>')
+        elif piece:
+            space = ' xml:space="preserve"' if piece != piece.strip() else ''
+            parts.append(f'<w:t{space}>{escape(piece)}</w:t>')
+    return ''.join(parts)
+
+def iter_table_xml(headers, rows, col_width):
+    """Yield a header table as w:tbl XML chunks, one per row, col_width in twips"""
+    tc_pr = f'<w:tcPr><w:tcW w:type="dxa" w:w="{col_width}"/></w:tcPr>'
+    bold_cell = f'<w:tc>{tc_pr}<w:p><w:r><w:rPr><w:b/></w:rPr>%s</w:r></w:p></w:tc>'
+    cell = f'<w:tc>{tc_pr}<w:p><w:r>%s</w:r></w:p></w:tc>'
+    empty_cell = f'<w:tc>{tc_pr}<w:p><w:r/></w:p></w:tc>'
+
+    yield (f'<w:tbl {nsdecls("w")}>{TABLE_PR}<w:tblGrid>'
+           + f'<w:gridCol w:w="{col_width}"/>' * len(headers)
+           + '</w:tblGrid><w:tr>'
+           + ''.join(bold_cell % run_content_xml(header) for header in headers)
+           + '</w:tr>')
+    # Every row gets exactly one cell per header, to match the tblGrid
+    cols = len(headers)
+    for row_data in rows:
+        values = list(row_data)[:cols]
+        yield ('<w:tr>'
+               + ''.join(cell % run_content_xml(value) if value else empty_cell
+                         for value in values)
+               + empty_cell * (cols - len(values))
+               + '</w:tr>')
+    yield '</w:tbl>'
+
+def table_xml(headers, rows, col_width):
+    """Serialize a header table as a single w:tbl string, col_width in twips"""
+    return ''.join(iter_table_xml(headers, rows, col_width))
+
+def column_width(doc, cols):
+    """Width in twips python-docx gives each column of a full-width table"""
+    # The trailing body sectPr is the last section; doc.sections would
+    # xpath-scan every paragraph in the body on each call
+    sect_pr = doc.element.body.sectPr
+    block_width = ((sect_pr.page_width or Inches(8.5)) - (sect_pr.left_margin or Inches(1))
+                   - (sect_pr.right_margin or Inches(1)))
+    return Emu(block_width // cols).twips if cols else 0
+
+def add_table_with_header(doc, headers, rows):
+    """Add a formatted table"""
+    if hasattr(doc, 'add_header_table'):
+        # Streaming and model backends take the rows without building a table
+        return doc.add_header_table(headers, rows)
+    tbl = parse_xml(table_xml(headers, rows, column_width(doc, len(headers))))
+    body = doc.element.body
+    if body.sectPr is not None:
+        body.sectPr.addprevious(tbl)
+    else:
+        body.append(tbl)
+    return Table(tbl, doc._body)
+
+def add_warning_box(doc, text):
+    """Add a warning/note box"""
+    return styled_paragraph(doc, '⚠️  WARNING: ' + text, 'Warning')
+
+def add_note_box(doc, text):
+    """Add an info/note box"""
+    return styled_paragraph(doc, '📝 NOTE: ' + text, 'Note')
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Compact document model rendered to .docx, Markdown and HTML in one traversal
+"""
+
+import html
+import io
+from abc import ABC, abstractmethod
+
+from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_BREAK
+from docx.oxml.styles import styleId_from_name
+
+from doc_helpers import add_table_with_header, styled_paragraph, styled_run
+from docx_package import write_if_changed
+
+class Run:
+    """Text run: character style id, bold/italic toggles and an optional break"""
+    __slots__ = ('text', 'style', 'b', 'i', 'br')
+
+    def __init__(self, text=None):
+        self.text = text
+        self.style = None
+        self.b = None
+        self.i = None
+        self.br = None
+
+class Paragraph:
+    """Paragraph block: paragraph style id, justification and runs"""
+    __slots__ = ('style', 'jc', 'runs')
+
+    def __init__(self):
+        self.style = None
+        self.jc = None
+        self.runs = []
+
+    @property
+    def text(self):
+        return ''.join(run.text for run in self.runs if run.text)
+
+    @property
+    def is_page_break(self):
+        return not self.text and any(run.br == 'page' for run in self.runs)
+
+class Table:
+    """Header table block"""
+    __slots__ = ('headers', 'rows')
+
+    def __init__(self, headers, rows):
+        self.headers = headers
+        self.rows = rows
+
+class RunProxy:
+    """Run with the python-docx attributes the generators use"""
+
+    def __init__(self, document, element):
+        self._document = document
+        self._r = element
+
+    @property
+    def bold(self):
+        return self._r.b
+
+    @bold.setter
+    def bold(self, value):
+        self._r.b = value
+
+    @property
+    def italic(self):
+        return self._r.i
+
+    @italic.setter
+    def italic(self, value):
+        self._r.i = value
+
+    @property
+    def style(self):
+        return self._r.style
+
+    @style.setter
+    def style(self, name):
+        self._r.style = self._document.style_id(name)
+
+    def add_break(self, break_type=WD_BREAK.LINE):
+        self._r.br = 'page' if break_type == WD_BREAK.PAGE else 'line'
+
+class ParagraphProxy:
+    """Paragraph with the python-docx attributes the generators use"""
+
+    def __init__(self, document, element):
+        self._document = document
+        self._p = element
+
+    @property
+    def style(self):
+        return self._p.style
+
+    @style.setter
+    def style(self, name):
+        self._p.style = self._document.style_id(name)
+
+    @property
+    def alignment(self):
+        return WD_ALIGN_PARAGRAPH.from_xml(self._p.jc) if self._p.jc else None
+
+    @alignment.setter
+    def alignment(self, value):
+        self._p.jc = WD_ALIGN_PARAGRAPH.to_xml(value) if value is not None else None
+
+    def add_run(self, text=None, style=None):
+        element = Run(text)
+        self._p.runs.append(element)
+        run = RunProxy(self._document, element)
+        if style:
+            run.style = style
+        return run
+
+class BlockDocument(ABC):
+    """Document-like builder that hands each finished block to emit()
+
+    Supports the subset of the python-docx Document API used by the
+    generators and doc_helpers. A paragraph stays mutable until the next
+    block item is added, because callers set alignment and add runs after
+    creating it.
+    """
+
+    def __init__(self):
+        self._pending = None
+
+    @abstractmethod
+    def emit(self, block):
+        """Take a finished paragraph or table"""
+
+    def style_id(self, name):
+        """Map a style name to its styles.xml id"""
+        return styleId_from_name(name) if name else None
+
+    def _flush_pending(self):
+        if self._pending is not None:
+            self.emit(self._pending)
+            self._pending = None
+
+    def add_paragraph(self, text='', style=None):
+        self._flush_pending()
+        self._pending = Paragraph()
+        para = ParagraphProxy(self, self._pending)
+        if text:
+            para.add_run(text)
+        if style:
+            para.style = style
+        return para
+
+    def add_heading(self, text='', level=1):
+        if not 0 <= level <= 9:
+            raise ValueError('level must be in range 0-9, got %d' % level)
+        return self.add_paragraph(text, 'Title' if level == 0 else 'Heading %d' % level)
+
+    def add_page_break(self):
+        para = self.add_paragraph()
+        para.add_run().add_break(WD_BREAK.PAGE)
+        return para
+
+    def add_header_table(self, headers, rows):
+        """Add a header table; used by doc_helpers.add_table_with_header"""
+        self._flush_pending()
+        self.emit(Table(headers, rows))
+
+    def close(self):
+        self._flush_pending()
+
+class ModelDocument(BlockDocument):
+    """Builds the list of blocks once, for rendering to any number of formats"""
+
+    def __init__(self):
+        super().__init__()
+        self.blocks = []
+
+    def emit(self, block):
+        if isinstance(block, Table) and not isinstance(block.rows, list):
+            block.rows = list(block.rows)
+        self.blocks.append(block)
+
+# Renderers take one block at a time so several can share a single traversal
+
+class DocxRenderer:
+    """Replay blocks into a python-docx or streaming document"""
+
+    def __init__(self, doc):
+        self.doc = doc
+
+    def render(self, block):
+        if isinstance(block, Table):
+            add_table_with_header(self.doc, block.headers, block.rows)
+            return
+        para = styled_paragraph(self.doc, '', block.style) if block.style else self.doc.add_paragraph()
+        if block.jc:
+            para.alignment = WD_ALIGN_PARAGRAPH.from_xml(block.jc)
+        for element in block.runs:
+            run = styled_run(para, element.text, element.style)
+            if element.b is not None:
+                run.bold = element.b
+            if element.i is not None:
+                run.italic = element.i
+            if element.br:
+                run.add_break(WD_BREAK.PAGE if element.br == 'page' else WD_BREAK.LINE)
+
+    def close(self):
+        pass
+
+def heading_level(style):
+    """0 for the title, N for HeadingN, None for other styles"""
+    if style == 'Title':
+        return 0
+    if style and style.startswith('Heading') and style[7:].isdigit():
+        return int(style[7:])
+    return None
+
+class MarkdownRenderer:
+    """Write blocks as Markdown to a text file"""
+
+    def __init__(self, out):
+        self.out = out
+        self._in_list = False
+        self._started = False
+
+    def _inline(self, para):
+        parts = []
+        for run in para.runs:
+            if not run.text:
+                continue
+            if run.style == 'InlineCode':
+                parts.append(f'`{run.text}`')
+            elif run.style == 'Strong' or run.b:
+                parts.append(f'**{run.text}**')
+            elif run.style == 'Emphasis' or run.i:
+                parts.append(f'*{run.text}*')
+            else:
+                parts.append(run.text)
+        return ''.join(parts)
+
+    def _block(self, text, list_item=False):
+        if self._started and not (list_item and self._in_list):
+            self.out.write('\n')
+        self.out.write(text + '\n')
+        self._in_list = list_item
+        self._started = True
+
+    def render(self, block):
+        if isinstance(block, Table):
+            cells = lambda row: '| ' + ' | '.join(cell.replace('|', '\\|') for cell in row) + ' |'
+            self._block(cells(block.headers) + '\n|' + '---|' * len(block.headers))
+            for row in block.rows:
+                self.out.write(cells(row) + '\n')
+            return
+        if block.is_page_break:
+            self._block('---')
+            return
+        text = self._inline(block)
+        level = heading_level(block.style)
+        if not text:
+            return
+        if level is not None:
+            self._block('#' * min(level + 1, 6) + ' ' + block.text)
+        elif block.style == 'Code':
+            self._block(f'```\n{block.text}\n```')
+        elif block.style == 'ListBullet':
+            self._block('- ' + text, list_item=True)
+        elif block.style in ('Warning', 'Note'):
+            self._block('> ' + text)
+        else:
+            self._block(text)
+
+    def close(self):
+        pass
+
+class HtmlRenderer:
+    """Write blocks as a standalone HTML page"""
+
+    STYLE = ('body{font-family:Calibri,sans-serif;max-width:60em;margin:auto}'
+             'pre{font-family:"Courier New",monospace;font-size:9pt;background:#eef3fa;padding:.5em}'
+             'table{border-collapse:collapse}th,td{border:1px solid #4f81bd;padding:.2em .5em}'
+             'th{background:#dbe5f1}.warning{color:#cc6600;font-weight:bold}.note{color:#0066cc}')
+
+    def __init__(self, out, title=''):
+        self.out = out
+        self._in_list = False
+        out.write(f'<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+                  f'<title>{html.escape(title)}</title><style>{self.STYLE}</style></head><body>\n')
+
+    def _inline(self, para):
+        parts = []
+        for run in para.runs:
+            if run.text:
+                text = html.escape(run.text).replace('\n', '<br>')
+                if run.style == 'InlineCode':
+                    text = f'<code>{text}</code>'
+                elif run.style == 'Strong' or run.b:
+                    text = f'<strong>{text}</strong>'
+                elif run.style == 'Emphasis' or run.i:
+                    text = f'<em>{text}</em>'
+                parts.append(text)
+            if run.br == 'line':
+                parts.append('<br>')
+        return ''.join(parts)
+
+    def _list(self, open_list):
+        if open_list != self._in_list:
+            self.out.write('<ul>\n' if open_list else '</ul>\n')
+            self._in_list = open_list
+
+    def render(self, block):
+        write = self.out.write
+        if isinstance(block, Table):
+            self._list(False)
+            write('<table><thead><tr>'
+                  + ''.join(f'<th>{html.escape(cell)}</th>' for cell in block.headers)
+                  + '</tr></thead><tbody>\n')
+            for row in block.rows:
+                write('<tr>' + ''.join(f'<td>{html.escape(cell)}</td>' for cell in row) + '</tr>\n')
+            write('</tbody></table>\n')
+            return
+        self._list(block.style == 'ListBullet')
+        if block.is_page_break:
+            write('<hr>\n')
+            return
+        text = self._inline(block)
+        if not text:
+            return
+        level = heading_level(block.style)
+        if level is not None:
+            write(f'<h{min(level + 1, 6)}>{text}</h{min(level + 1, 6)}>\n')
+        elif block.style == 'Code':
+            write(f'<pre><code>{html.escape(block.text)}</code></pre>\n')
+        elif block.style == 'ListBullet':
+            write(f'<li>{text}</li>\n')
+        elif block.style in ('Warning', 'Note'):
+            write(f'<p class="{block.style.lower()}">{text}</p>\n')
+        else:
+            write(f'<p>{text}</p>\n')
+
+    def close(self):
+        self._list(False)
+        self.out.write('</body></html>\n')
+
+def render(blocks, renderers):
+    """Render every block to every renderer in a single traversal"""
+    for block in blocks:
+        for renderer in renderers:
+            renderer.render(block)
+    for renderer in renderers:
+        renderer.close()
+
+def render_outputs(blocks, outputs, doc=None, title=''):
+    """Render blocks into doc and to the {'md': path, 'html': path} files together
+
+    doc may be a python-docx or streaming document; the caller saves it.
+    Text files are only rewritten when their contents change. Returns doc
+    and whether any text file was written.
+    """
+    renderers = [DocxRenderer(doc)] if doc is not None else []
+    buffers = {}
+    if 'md' in outputs:
+        buffers['md'] = io.StringIO()
+        renderers.append(MarkdownRenderer(buffers['md']))
+    if 'html' in outputs:
+        buffers['html'] = io.StringIO()
+        renderers.append(HtmlRenderer(buffers['html'], title))
+    render(blocks, renderers)
+    changed = False
+    for fmt, buffer in buffers.items():
+        changed = write_if_changed(buffer.getvalue().encode('utf-8'), outputs[fmt]) or changed
+    return doc, changed
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Generate per-cluster variants of a guide from one prepared base document
+"""
+
+import argparse
+import importlib
+import io
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+from build_docs import GENERATORS
+from docx_package import COMPRESS_LEVEL, document_bytes, write_if_changed, zip_info
+
+DOCUMENT_PART = 'word/document.xml'
+DEFAULT_OUTPUT_DIR = 'variants'
+MAX_NODES = 6
+
+# Substitution points in the base documents: each named group is replaced
+# by the cluster value of that name
+SUBSTITUTION_POINTS = [
+    re.compile(rf'(?<![\w.-])(?P<host{n}>(?:rabbitmq|redis)-node{n})(?!\d)')
+    for n in range(1, MAX_NODES + 1)
+] + [
+    # The guides use 192.168.1.x for client examples and 10.10.10.x in /etc/hosts
+    re.compile(rf'(?<![\d.])(?P<ip{n}>(?:192\.168\.1|10\.10\.10)\.10{n})(?!\d)')
+    for n in range(1, MAX_NODES + 1)
+] + [
+    re.compile(r'PlainCredentials\("(?P<user>admin)", "(?P<password>password)"\)'),
+    re.compile(r'-u (?P<user>admin):(?P<password>password)\b'),
+    re.compile(r'add_user (?P<user>admin) (?P<password>SecurePassword123)\b'),
+    re.compile(r'set_user_tags (?P<user>admin) '),
+    re.compile(r'set_permissions -p \S+ (?P<user>admin) '),
+    # Redis auth: server settings and redis-cli/redis-benchmark -a
+    re.compile(r'(?:requirepass|masterauth|auth-pass \S+) (?P<password>[^\s<&]+)'),
+    re.compile(r'(?<![\w-])-a (?P<password>[A-Za-z][^\s<&]*)'),
+]
+
+# Per-cluster values that must not appear outside a substitution point:
+# any node name or node address of the example clusters, plus each base
+# password and, in rabbitmqctl commands, each base user
+LEFTOVER_PATTERNS = [
+    re.compile(r'(?<![\w.-])(?:rabbitmq|redis)-node\d+(?!\d)'),
+    re.compile(r'(?<![\d.])(?:192\.168\.1|10\.10\.10)\.10[1-9](?!\d)'),
+]
+
+def leftover_patterns(fields, defaults):
+    """LEFTOVER_PATTERNS plus patterns for the base users and passwords found at the points"""
+    patterns = list(LEFTOVER_PATTERNS)
+    passwords = {default for field, default in zip(fields, defaults) if field == 'password'
+                 and not (default.isalpha() and default.islower())}
+    users = {default for field, default in zip(fields, defaults) if field == 'user'}
+    if passwords:
+        patterns.append(re.compile('|'.join(map(re.escape, sorted(passwords, key=len, reverse=True)))))
+    if users:
+        patterns.append(re.compile(r'rabbitmqctl \w+ (?:-p \S+ )?(?:'
+                                   + '|'.join(map(re.escape, sorted(users))) + r')\b'))
+    return patterns
+
+def find_points(text, patterns=SUBSTITUTION_POINTS):
+    """Sorted, non-overlapping (start, end, field) spans in text"""
+    spans = []
+    for pattern in patterns:
+        for match in pattern.finditer(text):
+            for field, value in match.groupdict().items():
+                if value is not None:
+                    spans.append((match.start(field), match.end(field), field))
+    spans.sort()
+    for (_start, end, field), (start, _end, other) in zip(spans, spans[1:]):
+        if start < end:
+            raise ValueError(f'substitution points {field} and {other} overlap at {start}')
+    return spans
+
+class VariantTemplate:
+    """A base .docx prepared once and patched cheaply per variant
+
+    document.xml is split into static segments around the substitution
+    points. Every other part is compressed once into a zip prefix, so a
+    variant only joins its values into document.xml and appends that entry.
+
+    A variant must never mix its values with the base cluster's: the
+    segments are checked once for base values the points missed, and each
+    variant must supply every field the points use.
+    """
+
+    def __init__(self, doc, patterns=SUBSTITUTION_POINTS):
+        prefix = io.BytesIO()
+        with zipfile.ZipFile(io.BytesIO(document_bytes(doc))) as source, \
+                zipfile.ZipFile(prefix, 'w') as target:
+            for name in source.namelist():
+                if name == DOCUMENT_PART:
+                    xml = source.read(name).decode('utf-8')
+                else:
+                    target.writestr(zip_info(name), source.read(name), compresslevel=COMPRESS_LEVEL)
+        self.prefix = prefix.getvalue()
+
+        self.segments = []
+        self.fields = []
+        # Base text of each point: one field can match different base texts
+        self.defaults = []
+        pos = 0
+        for start, end, field in find_points(xml, patterns):
+            self.segments.append(xml[pos:start])
+            self.fields.append(field)
+            self.defaults.append(xml[start:end])
+            pos = end
+        self.segments.append(xml[pos:])
+
+        leftovers = sorted({match.group() for pattern in leftover_patterns(self.fields, self.defaults)
+                            for segment in self.segments for match in pattern.finditer(segment)})
+        if leftovers:
+            raise ValueError('base values outside the substitution points: ' + ', '.join(leftovers))
+
+    def missing(self, values):
+        """Fields the points use that values has no value for"""
+        return sorted({field for field in self.fields if values.get(field) is None})
+
+    def document_xml(self, values, partial=False):
+        """document.xml with the given values
+
+        Missing fields are an error, since the base text left at their
+        points belongs to another cluster; with partial=True they keep it.
+        """
+        missing = self.missing(values)
+        if missing and not partial:
+            raise ValueError(f"no value for {', '.join(missing)}")
+        parts = [self.segments[0]]
+        for field, default, segment in zip(self.fields, self.defaults, self.segments[1:]):
+            value = values.get(field)
+            parts.append(default if value is None else escape(value))
+            parts.append(segment)
+        return ''.join(parts).encode('utf-8')
+
+    def package(self, values):
+        """Complete .docx bytes for one variant"""
+        out = io.BytesIO(self.prefix)
+        out.seek(0, io.SEEK_END)
+        with zipfile.ZipFile(out, 'a') as target:
+            target.writestr(zip_info(DOCUMENT_PART), self.document_xml(values),
+                            compresslevel=COMPRESS_LEVEL)
+        return out.getvalue()
+
+def cluster_values(cluster):
+    """Substitution values for an inventory entry"""
+    values = {}
+    for n, host in enumerate(cluster.get('hosts', [])[:MAX_NODES], 1):
+        values[f'host{n}'] = host
+    for n, ip in enumerate(cluster.get('ips', [])[:MAX_NODES], 1):
+        values[f'ip{n}'] = ip
+    for field in ('user', 'password'):
+        if cluster.get(field) is not None:
+            values[field] = cluster[field]
+    return values
+
+def variant_path(output, cluster, output_dir):
+    """Output path for a cluster's variant of a generator output"""
+    stem = os.path.splitext(output)[0]
+    name = re.sub(r'[^\w.-]', '_', cluster['name'])
+    return os.path.join(output_dir, f'{stem}_{name}.docx')
+
+def load_inventory(path):
+    """Read the cluster inventory: a JSON list of {name, hosts, ips, user, password}"""
+    with open(path) as f:
+        clusters = json.load(f)
+    names = [cluster['name'] for cluster in clusters]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"duplicate cluster name(s): {', '.join(duplicates)}")
+    return clusters
+
+def synthetic_inventory(count, nodes=MAX_NODES):
+    """An inventory of count made-up clusters, for benchmarking"""
+    return [{
+        'name': f'cluster-{i:04d}',
+        'hosts': [f'mq-{i:04d}-{n}' for n in range(1, nodes + 1)],
+        'ips': [f'10.{i // 250 % 250}.{i % 250}.{10 + n}' for n in range(1, nodes + 1)],
+        'user': f'ops{i:04d}',
+        'password': f'secret-{i:04d}',
+    } for i in range(count)]
+
+# Set in each worker process by _init_worker
+_template = None
+
+def _init_worker(template):
+    global _template
+    _template = template
+
+def _write_variant(job):
+    path, values = job
+    return path, write_if_changed(_template.package(values), path)
+
+def build_base(name):
+    """Run a generator once and prepare its output as a variant template"""
+    module_name, func_name, output = GENERATORS[name]
+    doc = getattr(importlib.import_module(module_name), func_name)()
+    return VariantTemplate(doc), output
+
+def write_variants(template, output, clusters, output_dir, jobs=None):
+    """Write one variant per cluster, in a process pool when jobs > 1; returns (path, changed)"""
+    work = [(variant_path(output, cluster, output_dir), cluster_values(cluster))
+            for cluster in clusters]
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs <= 1 or len(work) < 2:
+        _init_worker(template)
+        return [_write_variant(job) for job in work]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(template,)) as pool:
+        return list(pool.map(_write_variant, work, chunksize=max(1, len(work) // (jobs * 4))))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate per-cluster guide variants')
+    parser.add_argument('document', choices=list(GENERATORS), help='guide to generate variants of')
+    parser.add_argument('inventory', nargs='?',
+                        help='JSON list of clusters: {name, hosts, ips, user, password}')
+    parser.add_argument('--synthetic', type=int, metavar='N',
+                        help='use N made-up clusters instead of an inventory file')
+    parser.add_argument('-o', '--output-dir', default=DEFAULT_OUTPUT_DIR,
+                        help=f'directory to write the variants to (default: {DEFAULT_OUTPUT_DIR})')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: one per CPU)')
+    args = parser.parse_args(argv)
+
+    if (args.inventory is None) == (args.synthetic is None):
+        parser.error('give either an inventory file or --synthetic N')
+    clusters = load_inventory(args.inventory) if args.inventory else synthetic_inventory(args.synthetic)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    try:
+        template, output = build_base(args.document)
+    except ValueError as e:
+        parser.error(f'{args.document}: {e}')
+    incomplete = [f"{cluster['name']} (no {', '.join(missing)})" for cluster in clusters
+                  for missing in [template.missing(cluster_values(cluster))] if missing]
+    if incomplete:
+        parser.error(f"{args.document} needs values the inventory lacks: {'; '.join(incomplete)}")
+    prepared = time.perf_counter()
+    results = write_variants(template, output, clusters, args.output_dir, args.jobs)
+    done = time.perf_counter()
+
+    written = sum(changed for _path, changed in results)
+    print(f'Base document prepared in {prepared - start:.3f}s '
+          f'({len(template.fields)} substitution points: {", ".join(sorted(set(template.fields)))})')
+    print(f'{len(results)} variants in {done - prepared:.3f}s '
+          f'({(done - prepared) / max(len(results), 1) * 1000:.2f}ms each), '
+          f'{written} written, {len(results) - written} unchanged, in {args.output_dir}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
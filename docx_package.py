@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Reproducible .docx packaging and skip-if-unchanged saves
+"""
+
+import fnmatch
+import hashlib
+import io
+import os
+import struct
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from docx.opc.pkgwriter import PackageWriter
+
+# Earliest timestamp a zip entry can hold; used for every part
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+COMPRESS_LEVEL = 6
+CONTENT_TYPES = '[Content_Types].xml'
+
+# Per-part deflate levels as (glob, level) lists, first match wins; level 0
+# stores the part uncompressed
+COMPRESSION_PROFILES = {
+    'draft': [('*.jpeg', 0), ('*.png', 0), ('*', 1)],
+    'default': [('*', COMPRESS_LEVEL)],
+    'publish': [('*', 9)],
+}
+
+# Fields zipfile writes for zip_info() entries: version 2.0, Unix host,
+# 1980-01-01 00:00 as DOS time/date
+_VERSION = 20
+_DOS_TIME, _DOS_DATE = 0, (1 << 5) | 1
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+_CENTRAL_HEADER = struct.Struct('<4s4B4HL2L5H2L')
+_END_RECORD = struct.Struct('<4s4H2LH')
+
+def part_order(names):
+    """[Content_Types].xml first, then the other parts by name"""
+    return sorted(names, key=lambda name: (name != CONTENT_TYPES, name))
+
+def zip_info(name):
+    """ZipInfo with fixed timestamp, permissions and host system"""
+    info = zipfile.ZipInfo(name, ZIP_EPOCH)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.create_system = 3
+    info.external_attr = 0o644 << 16
+    return info
+
+def part_level(name, levels):
+    """Deflate level for a part under a (glob, level) list"""
+    for pattern, level in levels:
+        if fnmatch.fnmatchcase(name, pattern):
+            return level
+    return COMPRESS_LEVEL
+
+def _deflate(data, level):
+    """(method, crc, compressed) for one part; zlib releases the GIL while working"""
+    if level == 0:
+        return zipfile.ZIP_STORED, zlib.crc32(data), data
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return zipfile.ZIP_DEFLATED, zlib.crc32(data), compressor.compress(data) + compressor.flush()
+
+def pack_parts(parts, levels=None, threads=None):
+    """Zip {name: bytes} reproducibly, deflating parts in a thread pool
+
+    The entries match what zipfile writes for zip_info(), so the default
+    profile gives the same bytes as a sequential zipfile save.
+    """
+    levels = COMPRESSION_PROFILES['default'] if levels is None else levels
+    names = part_order(parts)
+    jobs = [(parts[name], part_level(name, levels)) for name in names]
+    if threads is None:
+        threads = min(len(jobs), os.cpu_count() or 1)
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            compressed = list(pool.map(lambda job: _deflate(*job), jobs))
+    else:
+        compressed = [_deflate(*job) for job in jobs]
+
+    out = io.BytesIO()
+    central = []
+    for name, (data, _level), (method, crc, body) in zip(names, jobs, compressed):
+        encoded = name.encode('utf-8')
+        flags = 0 if encoded.isascii() else 0x800
+        if max(len(data), len(body), out.tell()) >= 0xFFFFFFFF:
+            raise ValueError(f'{name}: parts over 4 GiB need the streaming backend')
+        central.append(_CENTRAL_HEADER.pack(
+            b'PK\x01\x02', _VERSION, 3, _VERSION, 0, flags, method, _DOS_TIME, _DOS_DATE,
+            crc, len(body), len(data), len(encoded), 0, 0, 0, 0, 0o644 << 16, out.tell()) + encoded)
+        out.write(_LOCAL_HEADER.pack(b'PK\x03\x04', _VERSION, 0, flags, method, _DOS_TIME,
+                                     _DOS_DATE, crc, len(body), len(data), len(encoded), 0))
+        out.write(encoded)
+        out.write(body)
+    directory = b''.join(central)
+    out.write(directory)
+    out.write(_END_RECORD.pack(b'PK\x05\x06', 0, 0, len(central), len(central),
+                               len(directory), out.tell() - len(directory), 0))
+    return out.getvalue()
+
+class _PartCollector:
+    """Stands in for python-docx's zip writer and keeps the serialized parts"""
+
+    def __init__(self):
+        self.parts = {}
+
+    def write(self, pack_uri, blob):
+        self.parts[pack_uri.membername] = blob
+
+def package_parts(doc):
+    """{zip member name: bytes} for a python-docx document, without zipping it"""
+    package = doc.part.package
+    for part in package.parts:
+        part.before_marshal()
+    collector = _PartCollector()
+    PackageWriter._write_content_types_stream(collector, package.parts)
+    PackageWriter._write_pkg_rels(collector, package.rels)
+    PackageWriter._write_parts(collector, package.parts)
+    return collector.parts
+
+def repack(data, levels=None, threads=None):
+    """Rewrite .docx bytes with fixed timestamps, part order and compression levels"""
+    with zipfile.ZipFile(io.BytesIO(data)) as source:
+        parts = {name: source.read(name) for name in source.namelist()}
+    return pack_parts(parts, levels, threads)
+
+def document_bytes(doc, levels=None, threads=None):
+    """Reproducible .docx bytes for a python-docx document"""
+    return pack_parts(package_parts(doc), levels, threads)
+
+def file_digest(path):
+    """SHA-256 of a file, or None if it does not exist"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+def write_if_changed(data, path):
+    """Atomically write data unless path already holds the same bytes; True if written"""
+    if file_digest(path) == hashlib.sha256(data).hexdigest():
+        return False
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return True
+
+def replace_if_changed(tmp, path):
+    """Move a finished tmp file over path unless the contents match; True if replaced"""
+    if file_digest(tmp) == file_digest(path):
+        os.remove(tmp)
+        return False
+    os.replace(tmp, path)
+    return True
+
+def save_document(doc, path, levels=None, threads=None):
+    """Save a python-docx or streaming document reproducibly; True if the file changed
+
+    levels and threads apply to python-docx documents; streaming documents
+    compress as they write, at the default level.
+    """
+    if hasattr(doc, 'write_xml'):
+        # Streaming documents package themselves and compare on close
+        doc.save(path)
+        return doc.changed
+    return write_if_changed(document_bytes(doc, levels, threads), path)
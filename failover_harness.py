@@ -0,0 +1,759 @@
+#!/usr/bin/env python3
+"""
+Run the RabbitMQ failover test cases TC1-TC10 against a cluster backend and record the results
+"""
+
+import argparse
+import csv
+import datetime
+import getpass
+import heapq
+import importlib
+import sys
+import time
+from abc import ABC, abstractmethod
+
+from create_rabbitmq_failover_doc import TEST_CASES, add_test_results_template
+from doc_helpers import new_document, add_heading
+from docx_package import save_document
+from latency_histogram import format_time
+from sequence_tracker import LOSS_LIMIT, load_reports
+
+DEFAULT_OUTPUT = 'RabbitMQ_Failover_Test_Results.docx'
+TEST_QUEUE = 'test-failover-queue'
+TEST_MESSAGES = 1000
+
+DEFAULT_TIMEOUT = 120.0
+DEFAULT_INTERVAL = 0.01
+
+# Limits from the test cases' expected outcomes, in seconds
+FAILOVER_LIMIT = 30.0
+RECONNECT_LIMIT = 10.0
+
+DEFAULT_NODES = ('rabbit@rabbitmq-node1', 'rabbit@rabbitmq-node2', 'rabbit@rabbitmq-node3')
+
+# Seconds each simulated cluster event takes, before --scale
+SIMULATED_DELAYS = {
+    'failure_detection': 0.05,
+    'graceful_promotion': 0.005,
+    'restart': 0.1,
+    'partition_detection': 0.04,
+    'heal': 0.08,
+    'alarm': 0.02,
+    'reconnect': 0.03,
+}
+
+class ClusterBackend(ABC):
+    """What the harness needs from a cluster; subclass it to test a real or simulated one
+
+    Nodes are named as rabbitmqctl names them. Queues are mirrored to
+    every node, and publish() returns how many messages the cluster
+    confirmed, 0 while the queue is unavailable or publishers are blocked.
+    """
+    environment = ''
+    version = ''
+    ha_policy = ''
+
+    @abstractmethod
+    def nodes(self):
+        """Every cluster member, running or not"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def running_nodes(self):
+        """Members that are up and serving, i.e. not stopped or paused"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def stop_node(self, node, graceful=False):
+        raise NotImplementedError
+
+    @abstractmethod
+    def start_node(self, node):
+        raise NotImplementedError
+
+    @abstractmethod
+    def partition(self, nodes):
+        """Cut nodes off from the rest of the cluster"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def heal(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def partitions(self):
+        """Partitions the cluster has detected, as lists of node names"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def fill_disk(self, node):
+        raise NotImplementedError
+
+    @abstractmethod
+    def free_disk(self, node):
+        raise NotImplementedError
+
+    @abstractmethod
+    def exhaust_memory(self, node):
+        raise NotImplementedError
+
+    @abstractmethod
+    def release_memory(self, node):
+        raise NotImplementedError
+
+    @abstractmethod
+    def alarms(self):
+        """Raised resource alarms as (node, 'disk' or 'memory') pairs"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def declare_queue(self, name):
+        raise NotImplementedError
+
+    @abstractmethod
+    def purge_queue(self, name):
+        raise NotImplementedError
+
+    @abstractmethod
+    def queue_master(self, name):
+        """Node hosting the queue master, or None while there is none"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def synchronised_mirrors(self, name):
+        """Nodes holding an up-to-date copy of the queue, master included"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def transfer_master(self, name, node):
+        """Move the queue master to node ahead of planned maintenance"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def publish(self, name, count):
+        raise NotImplementedError
+
+    @abstractmethod
+    def message_count(self, name):
+        """Messages in the queue, or None while it is unavailable"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def connect_client(self, node):
+        """Open a client connection to node that fails over like the sample clients; returns its id"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def client_node(self, client):
+        """Node the client is connected to, or None while it is reconnecting"""
+        raise NotImplementedError
+
+class SimulatedCluster(ClusterBackend):
+    """Local stand-in for a three-node cluster with ha-all mirroring and pause_minority
+
+    State changes are scheduled on the monotonic clock with the delays in
+    SIMULATED_DELAYS and applied whenever the cluster is queried, so the
+    harness sees the same sequence it would on a real cluster, only faster.
+    """
+    environment = 'Local stand-in (simulated)'
+    version = 'simulated'
+    ha_policy = 'ha-all, pause_minority'
+
+    def __init__(self, nodes=DEFAULT_NODES, scale=1.0, clock=time.monotonic):
+        self._nodes = list(nodes)
+        self._delays = {event: delay * scale for event, delay in SIMULATED_DELAYS.items()}
+        self._clock = clock
+        self._events = []
+        self._sequence = 0
+        self._stopped = set()
+        self._isolated = set()
+        self._detected = False
+        self._exhausted = set()
+        self._alarms = set()
+        self._queues = {}
+        self._clients = []
+
+    def _after(self, event, action):
+        heapq.heappush(self._events, (self._clock() + self._delays[event], self._sequence, action))
+        self._sequence += 1
+
+    def _settle(self):
+        now = self._clock()
+        while self._events and self._events[0][0] <= now:
+            heapq.heappop(self._events)[2]()
+
+    def _serving(self):
+        """Nodes that can serve: running, and not paused in a minority"""
+        running = [node for node in self._nodes if node not in self._stopped]
+        reachable = [node for node in running if node not in self._isolated]
+        isolated = [node for node in running if node in self._isolated]
+        quorum = len(self._nodes) // 2 + 1
+        return [node for node in running
+                if len(isolated if node in self._isolated else reachable) >= quorum]
+
+    def _lost(self, nodes, event):
+        """Masters and clients on nodes that stopped serving move elsewhere after a delay"""
+        for queue in self._queues.values():
+            queue['mirrors'] -= set(nodes)
+            if queue['master'] in nodes:
+                queue['master'] = None
+                self._after(event, self._promote)
+        for client in self._clients:
+            if client[0] in nodes:
+                client[0] = None
+                self._after('reconnect', lambda client=client: self._reconnect(client))
+
+    def _promote(self):
+        serving = self._serving()
+        for queue in self._queues.values():
+            if queue['master'] is None:
+                mirrors = [node for node in serving if node in queue['mirrors']]
+                if mirrors:
+                    queue['master'] = mirrors[0]
+
+    def _rejoined(self):
+        """After a restart or heal: pause or resume nodes, resync mirrors, promote if needed"""
+        serving = self._serving()
+        self._lost([node for node in self._nodes if node not in serving], 'failure_detection')
+        for queue in self._queues.values():
+            if queue['master'] is None and not queue['mirrors'] and serving:
+                # Every copy was lost; the queue restarts from the first node back
+                queue['mirrors'] = {serving[0]}
+            if queue['master'] is not None:
+                queue['mirrors'].update(serving)
+        self._promote()
+
+    def _reconnect(self, client):
+        serving = self._serving()
+        if serving:
+            client[0] = serving[0]
+        else:
+            self._after('reconnect', lambda: self._reconnect(client))
+
+    def nodes(self):
+        return list(self._nodes)
+
+    def running_nodes(self):
+        self._settle()
+        return self._serving()
+
+    def stop_node(self, node, graceful=False):
+        self._settle()
+        serving = self._serving()
+        self._stopped.add(node)
+        self._lost([node] + [other for other in serving if other not in self._serving()],
+                   'graceful_promotion' if graceful else 'failure_detection')
+
+    def start_node(self, node):
+        self._settle()
+
+        def started():
+            self._stopped.discard(node)
+            self._rejoined()
+        self._after('restart', started)
+
+    def partition(self, nodes):
+        self._settle()
+        serving = self._serving()
+        self._isolated = set(nodes)
+        self._lost([node for node in serving if node not in self._serving()], 'failure_detection')
+
+        def detected():
+            self._detected = bool(self._isolated)
+        self._after('partition_detection', detected)
+
+    def heal(self):
+        self._settle()
+        if not self._isolated:
+            return
+
+        def healed():
+            self._isolated = set()
+            self._detected = False
+            self._rejoined()
+        self._after('heal', healed)
+
+    def partitions(self):
+        self._settle()
+        if not self._detected:
+            return []
+        return [sorted(self._isolated), sorted(set(self._nodes) - self._isolated)]
+
+    def _resource(self, node, kind, exhausted):
+        self._settle()
+        if exhausted:
+            self._exhausted.add((node, kind))
+        else:
+            self._exhausted.discard((node, kind))
+
+        def check():
+            if (node, kind) in self._exhausted:
+                self._alarms.add((node, kind))
+            else:
+                self._alarms.discard((node, kind))
+        self._after('alarm', check)
+
+    def fill_disk(self, node):
+        self._resource(node, 'disk', True)
+
+    def free_disk(self, node):
+        self._resource(node, 'disk', False)
+
+    def exhaust_memory(self, node):
+        self._resource(node, 'memory', True)
+
+    def release_memory(self, node):
+        self._resource(node, 'memory', False)
+
+    def alarms(self):
+        self._settle()
+        return sorted(self._alarms)
+
+    def declare_queue(self, name):
+        self._settle()
+        if name not in self._queues:
+            serving = self._serving()
+            self._queues[name] = {'master': serving[0] if serving else None,
+                                  'mirrors': set(serving), 'messages': 0}
+
+    def purge_queue(self, name):
+        self._settle()
+        self._queues[name]['messages'] = 0
+
+    def queue_master(self, name):
+        self._settle()
+        return self._queues[name]['master']
+
+    def synchronised_mirrors(self, name):
+        self._settle()
+        queue = self._queues[name]
+        return sorted(queue['mirrors']) if queue['master'] else []
+
+    def transfer_master(self, name, node):
+        self._settle()
+        queue = self._queues[name]
+        if node in queue['mirrors'] and node in self._serving():
+            queue['master'] = node
+
+    def publish(self, name, count):
+        self._settle()
+        queue = self._queues[name]
+        if queue['master'] is None or self._alarms:
+            # Any resource alarm blocks publishers on every node
+            return 0
+        queue['messages'] += count
+        return count
+
+    def message_count(self, name):
+        self._settle()
+        queue = self._queues[name]
+        return queue['messages'] if queue['master'] else None
+
+    def connect_client(self, node):
+        self._settle()
+        self._clients.append([node if node in self._serving() else None])
+        return len(self._clients) - 1
+
+    def client_node(self, client):
+        self._settle()
+        return self._clients[client][0]
+
+class CaseRun:
+    """Timings, checks and notes for one test case
+
+    Durations are measured on time.perf_counter_ns(), the monotonic clock
+    with the finest resolution, from just before the action that starts
+    them to the first poll that sees its outcome, so they are accurate to
+    within the poll interval.
+    """
+
+    def __init__(self, cluster, timeout=DEFAULT_TIMEOUT, interval=DEFAULT_INTERVAL):
+        self.cluster = cluster
+        self.timeout = timeout
+        self.interval = interval
+        self.durations = []
+        self.failures = []
+        self.notes = []
+
+    @staticmethod
+    def start():
+        return time.perf_counter_ns()
+
+    def wait(self, label, predicate, since):
+        """Poll predicate until it returns something true and record the time since since
+
+        Raises TimeoutError if it is still false after the case timeout.
+        """
+        deadline = since + int(self.timeout * 1e9)
+        while True:
+            value = predicate()
+            now = time.perf_counter_ns()
+            if value:
+                self.durations.append((label, (now - since) / 1e9))
+                return value
+            if now >= deadline:
+                raise TimeoutError(f'no {label} within {self.timeout:g}s')
+            time.sleep(self.interval)
+
+    def seconds(self, label):
+        return next(seconds for name, seconds in self.durations if name == label)
+
+    def check(self, ok, failure):
+        if not ok:
+            self.failures.append(failure)
+        return ok
+
+    def note(self, text):
+        self.notes.append(text)
+
+    @property
+    def passed(self):
+        return not self.failures
+
+    def row(self):
+        """(status, duration, notes) for the results table"""
+        duration = ', '.join(f'{label} {seconds:.3f}s' for label, seconds in self.durations)
+        return 'Pass' if self.passed else 'Fail', duration, '; '.join(self.failures + self.notes)
+
+def short(node):
+    return node.rpartition('@')[2]
+
+def fully_mirrored(cluster):
+    """Whether every node is serving and holds a synchronised copy of the test queue"""
+    return (len(cluster.running_nodes()) == len(cluster.nodes())
+            and len(cluster.synchronised_mirrors(TEST_QUEUE)) == len(cluster.nodes()))
+
+def fill_queue(run):
+    """Empty the test queue and publish the test messages; returns how many were confirmed"""
+    run.cluster.declare_queue(TEST_QUEUE)
+    run.cluster.purge_queue(TEST_QUEUE)
+    return run.cluster.publish(TEST_QUEUE, TEST_MESSAGES)
+
+def check_no_loss(run, expected):
+    count = run.cluster.message_count(TEST_QUEUE)
+    run.check(count == expected, f'{expected} confirmed messages but {count} in the queue')
+    return count
+
+def new_master(cluster, old):
+    master = cluster.queue_master(TEST_QUEUE)
+    return master if master not in (None, old) else None
+
+def restart_node(run, node, label='recovery'):
+    """Start node and wait until it serves and its mirror is synchronised again"""
+    started = run.start()
+    run.cluster.start_node(node)
+    run.wait(label, lambda: fully_mirrored(run.cluster), started)
+
+def tc1_master_node_failure(run):
+    """Kill the node hosting the queue master; a mirror must take over"""
+    cluster = run.cluster
+    confirmed = fill_queue(run)
+    master = cluster.queue_master(TEST_QUEUE)
+    started = run.start()
+    cluster.stop_node(master)
+    promoted = run.wait('failover', lambda: new_master(cluster, master), started)
+    run.check(run.seconds('failover') <= FAILOVER_LIMIT, f'failover took over {FAILOVER_LIMIT:g}s')
+    run.check(cluster.publish(TEST_QUEUE, 1) == 1, 'publish failed after failover')
+    check_no_loss(run, confirmed + 1)
+    run.note(f'master {short(master)} → {short(promoted)}')
+    restart_node(run, master)
+
+def tc2_replica_node_failure(run):
+    """Kill a mirror node; the queue must stay available throughout"""
+    cluster = run.cluster
+    confirmed = fill_queue(run)
+    master = cluster.queue_master(TEST_QUEUE)
+    replica = next(node for node in cluster.nodes() if node != master)
+    started = run.start()
+    cluster.stop_node(replica)
+    run.check(cluster.publish(TEST_QUEUE, 1) == 1, 'publish failed while the mirror was down')
+    run.wait('mirror dropped', lambda: replica not in cluster.synchronised_mirrors(TEST_QUEUE),
+             started)
+    run.check(cluster.queue_master(TEST_QUEUE) == master, 'the queue master moved')
+    check_no_loss(run, confirmed + 1)
+    restart_node(run, replica)
+
+def tc3_network_partition(run):
+    """Isolate the master's node; the majority side must carry on and the partition heal"""
+    cluster = run.cluster
+    confirmed = fill_queue(run)
+    master = cluster.queue_master(TEST_QUEUE)
+    started = run.start()
+    cluster.partition([master])
+    run.wait('detection', lambda: cluster.partitions(), started)
+    promoted = run.wait('failover', lambda: new_master(cluster, master), started)
+    run.check(master not in cluster.running_nodes(), f'{short(master)} did not pause in the minority')
+    run.check(cluster.publish(TEST_QUEUE, 1) == 1, 'publish failed on the majority side')
+    healing = run.start()
+    cluster.heal()
+    run.wait('heal', lambda: not cluster.partitions() and fully_mirrored(cluster), healing)
+    check_no_loss(run, confirmed + 1)
+    run.note(f'isolated {short(master)}, master → {short(promoted)}')
+
+def tc4_graceful_shutdown(run):
+    """Move the master off a node, then stop it cleanly; no publish may fail"""
+    cluster = run.cluster
+    confirmed = fill_queue(run)
+    node = cluster.queue_master(TEST_QUEUE)
+    target = next(other for other in cluster.nodes() if other != node)
+    started = run.start()
+    cluster.transfer_master(TEST_QUEUE, target)
+    run.wait('migration', lambda: new_master(cluster, node), started)
+    cluster.stop_node(node, graceful=True)
+    run.check(cluster.publish(TEST_QUEUE, 1) == 1, 'publish failed during the shutdown')
+    check_no_loss(run, confirmed + 1)
+    restart_node(run, node)
+
+def tc5_multiple_node_failure(run):
+    """Stop two nodes; publishing must stop until quorum is back, without losing messages"""
+    cluster = run.cluster
+    confirmed = fill_queue(run)
+    first, *others = cluster.nodes()
+    started = run.start()
+    for node in others:
+        cluster.stop_node(node)
+    run.wait('outage', lambda: not cluster.running_nodes(), started)
+    run.check(cluster.publish(TEST_QUEUE, 1) == 0, 'publish accepted without quorum')
+    recovery = run.start()
+    for node in others:
+        cluster.start_node(node)
+    run.wait('quorum restored', lambda: cluster.queue_master(TEST_QUEUE), recovery)
+    run.wait('recovery', lambda: fully_mirrored(cluster), recovery)
+    check_no_loss(run, confirmed)
+    run.note(f'stopped {", ".join(short(node) for node in others)}; {short(first)} paused')
+
+def resource_alarm(run, kind, exhaust, release):
+    cluster = run.cluster
+    confirmed = fill_queue(run)
+    node = cluster.nodes()[-1]
+    started = run.start()
+    exhaust(node)
+    run.wait(f'{kind} alarm', lambda: (node, kind) in cluster.alarms(), started)
+    run.check(cluster.publish(TEST_QUEUE, 1) == 0, f'publishers not blocked by the {kind} alarm')
+    cleared = run.start()
+    release(node)
+    run.wait('alarm cleared', lambda: not cluster.alarms(), cleared)
+    run.check(cluster.publish(TEST_QUEUE, 1) == 1, 'publishers still blocked after the alarm')
+    check_no_loss(run, confirmed + 1)
+
+def tc6_disk_space_exhaustion(run):
+    """Fill a node's disk; the disk alarm must block publishers until space is freed"""
+    resource_alarm(run, 'disk', run.cluster.fill_disk, run.cluster.free_disk)
+
+def tc7_memory_pressure(run):
+    """Exhaust a node's memory; the memory alarm must throttle publishers until it is released"""
+    resource_alarm(run, 'memory', run.cluster.exhaust_memory, run.cluster.release_memory)
+
+def tc8_rolling_restart(run):
+    """Restart every node in turn, mirrors first; the queue must stay available"""
+    cluster = run.cluster
+    confirmed = fill_queue(run)
+    master = cluster.queue_master(TEST_QUEUE)
+    order = [node for node in cluster.nodes() if node != master] + [master]
+    started = run.start()
+    failed = 0
+    for node in order:
+        if cluster.queue_master(TEST_QUEUE) == node:
+            target = next(other for other in cluster.nodes() if other != node)
+            cluster.transfer_master(TEST_QUEUE, target)
+            run.wait(f'{short(node)} handover', lambda: new_master(cluster, node), run.start())
+        cluster.stop_node(node, graceful=True)
+        published = cluster.publish(TEST_QUEUE, 1)
+        confirmed += published
+        failed += not published
+        restart_node(run, node, f'{short(node)} restart')
+    run.durations.append(('total', (run.start() - started) / 1e9))
+    run.check(not failed, f'{failed} publish(es) failed during the restart')
+    check_no_loss(run, confirmed)
+
+def tc9_queue_mirroring(run):
+    """Check every node holds a synchronised copy, and a promoted mirror has every message"""
+    cluster = run.cluster
+    confirmed = fill_queue(run)
+    mirrors = cluster.synchronised_mirrors(TEST_QUEUE)
+    run.check(len(mirrors) == len(cluster.nodes()),
+              f'{len(mirrors)} of {len(cluster.nodes())} mirrors synchronised')
+    master = cluster.queue_master(TEST_QUEUE)
+    started = run.start()
+    cluster.stop_node(master)
+    run.wait('promotion', lambda: new_master(cluster, master), started)
+    check_no_loss(run, confirmed)
+    restart_node(run, master, 'resync')
+
+def tc10_client_failover(run):
+    """Stop the node a client is connected to; it must reconnect to another node in time"""
+    cluster = run.cluster
+    node = cluster.nodes()[0]
+    client = cluster.connect_client(node)
+    started = run.start()
+    cluster.stop_node(node)
+
+    def reconnected():
+        current = cluster.client_node(client)
+        return current if current not in (None, node) else None
+    other = run.wait('reconnect', reconnected, started)
+    run.check(run.seconds('reconnect') <= RECONNECT_LIMIT, f'reconnect took over {RECONNECT_LIMIT:g}s')
+    run.note(f'client {short(node)} → {short(other)}')
+    restart_node(run, node)
+
+CASES = dict(zip(TEST_CASES, [
+    tc1_master_node_failure,
+    tc2_replica_node_failure,
+    tc3_network_partition,
+    tc4_graceful_shutdown,
+    tc5_multiple_node_failure,
+    tc6_disk_space_exhaustion,
+    tc7_memory_pressure,
+    tc8_rolling_restart,
+    tc9_queue_mirroring,
+    tc10_client_failover,
+]))
+
+def restore(cluster, timeout=DEFAULT_TIMEOUT, interval=DEFAULT_INTERVAL):
+    """Undo whatever a failed case left behind and wait for a healthy cluster"""
+    cluster.heal()
+    for node, kind in cluster.alarms():
+        (cluster.free_disk if kind == 'disk' else cluster.release_memory)(node)
+    running = cluster.running_nodes()
+    for node in cluster.nodes():
+        if node not in running:
+            cluster.start_node(node)
+    cluster.declare_queue(TEST_QUEUE)
+    run = CaseRun(cluster, timeout, interval)
+    run.wait('healthy cluster', lambda: (fully_mirrored(cluster) and not cluster.partitions()
+                                         and not cluster.alarms()), run.start())
+
+def run_cases(cluster, names=TEST_CASES, timeout=DEFAULT_TIMEOUT, interval=DEFAULT_INTERVAL,
+              out=sys.stdout, timeline=None):
+    """Run the named cases in order; returns {name: (status, duration, notes)}
+
+    Each case that runs appends (name, start, end) in time.time_ns() to timeline, if given.
+    """
+    results = {}
+    unhealthy = None
+    for name in names:
+        if unhealthy is None:
+            try:
+                restore(cluster, timeout, interval)
+            except TimeoutError as e:
+                unhealthy = f'not run: {e}'
+        if unhealthy is None:
+            run = CaseRun(cluster, timeout, interval)
+            started = time.time_ns()
+            try:
+                CASES[name](run)
+            except TimeoutError as e:
+                run.check(False, str(e))
+            if timeline is not None:
+                timeline.append((name, started, time.time_ns()))
+            results[name] = run.row()
+        else:
+            results[name] = ('Fail', '', unhealthy)
+        status, duration, notes = results[name]
+        print(f'{name:<28} {status:<5} {duration}' + (f'  ({notes})' if notes else ''), file=out)
+    return results
+
+def execution_record(cluster, tester=None, environment=None):
+    """Test Execution Record values for the results document"""
+    return {
+        'Test Date': datetime.date.today().isoformat(),
+        'Tester Name': tester or getpass.getuser(),
+        'Environment': environment or cluster.environment,
+        'RabbitMQ Version': cluster.version,
+        'Cluster Configuration': f'{len(cluster.nodes())} nodes',
+        'HA Policy': cluster.ha_policy,
+    }
+
+def write_timeline(path, timeline):
+    """Save case start and end times for latency_histogram.py --timeline"""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['case', 'start', 'end'])
+        for name, started, ended in timeline:
+            writer.writerow([name, format_time(started), format_time(ended)])
+
+def results_document(results, execution, accounting=None):
+    """A document holding the filled-in Test Results section"""
+    doc = new_document()
+    add_heading(doc, 'RabbitMQ Cluster Failover Test Results', 0)
+    add_test_results_template(doc, results, execution, accounting)
+    return doc
+
+def load_backend(spec, scale=1.0):
+    """Cluster backend from 'simulated' or 'module:Class'"""
+    if spec == 'simulated':
+        return SimulatedCluster(scale=scale)
+    module, _, name = spec.partition(':')
+    if not name:
+        raise ValueError(f"backend must be 'simulated' or module:Class, not {spec!r}")
+    backend = getattr(importlib.import_module(module), name)
+    missing = sorted(getattr(backend, '__abstractmethods__', ()))
+    if missing:
+        raise ValueError(f"{spec} does not implement {', '.join(missing)}")
+    return backend()
+
+def select_cases(selectors):
+    """Test case names for selectors like 'TC3', '3' or a part of the name"""
+    names = []
+    for selector in selectors:
+        key = selector.lower()
+        key = key if not key.isdigit() else f'tc{key}'
+        matches = ([name for name in TEST_CASES if name.lower().split(':')[0] == key]
+                   or [name for name in TEST_CASES if key in name.lower()])
+        if len(matches) != 1:
+            raise ValueError(f'{selector!r} matches {len(matches)} test cases')
+        names.append(matches[0])
+    return [name for name in TEST_CASES if name in names]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run the failover test cases and write the filled-in results table')
+    parser.add_argument('cases', nargs='*', metavar='CASE',
+                        help="test cases to run, e.g. TC3, 3 or 'partition' (default: all)")
+    parser.add_argument('-b', '--backend', default='simulated',
+                        help="'simulated' for the local stand-in, or module:Class of a "
+                             'ClusterBackend subclass (default: simulated)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply the simulated cluster delays (default: 1)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help=f'seconds to wait for each outcome (default: {DEFAULT_TIMEOUT:g})')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help=f'seconds between polls (default: {DEFAULT_INTERVAL:g})')
+    parser.add_argument('--tester', help='Tester Name for the record (default: current user)')
+    parser.add_argument('--environment', help='Environment for the record (default: from the backend)')
+    parser.add_argument('--sequence-report', action='append', metavar='FILE',
+                        help='add message loss accounting from a load_consumer.py sequence '
+                             'report; repeat for several consumers')
+    parser.add_argument('--timeline', metavar='FILE',
+                        help='save when each case ran, to line up load_consumer.py --latency-csv '
+                             'slices with latency_histogram.py --timeline')
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT,
+                        help=f'results document to write (default: {DEFAULT_OUTPUT})')
+    args = parser.parse_args(argv)
+
+    try:
+        names = select_cases(args.cases) if args.cases else TEST_CASES
+        cluster = load_backend(args.backend, args.scale)
+        tracker = load_reports(args.sequence_report) if args.sequence_report else None
+    except (OSError, ValueError, KeyError, ImportError, AttributeError) as e:
+        parser.error(str(e))
+
+    timeline = [] if args.timeline else None
+    results = run_cases(cluster, names, args.timeout, args.interval, timeline=timeline)
+    if timeline is not None:
+        write_timeline(args.timeline, timeline)
+    doc = results_document(results, execution_record(cluster, args.tester, args.environment),
+                           tracker.accounting_table() if tracker else None)
+    save_document(doc, args.output)
+    failed = sum(status != 'Pass' for status, _duration, _notes in results.values())
+    print(f'{len(results) - failed} of {len(results)} test case(s) passed; results in {args.output}')
+    if tracker:
+        loss = tracker.loss_percent()
+        print(f'Message loss {loss:.4f}% ({"within" if loss < LOSS_LIMIT else "over"} the '
+              f'{LOSS_LIMIT:g}% limit)')
+        failed += loss >= LOSS_LIMIT
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Log-bucketed latency histograms with per-slice percentiles, and a viewer for their CSV export
+"""
+
+import argparse
+import csv
+import datetime
+import statistics
+import sys
+from array import array
+
+# 2**7 sub-buckets per power of two: values are kept to within 1/128 (0.8%)
+PRECISION_BITS = 7
+# Largest latency tracked exactly, in nanoseconds; larger ones land in the last bucket
+HIGHEST = 3600 * 10**9
+
+PERCENTILES = (('p50', 0.5), ('p99', 0.99), ('p99.9', 0.999))
+SLICE_FIELDS = ['start', 'seconds', 'count'] + [name for name, _ in PERCENTILES] + ['max']
+
+# A slice is a spike when its p99 is this many times the run's median p99
+SPIKE_FACTOR = 3.0
+
+# count, percentiles and max of a slice without deliveries
+EMPTY_SUMMARY = (0,) * (len(PERCENTILES) + 2)
+
+class LatencyHistogram:
+    """Counts of non-negative integer values in logarithmic buckets, HDR style
+
+    Values below 2**PRECISION_BITS get a bucket each; above that, every
+    power of two is split into 2**PRECISION_BITS buckets, so a bucket is
+    never wider than 1/2**PRECISION_BITS of its values. Memory is fixed
+    by the highest trackable value: about 37 KiB for an hour in
+    nanoseconds.
+    """
+    __slots__ = ('precision', 'counts', 'last', 'total', 'max')
+
+    def __init__(self, highest=HIGHEST, precision=PRECISION_BITS):
+        self.precision = precision
+        self.counts = array('Q', bytes(8 * (self.index(highest) + 1)))
+        self.last = len(self.counts) - 1
+        self.total = 0
+        self.max = 0
+
+    def index(self, value):
+        shift = value.bit_length() - self.precision - 1
+        if shift <= 0:
+            return value
+        return (shift << self.precision) + (value >> shift)
+
+    def lowest_equivalent(self, index):
+        if index < 2 << self.precision:
+            return index
+        shift = (index >> self.precision) - 1
+        return (index - (shift << self.precision)) << shift
+
+    def highest_equivalent(self, index):
+        return self.lowest_equivalent(index + 1) - 1
+
+    def record(self, value, count=1):
+        if value < 0:
+            value = 0
+        # index() inlined: this runs for every message
+        shift = value.bit_length() - self.precision - 1
+        index = value if shift <= 0 else (shift << self.precision) + (value >> shift)
+        if index > self.last:
+            index = self.last
+        self.counts[index] += count
+        self.total += count
+        if value > self.max:
+            self.max = value
+
+    def add(self, other):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def reset(self):
+        self.counts = array('Q', bytes(8 * len(self.counts)))
+        self.total = 0
+        self.max = 0
+
+    def percentile(self, fraction):
+        """Highest value equivalent to the one at fraction of the recorded values, capped at max"""
+        if not self.total:
+            return 0
+        rank = max(1, int(fraction * self.total + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.highest_equivalent(index), self.max)
+        return self.max
+
+    def summary(self):
+        """(count, p50, p99, p99.9, max)"""
+        return ((self.total,) + tuple(self.percentile(fraction) for _name, fraction in PERCENTILES)
+                + (self.max,))
+
+class SlicedLatency:
+    """A latency histogram per fixed time slice plus one for the whole run
+
+    Only the current slice keeps a histogram; closed slices are reduced to
+    a row of percentiles, so memory stays flat over long runs. Slice times
+    are wall clock nanoseconds, comparable with other hosts and logs.
+    """
+
+    def __init__(self, slice_seconds=1.0, on_slice=None):
+        self.slice_ns = int(slice_seconds * 1e9)
+        self.current = LatencyHistogram()
+        self.total = LatencyHistogram()
+        self.slice_start = None
+        self.slices = []
+        self.on_slice = on_slice
+        self.negative = 0
+
+    def record(self, now_ns, latency_ns):
+        """Record one latency observed at now_ns (time.time_ns())"""
+        if self.slice_start is None:
+            self.slice_start = now_ns - now_ns % self.slice_ns
+        elif now_ns >= self.slice_start + self.slice_ns:
+            self.close_slice(now_ns)
+        if latency_ns < 0:
+            # Sender clock ahead of ours: count it, record as zero
+            self.negative += 1
+        self.current.record(latency_ns)
+
+    def close_slice(self, now_ns=None):
+        """Finish the current slice, and any empty ones up to now_ns
+
+        Empty slices get count-0 rows, so an outage shows up as a run of
+        them instead of a hole in the timeline.
+        """
+        if self.slice_start is None:
+            return
+        if self.current.total or now_ns is not None:
+            self.total.add(self.current)
+            self._emit((self.slice_start, self.slice_ns) + self.current.summary())
+            self.current.reset()
+        self.slice_start += self.slice_ns
+        if now_ns is not None:
+            while self.slice_start + self.slice_ns <= now_ns:
+                self._emit((self.slice_start, self.slice_ns) + EMPTY_SUMMARY)
+                self.slice_start += self.slice_ns
+
+    def _emit(self, row):
+        self.slices.append(row)
+        if self.on_slice:
+            self.on_slice(row)
+
+    def finish(self):
+        self.close_slice()
+        return self.slices
+
+    def write_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(SLICE_FIELDS)
+            for row in self.slices:
+                writer.writerow(slice_csv_row(row))
+
+def slice_csv_row(row):
+    """CSV fields for a slice row: ISO start time, seconds, count and milliseconds"""
+    start, length, count, *values = row
+    return ([format_time(start), f'{length / 1e9:g}', count]
+            + [f'{value / 1e6:.3f}' for value in values])
+
+def format_time(ns):
+    return datetime.datetime.fromtimestamp(ns / 1e9, datetime.timezone.utc).isoformat(
+        timespec='milliseconds')
+
+def format_slice(row):
+    start, _length, count, *values = row
+    return (f'{format_time(start)}  {count:8d} msgs  '
+            + '  '.join(f'{name} {value / 1e6:8.2f}ms' for name, value in
+                        zip([name for name, _ in PERCENTILES] + ['max'], values)))
+
+def format_summary(histogram, label='latency'):
+    count, *values = histogram.summary()
+    return (f'{label} over {count} messages: '
+            + ' '.join(f'{name} {value / 1e6:.2f}ms' for name, value in
+                       zip([name for name, _ in PERCENTILES] + ['max'], values)))
+
+def read_slices(path):
+    """Slice rows from a CSV export, as dicts with datetime starts and float milliseconds"""
+    with open(path, newline='') as f:
+        rows = []
+        for row in csv.DictReader(f):
+            parsed = {field: float(row[field]) for field in SLICE_FIELDS[1:]}
+            parsed['start'] = datetime.datetime.fromisoformat(row['start'])
+            rows.append(parsed)
+    return rows
+
+def read_timeline(path):
+    """(name, start, end) for each test case in a failover_harness.py --timeline export"""
+    with open(path, newline='') as f:
+        return [(row['case'], datetime.datetime.fromisoformat(row['start']),
+                 datetime.datetime.fromisoformat(row['end']))
+                for row in csv.DictReader(f)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Show per-slice latency percentiles exported by load_consumer.py, flagging spikes')
+    parser.add_argument('csv', help='slice CSV written by load_consumer.py --latency-csv')
+    parser.add_argument('--timeline', metavar='FILE',
+                        help='label slices with the test case running, from failover_harness.py '
+                             '--timeline')
+    parser.add_argument('--spike', type=float, default=SPIKE_FACTOR,
+                        help='flag slices whose p99 is this many times the median p99 '
+                             f'(default: {SPIKE_FACTOR:g})')
+    parser.add_argument('--spikes-only', action='store_true',
+                        help='only show spikes and slices without deliveries')
+    args = parser.parse_args(argv)
+
+    try:
+        rows = read_slices(args.csv)
+        timeline = read_timeline(args.timeline) if args.timeline else []
+    except (OSError, ValueError, KeyError) as e:
+        parser.error(str(e))
+    if not rows:
+        print(f'No slices in {args.csv}')
+        return 0
+
+    baseline = statistics.median([row['p99'] for row in rows if row['count']] or [0])
+    spikes = empty = 0
+    for row in rows:
+        spike = baseline and row['count'] and row['p99'] >= args.spike * baseline
+        spikes += bool(spike)
+        empty += not row['count']
+        if args.spikes_only and not spike and row['count']:
+            continue
+        end = row['start'] + datetime.timedelta(seconds=row['seconds'])
+        cases = [name for name, start, finish in timeline if start < end and finish > row['start']]
+        flag = '  SPIKE' if spike else '' if row['count'] else '  NO DELIVERIES'
+        print(f"{row['start'].isoformat(timespec='milliseconds')}  {int(row['count']):8d} msgs  "
+              + '  '.join(f'{name} {row[name]:8.2f}ms' for name in SLICE_FIELDS[3:])
+              + flag + (f"  [{', '.join(cases)}]" if cases else ''))
+    print(f'{len(rows)} slice(s), median p99 {baseline:.2f}ms, {spikes} spike(s) at '
+          f'{args.spike:g}x or more, {empty} slice(s) without deliveries')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Batched-ack consumer benchmark: throughput across prefetch and ack batch sizes
+"""
+
+import argparse
+import asyncio
+import collections
+import random
+import sys
+import time
+
+from latency_histogram import SlicedLatency, format_slice, format_summary
+from load_producer import (AmqpPublisher, ProducerStats, add_connection_arguments, connect,
+                           connection_settings, import_aio_pika, publish_loop)
+from sequence_tracker import SequenceStamper, SequenceTracker, read_stamp
+
+DEFAULT_PREFETCH = '10,50,100,250,500,1000'
+DEFAULT_ACK_BATCH = '1,10,50,100'
+
+class AmqpSource:
+    """Messages from a queue on their own channel, with prefetch set"""
+
+    def __init__(self, channel, iterator):
+        self.channel = channel
+        self.iterator = iterator
+
+    @classmethod
+    async def open(cls, connection, queue, prefetch):
+        channel = await connection.channel()
+        await channel.set_qos(prefetch_count=prefetch)
+        queue = await channel.get_queue(queue, ensure=True)
+        return cls(channel, queue.iterator())
+
+    def __aiter__(self):
+        return self.iterator.__aiter__()
+
+    async def close(self):
+        await self.iterator.close()
+        if not self.channel.is_closed:
+            await self.channel.close()
+
+class LoopbackMessage:
+    __slots__ = ('source', 'tag', 'body')
+
+    def __init__(self, source, tag, body):
+        self.source = source
+        self.tag = tag
+        self.body = body
+
+    async def ack(self, multiple=False):
+        self.source.acked(self.tag, multiple)
+
+class LoopbackBroker:
+    """In-process queue that delivers and takes acks with a simulated network round trip
+
+    Each channel has at most prefetch unacknowledged deliveries; a delivery
+    arrives half a round trip after credit frees up and an ack frees
+    credit half a round trip after it is sent, as over a real link.
+    Bodies are sequence-stamped, and unacknowledged ones are redelivered
+    when their channel closes.
+    """
+
+    def __init__(self, rtt, size, backlog=None):
+        self.rtt = rtt
+        self.backlog = backlog
+        self.stamper = SequenceStamper(random.getrandbits(32), size)
+        self.requeued = collections.deque()
+
+    def publish(self, count):
+        """Add count messages; a broker without a backlog limit stays unlimited"""
+        if self.backlog is not None:
+            self.backlog += count
+
+    def requeue(self, bodies):
+        self.requeued.extendleft(reversed(bodies))
+
+    def take(self):
+        """Body of the next message, or None if the queue is empty"""
+        if self.requeued:
+            return self.requeued.popleft()
+        if self.backlog is None:
+            return self.stamper.next_body()
+        if self.backlog:
+            self.backlog -= 1
+            return self.stamper.next_body()
+        return None
+
+class LoopbackSource:
+    """A consumer channel on a LoopbackBroker"""
+
+    def __init__(self, broker, prefetch):
+        self.broker = broker
+        self.prefetch = prefetch
+        self.loop = asyncio.get_running_loop()
+        self.arrived = asyncio.Queue()
+        self.tag = 0
+        self.unacked = collections.OrderedDict()
+        self.pump()
+
+    def pump(self):
+        while len(self.unacked) < self.prefetch:
+            body = self.broker.take()
+            if body is None:
+                break
+            self.tag += 1
+            self.unacked[self.tag] = body
+            self.loop.call_later(self.broker.rtt / 2, self.arrived.put_nowait,
+                                 LoopbackMessage(self, self.tag, body))
+
+    def acked(self, tag, multiple):
+        self.loop.call_later(self.broker.rtt / 2, self._settle, tag, multiple)
+
+    def _settle(self, tag, multiple):
+        if multiple:
+            while self.unacked and next(iter(self.unacked)) <= tag:
+                self.unacked.popitem(last=False)
+        else:
+            self.unacked.pop(tag, None)
+        self.pump()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.arrived.get()
+
+    async def close(self):
+        # Acks sent before the close still arrive first, as on a real channel
+        await asyncio.sleep(self.broker.rtt / 2)
+        self.broker.requeue(list(self.unacked.values()))
+        self.unacked.clear()
+
+class StepStats:
+    """Deliveries and ack frames for one prefetch / ack batch combination"""
+
+    def __init__(self):
+        self.received = 0
+        self.acked = 0
+        self.ack_frames = 0
+        self.first = None
+        self.last = None
+
+    def delivered(self):
+        now = time.perf_counter_ns()
+        if self.first is None:
+            self.first = now
+        self.last = now
+        self.received += 1
+
+    @property
+    def seconds(self):
+        return (self.last - self.first) / 1e9 if self.received > 1 else 0.0
+
+    @property
+    def rate(self):
+        return (self.received - 1) / self.seconds if self.seconds else 0.0
+
+class BatchAcker:
+    """Acks processed messages with multiple=True once batch of them are waiting
+
+    Messages on a channel are processed in order, so acking the latest
+    covers every earlier one. A timer flushes partial batches so a quiet
+    queue, or a batch larger than the prefetch, cannot stall delivery.
+    """
+
+    def __init__(self, batch, stats):
+        self.batch = batch
+        self.stats = stats
+        self.latest = None
+        self.waiting = 0
+
+    async def processed(self, message):
+        self.latest = message
+        self.waiting += 1
+        if self.waiting >= self.batch:
+            await self.flush()
+
+    async def flush(self):
+        message, count = self.latest, self.waiting
+        self.latest, self.waiting = None, 0
+        if message is None:
+            return
+        await message.ack(multiple=count > 1)
+        self.stats.acked += count
+        self.stats.ack_frames += 1
+
+    async def flush_every(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+async def consume_channel(source, batch, work, flush_interval, stats, tracker=None, latency=None):
+    acker = BatchAcker(batch, stats)
+    flusher = asyncio.ensure_future(acker.flush_every(flush_interval))
+    try:
+        async for message in source:
+            stats.delivered()
+            if tracker is not None:
+                sent = tracker.record(message.body)
+            elif latency is not None:
+                stamp = read_stamp(message.body)
+                sent = stamp and stamp[2]
+            if latency is not None and sent is not None:
+                # Wall clock on both ends: only as good as the hosts' clock sync
+                now = time.time_ns()
+                latency.record(now, now - sent)
+            if work:
+                await asyncio.sleep(work)
+            await acker.processed(message)
+    finally:
+        flusher.cancel()
+        await acker.flush()
+
+async def open_sources(args, prefetch, broker):
+    """(connections, sources) for one step: --channels sources on each of --connections"""
+    if broker is not None:
+        return [], [LoopbackSource(broker, prefetch)
+                    for _ in range(args.connections * args.channels)]
+    connections, sources = [], []
+    for _ in range(args.connections):
+        connection, _host = await connect(args)
+        connections.append(connection)
+        for _ in range(args.channels):
+            sources.append(await AmqpSource.open(connection, args.queue, prefetch))
+    return connections, sources
+
+async def run_step(args, prefetch, batch, broker, tracker=None, latency=None):
+    """Consume until --duration, --messages or --idle seconds without a delivery"""
+    stats = StepStats()
+    connections, sources = await open_sources(args, prefetch, broker)
+    tasks = [asyncio.ensure_future(consume_channel(source, batch, args.work_ms / 1000,
+                                                   args.flush_ms / 1000, stats, tracker, latency))
+             for source in sources]
+    started = time.perf_counter_ns()
+    try:
+        while True:
+            await asyncio.sleep(min(args.idle, 0.05))
+            now = time.perf_counter_ns()
+            if args.duration and now - started >= args.duration * 1e9:
+                break
+            if args.messages and stats.received >= args.messages:
+                break
+            if now - (stats.last or started) >= args.idle * 1e9:
+                break
+            if any(task.done() for task in tasks):
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for source in sources:
+            try:
+                await source.close()
+            except Exception:
+                pass
+        for connection in connections:
+            try:
+                await connection.close()
+            except Exception:
+                pass
+    errors = [result for result in results
+              if isinstance(result, Exception) and not isinstance(result, asyncio.CancelledError)]
+    if errors:
+        raise errors[0]
+    return stats
+
+async def preload(args, count, broker):
+    """Put count messages in the queue so the step drains a backlog"""
+    if broker is not None:
+        broker.publish(count)
+        return
+    connection, _host = await connect(args)
+    try:
+        publisher = AmqpPublisher(await connection.channel(publisher_confirms=True),
+                                  args.queue, args.connect_timeout * 6)
+        stamper = SequenceStamper(random.getrandbits(32), args.size)
+        await publish_loop(publisher, stamper.next_body, 0, 256, ProducerStats(1),
+                           asyncio.Event(), count)
+    finally:
+        await connection.close()
+
+def parse_sizes(text):
+    sizes = sorted({int(size) for size in text.split(',') if size.strip()})
+    if not sizes or sizes[0] < 1:
+        raise ValueError(f'expected comma-separated positive numbers, not {text!r}')
+    return sizes
+
+async def sweep(args):
+    broker = (LoopbackBroker(args.rtt_ms / 1000, args.size, 0 if args.preload else None)
+              if args.dry_run else None)
+    tracker = SequenceTracker() if args.track else None
+    latency = (SlicedLatency(args.slice, lambda row: print(format_slice(row), flush=True))
+               if args.latency else None)
+    results = {}
+    for prefetch in args.prefetch:
+        for batch in args.ack_batch:
+            if batch > prefetch:
+                continue
+            if args.preload:
+                await preload(args, args.preload, broker)
+            stats = await run_step(args, prefetch, batch, broker, tracker, latency)
+            results[prefetch, batch] = stats
+            drained = ' (drained)' if args.preload and stats.received >= args.preload else ''
+            print(f'prefetch {prefetch:5d}  ack batch {batch:5d}  {stats.rate:10.0f} msgs/s  '
+                  f'{stats.received:8d} received in {stats.seconds:.2f}s  '
+                  f'{stats.ack_frames} ack frames{drained}', flush=True)
+    if latency is not None:
+        latency.finish()
+        print(format_summary(latency.total, 'publish-to-deliver latency'))
+        if latency.negative:
+            print(f'{latency.negative} message(s) arrived before their send time: '
+                  'check the clocks on the producer and consumer hosts are in sync')
+        if args.latency_csv:
+            latency.write_csv(args.latency_csv)
+            print(f'Latency slices saved to {args.latency_csv}')
+    if tracker is not None:
+        print(tracker.format())
+        if args.sequence_report:
+            tracker.save(args.sequence_report)
+            print(f'Sequence report saved to {args.sequence_report}')
+    return results
+
+def format_curve(results, prefetches, batches):
+    """Throughput table: a row per prefetch, a column per ack batch size"""
+    lines = ['msgs/s by prefetch (rows) and ack batch (columns)',
+             'prefetch' + ''.join(f'{batch:>10d}' for batch in batches)]
+    for prefetch in prefetches:
+        cells = [f'{results[prefetch, batch].rate:10.0f}' if (prefetch, batch) in results
+                 else f'{"-":>10}' for batch in batches]
+        lines.append(f'{prefetch:8d}' + ''.join(cells))
+    if results:
+        (prefetch, batch), best = max(results.items(), key=lambda item: item[1].rate)
+        lines.append(f'best: prefetch {prefetch}, ack batch {batch} ({best.rate:.0f} msgs/s)')
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Measure consumer throughput for each combination of prefetch count and '
+                    'multiple-ack batch size, e.g. to pick settings that drain a backlog quickly')
+    add_connection_arguments(parser)
+    parser.add_argument('--prefetch', default=DEFAULT_PREFETCH,
+                        help=f'prefetch counts to sweep (default: {DEFAULT_PREFETCH})')
+    parser.add_argument('--ack-batch', default=DEFAULT_ACK_BATCH,
+                        help='messages per multiple-ack; sizes above the prefetch are skipped '
+                             f'(default: {DEFAULT_ACK_BATCH})')
+    parser.add_argument('--connections', type=int, default=1, help='connections (default: 1)')
+    parser.add_argument('--channels', type=int, default=1,
+                        help='consuming channels per connection (default: 1)')
+    parser.add_argument('--work-ms', type=float, default=0,
+                        help='simulated processing time per message; the sample consumer '
+                             'sleeps 50 (default: 0)')
+    parser.add_argument('--flush-ms', type=float, default=50,
+                        help='ack a partial batch after this long (default: 50)')
+    parser.add_argument('--preload', type=int, default=0, metavar='N',
+                        help='publish N messages before each step and time draining them')
+    parser.add_argument('--size', type=int, default=256,
+                        help='body bytes of preloaded messages (default: 256)')
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='longest a step runs, in seconds (default: 10)')
+    parser.add_argument('--messages', type=int, default=0,
+                        help='end a step after this many deliveries (default: no limit)')
+    parser.add_argument('--idle', type=float, default=2.0,
+                        help='end a step after this many seconds without a delivery (default: 2)')
+    parser.add_argument('--track', action='store_true',
+                        help="account for every producer sequence number: lost, duplicated and "
+                             'out-of-order ranges')
+    parser.add_argument('--sequence-report', metavar='FILE',
+                        help='save the --track report, e.g. for failover_harness.py (implies --track)')
+    parser.add_argument('--latency', action='store_true',
+                        help='record publish-to-deliver latency from the send times load_producer.py '
+                             'stamps, printing p50/p99/p99.9/max for every --slice')
+    parser.add_argument('--slice', type=float, default=1.0, metavar='SECONDS',
+                        help='length of a --latency time slice (default: 1)')
+    parser.add_argument('--latency-csv', metavar='FILE',
+                        help='save the --latency slices for latency_histogram.py (implies --latency)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='consume from an in-process queue instead of connecting')
+    parser.add_argument('--rtt-ms', type=float, default=0.5,
+                        help='network round trip simulated by --dry-run (default: 0.5)')
+    args = parser.parse_args(argv)
+
+    connection_settings(args, parser)
+    args.track = args.track or bool(args.sequence_report)
+    args.latency = args.latency or bool(args.latency_csv)
+    if args.slice <= 0:
+        parser.error('--slice must be positive')
+    try:
+        args.prefetch = parse_sizes(args.prefetch)
+        args.ack_batch = parse_sizes(args.ack_batch)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.connections < 1 or args.channels < 1:
+        parser.error('--connections and --channels must be at least 1')
+    if not args.dry_run:
+        import_aio_pika()
+    if args.dry_run and not args.preload and not args.messages:
+        args.messages = 100000
+
+    results = asyncio.run(sweep(args))
+    print(format_curve(results, args.prefetch, args.ack_batch))
+    return 0 if results else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+High-throughput asyncio producer for load during the failover tests
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import signal
+import sys
+import time
+
+from latency_histogram import LatencyHistogram
+from sequence_tracker import SequenceStamper
+
+DEFAULT_HOSTS = '192.168.1.101,192.168.1.102,192.168.1.103'
+DEFAULT_QUEUE = 'test-failover-queue'
+HEARTBEAT = 30
+
+# Declare arguments per --queue-type; classic declares no x-queue-type,
+# like the guide's rabbitmqadmin declare
+QUEUE_ARGUMENTS = {'classic': None, 'quorum': {'x-queue-type': 'quorum'}}
+
+# Yield to the event loop at least this often when publishing flat out or catching up
+BURST = 64
+# Behind schedule by more than this many seconds, the rate loop starts afresh rather than bursting
+MAX_LAG = 1.0
+
+def import_aio_pika():
+    """aio_pika, which only the live connections need"""
+    try:
+        import aio_pika
+    except ImportError:
+        sys.exit('aio-pika is needed to connect to RabbitMQ: pip install aio-pika '
+                 '(or use --dry-run to measure the producer alone)')
+    return aio_pika
+
+def add_connection_arguments(parser):
+    """Broker connection options shared by the load tools"""
+    parser.add_argument('--hosts', default=DEFAULT_HOSTS,
+                        help='comma-separated nodes, tried in order on every (re)connect like the '
+                             f'sample scripts (default: {DEFAULT_HOSTS})')
+    parser.add_argument('--port', type=int, default=5672, help='AMQP port (default: 5672)')
+    parser.add_argument('--user', default='admin', help='user name (default: admin)')
+    parser.add_argument('--password', default=os.environ.get('RABBITMQ_PASSWORD', 'password'),
+                        help='password (default: $RABBITMQ_PASSWORD, else the sample\'s)')
+    parser.add_argument('--vhost', default='/', help='virtual host (default: /)')
+    parser.add_argument('--inventory', metavar='FILE',
+                        help='take hosts, user and password from a cluster in this inventory')
+    parser.add_argument('--cluster', metavar='NAME', help='cluster to use from --inventory')
+    parser.add_argument('--queue', default=DEFAULT_QUEUE, help=f'queue (default: {DEFAULT_QUEUE})')
+    parser.add_argument('--connect-timeout', type=float, default=5.0,
+                        help='seconds to wait for each host (default: 5)')
+
+def connection_settings(args, parser):
+    """Fill args.hosts (as a list), user and password, from --inventory when given"""
+    if args.inventory:
+        from doc_variants import load_inventory
+
+        try:
+            clusters = {cluster['name']: cluster for cluster in load_inventory(args.inventory)}
+        except (OSError, ValueError, KeyError) as e:
+            parser.error(f'{args.inventory}: {e}')
+        if args.cluster not in clusters:
+            parser.error(f"--cluster must be one of: {', '.join(clusters)}")
+        cluster = clusters[args.cluster]
+        args.hosts = ','.join(cluster.get('ips') or cluster['hosts'])
+        args.user = cluster.get('user', args.user)
+        args.password = cluster.get('password', args.password)
+    args.hosts = [host.strip() for host in args.hosts.split(',') if host.strip()]
+    if not args.hosts:
+        parser.error('no hosts to connect to')
+
+async def connect(args):
+    """(connection, host) for the first host that accepts a connection
+
+    Like pika.BlockingConnection given a list of parameters, every attempt
+    starts again from the first host.
+    """
+    aio_pika = import_aio_pika()
+    errors = []
+    for host in args.hosts:
+        try:
+            connection = await aio_pika.connect(
+                host=host, port=args.port, login=args.user, password=args.password,
+                virtualhost=args.vhost, timeout=args.connect_timeout, heartbeat=HEARTBEAT)
+            return connection, host
+        except Exception as e:
+            errors.append(f'{host}: {e or type(e).__name__}')
+    raise ConnectionError('; '.join(errors))
+
+class AmqpPublisher:
+    """Publishes a shared body to a queue on a channel with publisher confirms"""
+
+    def __init__(self, channel, queue, timeout):
+        import aio_pika
+
+        self.channel = channel
+        self.exchange = channel.default_exchange
+        self.queue = queue
+        self.timeout = timeout
+        self.message = aio_pika.Message
+        self.persistent = aio_pika.DeliveryMode.PERSISTENT
+
+    @property
+    def closed(self):
+        return self.channel.is_closed
+
+    def publish(self, body):
+        """Coroutine that completes when the broker confirms, and raises if it nacks"""
+        return self.exchange.publish(self.message(body, delivery_mode=self.persistent),
+                                     routing_key=self.queue, timeout=self.timeout)
+
+    async def close(self):
+        if not self.channel.is_closed:
+            await self.channel.close()
+
+class LoopbackPublisher:
+    """Confirms every publish on the next loop iteration, to measure the producer alone"""
+    closed = False
+
+    async def publish(self, body):
+        await asyncio.sleep(0)
+
+    async def close(self):
+        pass
+
+class ProducerStats:
+    """Counts, confirm latencies and failover windows across every channel
+
+    Latencies are nanoseconds on time.perf_counter_ns(), in fixed-size
+    histograms for the report interval and for the whole run.
+    """
+
+    def __init__(self, connections):
+        self.started = time.perf_counter_ns()
+        self.sent = self.confirmed = self.nacked = self.failed = self.skipped = 0
+        self.latencies = LatencyHistogram()
+        self.interval = LatencyHistogram()
+        self.hosts = [None] * connections
+        self.outages = {}
+        self.events = []
+        self.window = None
+        self.windows = []
+        self.max_in_flight = 0
+        self._last = (self.started, 0, 0)
+
+    @property
+    def in_flight(self):
+        return self.sent - self.confirmed - self.nacked - self.failed
+
+    def elapsed(self, now=None):
+        return ((now or time.perf_counter_ns()) - self.started) / 1e9
+
+    def published(self):
+        self.sent += 1
+        if self.in_flight > self.max_in_flight:
+            self.max_in_flight = self.in_flight
+
+    def settled(self, sent, future):
+        if future.cancelled() or future.exception() is not None:
+            exception = None if future.cancelled() else future.exception()
+            if type(exception).__name__ == 'DeliveryError':
+                self.nacked += 1
+            else:
+                self.failed += 1
+            return
+        latency = time.perf_counter_ns() - sent
+        self.confirmed += 1
+        self.interval.record(latency)
+        self.latencies.record(latency)
+
+    def disconnected(self, index, error):
+        now = time.perf_counter_ns()
+        if index not in self.outages:
+            self.outages[index] = (now, self.hosts[index], str(error))
+        self.hosts[index] = None
+        if self.window is None:
+            self.window = [now, self.failed, self.nacked, self.in_flight]
+
+    def connected(self, index, host):
+        now = time.perf_counter_ns()
+        self.hosts[index] = host
+        outage = self.outages.pop(index, None)
+        if outage:
+            started, lost, error = outage
+            self.events.append((self.elapsed(started), index, lost, host, (now - started) / 1e9, error))
+        if self.window is not None and not self.outages:
+            started, failed, nacked, in_flight = self.window
+            self.windows.append((self.elapsed(started), (now - started) / 1e9,
+                                 self.failed - failed, self.nacked - nacked, in_flight))
+            self.window = None
+
+    def report(self):
+        """One line for the interval since the last report"""
+        now = time.perf_counter_ns()
+        last, sent, confirmed = self._last
+        seconds = (now - last) / 1e9 or 1e-9
+        latencies = self.interval
+        self._last = (now, self.sent, self.confirmed)
+        up = sum(host is not None for host in self.hosts)
+        line = (f'{self.elapsed(now):8.1f}s  sent {(self.sent - sent) / seconds:9.0f}/s  '
+                f'confirmed {(self.confirmed - confirmed) / seconds:9.0f}/s  '
+                f'unconfirmed {self.in_flight:6d}  nacked {self.nacked}  failed {self.failed}  '
+                f'confirm p50 {latencies.percentile(0.5) / 1e6:.2f}ms '
+                f'p99 {latencies.percentile(0.99) / 1e6:.2f}ms '
+                f'max {latencies.max / 1e6:.2f}ms  '
+                f'connections {up}/{len(self.hosts)}')
+        self.interval.reset()
+        return line
+
+    def summary(self):
+        seconds = self.elapsed() or 1e-9
+        latencies = self.latencies
+        lines = [
+            f'{self.sent} sent, {self.confirmed} confirmed, {self.nacked} nacked, '
+            f'{self.failed} failed, {self.in_flight} unconfirmed at exit in {seconds:.1f}s '
+            f'({self.confirmed / seconds:.0f} confirmed/s)',
+            f'confirm latency p50 {latencies.percentile(0.5) / 1e6:.2f}ms '
+            f'p99 {latencies.percentile(0.99) / 1e6:.2f}ms '
+            f'p99.9 {latencies.percentile(0.999) / 1e6:.2f}ms '
+            f'max {latencies.max / 1e6:.2f}ms; '
+            f'at most {self.max_in_flight} unconfirmed',
+        ]
+        if self.skipped:
+            lines.append(f'{self.skipped} send slot(s) skipped after falling over {MAX_LAG:g}s behind')
+        for at, index, lost, host, seconds, error in self.events:
+            lines.append(f"connection {index}: lost {lost or 'its first connection'} at {at:.1f}s "
+                         f'({error}), '
+                         f'reconnected to {host} after {seconds:.3f}s')
+        for at, seconds, failed, nacked, in_flight in self.windows:
+            lines.append(f'failover window at {at:.1f}s for {seconds:.3f}s: {failed} failed and '
+                         f'{nacked} nacked of {in_flight} unconfirmed when it began')
+        return '\n'.join(lines)
+
+async def publish_loop(publisher, next_body, rate, window, stats, stop, limit):
+    """Publish next_body() at rate messages/s (0: as fast as the window allows) until stop or limit
+
+    Sends are scheduled on absolute times, so sleep granularity and slow
+    iterations do not accumulate into drift. At most window publishes are
+    awaiting their confirm at once.
+    """
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(window)
+    interval = 1 / rate if rate else 0
+    next_at = loop.time()
+    burst = 0
+    while not stop.is_set() and not (limit and stats.sent >= limit):
+        if publisher.closed:
+            raise ConnectionError('channel closed')
+        if interval:
+            delay = next_at - loop.time()
+            if delay < -MAX_LAG:
+                stats.skipped += int(-delay / interval)
+                next_at = loop.time()
+            elif delay > 0:
+                await asyncio.sleep(delay)
+                burst = 0
+            next_at += interval
+        burst += 1
+        if burst >= BURST:
+            await asyncio.sleep(0)
+            burst = 0
+        await slots.acquire()
+        sent = time.perf_counter_ns()
+        future = asyncio.ensure_future(publisher.publish(next_body()))
+        stats.published()
+
+        def settled(future, sent=sent):
+            slots.release()
+            stats.settled(sent, future)
+        future.add_done_callback(settled)
+    # Let this channel's outstanding confirms arrive before its connection closes
+    for _ in range(window):
+        await slots.acquire()
+
+async def run_connection(index, args, bodies, stats, stop):
+    """Keep one connection and its channels publishing, reconnecting through the host list
+
+    bodies has a next_body function per channel; it carries on across
+    reconnects, so sequence numbers continue where they left off.
+    """
+    rate = args.rate / (args.connections * args.channels)
+    while not stop.is_set():
+        try:
+            if args.dry_run:
+                connection, host = None, 'loopback'
+                publishers = [LoopbackPublisher() for _ in range(args.channels)]
+            else:
+                connection, host = await connect(args)
+                publishers = [AmqpPublisher(await connection.channel(publisher_confirms=True),
+                                            args.queue, args.confirm_timeout)
+                              for _ in range(args.channels)]
+        except Exception as e:
+            stats.disconnected(index, e)
+            await asyncio.sleep(args.retry)
+            continue
+        stats.connected(index, host)
+        tasks = [asyncio.ensure_future(publish_loop(publisher, next_body, rate, args.window, stats,
+                                                    stop, args.messages))
+                 for publisher, next_body in zip(publishers, bodies)]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in pending:
+            task.cancel()
+        errors = [task.exception() for task in done if not task.cancelled() and task.exception()]
+        if connection is not None:
+            try:
+                await connection.close()
+            except Exception:
+                pass
+        if not errors:
+            return
+        stats.disconnected(index, errors[0])
+        await asyncio.sleep(args.retry)
+
+async def declare_queue(args):
+    """Declare the queue durable with the --queue-type arguments
+
+    A queue that already exists with other settings closes the channel
+    with PRECONDITION_FAILED, which ends the run with an explanation.
+    """
+    connection, _host = await connect(args)
+    try:
+        channel = await connection.channel()
+        await channel.declare_queue(args.queue, durable=True, arguments=QUEUE_ARGUMENTS[args.queue_type])
+    except Exception as e:
+        if type(e).__name__ != 'ChannelPreconditionFailed':
+            raise
+        sys.exit(f'Queue {args.queue} already exists with other settings than a durable '
+                 f'{args.queue_type} queue ({e}); use the matching --queue-type, or --no-declare')
+    finally:
+        await connection.close()
+
+async def produce(args):
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    if args.duration:
+        loop.call_later(args.duration, stop.set)
+    if args.declare and not args.dry_run:
+        await declare_queue(args)
+
+    if args.sequence:
+        # One sequence stream per channel, under a random run id so that
+        # several producer processes never share a stream
+        run_id = random.getrandbits(16) << 16
+        bodies = [[SequenceStamper(run_id | (index * args.channels + channel), args.size).next_body
+                   for channel in range(args.channels)] for index in range(args.connections)]
+        print(f'Stamping sequence numbers and send times on streams {run_id:#010x}-'
+              f'{run_id | (args.connections * args.channels - 1):#010x}', file=sys.stderr)
+    else:
+        # Every message shares one immutable body, allocated once
+        body = bytes(args.size)
+        bodies = [[itertools.repeat(body).__next__] * args.channels] * args.connections
+    stats = ProducerStats(args.connections)
+    connections = [asyncio.ensure_future(run_connection(index, args, bodies[index], stats, stop))
+                   for index in range(args.connections)]
+
+    async def report():
+        while True:
+            await asyncio.sleep(args.report_interval)
+            print(stats.report(), flush=True)
+    reporter = asyncio.ensure_future(report())
+    await asyncio.gather(*connections)
+    reporter.cancel()
+    print(stats.report())
+    print(stats.summary())
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Publish persistent messages at a controlled rate over many connections and '
+                    'channels, reporting throughput, confirm latency and unconfirmed messages')
+    add_connection_arguments(parser)
+    parser.add_argument('--connections', type=int, default=1, help='connections (default: 1)')
+    parser.add_argument('--channels', type=int, default=1,
+                        help='publishing channels per connection (default: 1)')
+    parser.add_argument('--rate', type=float, default=0,
+                        help='target messages/s across all channels (default: 0, as fast as possible)')
+    parser.add_argument('--window', type=int, default=256,
+                        help='unconfirmed messages allowed per channel (default: 256)')
+    parser.add_argument('--size', type=int, default=256, help='message body bytes (default: 256)')
+    parser.add_argument('--no-sequence', dest='sequence', action='store_false',
+                        help='send one shared body instead of stamping a sequence number and send '
+                             'time on each message for load_consumer.py --track and --latency')
+    parser.add_argument('--messages', type=int, default=0,
+                        help='stop after this many messages (default: 0, no limit)')
+    parser.add_argument('--duration', type=float, default=0,
+                        help='stop after this many seconds (default: 0, until interrupted)')
+    parser.add_argument('--report-interval', type=float, default=1.0,
+                        help='seconds between progress lines (default: 1)')
+    parser.add_argument('--confirm-timeout', type=float, default=30.0,
+                        help='seconds before an unconfirmed publish counts as failed (default: 30)')
+    parser.add_argument('--retry', type=float, default=1.0,
+                        help='seconds between reconnect attempts (default: 1)')
+    parser.add_argument('--queue-type', choices=list(QUEUE_ARGUMENTS), default='classic',
+                        help='type to declare the queue as (default: classic, as the guide creates it)')
+    parser.add_argument('--no-declare', dest='declare', action='store_false',
+                        help='do not declare the queue first')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='confirm locally instead of connecting, to measure the producer alone')
+    args = parser.parse_args(argv)
+
+    connection_settings(args, parser)
+    if args.connections < 1 or args.channels < 1 or args.window < 1:
+        parser.error('--connections, --channels and --window must be at least 1')
+    if not args.dry_run:
+        import_aio_pika()
+    stats = asyncio.run(produce(args))
+    return 1 if stats.failed or stats.nacked else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
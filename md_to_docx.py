@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Convert the Markdown runbooks to .docx in a single streaming pass
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+from doc_helpers import (new_document, add_heading, add_code_block, add_table_with_header,
+                         styled_paragraph, styled_run)
+from docx_package import save_document
+from streaming_docx import StreamingDocument
+
+MARKDOWN_SOURCES = [
+    'RabbitMQ_Cluster_Failover_Test_Cases.md',
+    'Redis_Cluster_Failover_Test_Cases.md',
+    'RabbitMQ_OS_Patching_Instructions.md',
+    'Redis_OS_Patching_Instructions.md',
+    'OS_Prerequisites_RabbitMQ_Redis_Confluence.md',
+]
+
+# Kept apart from the generator outputs, which share some file names
+DEFAULT_OUTPUT_DIR = 'runbooks'
+
+_HEADING = re.compile(r'(#{1,6})\s+(.*?)\s*#*$')
+_FENCE = re.compile(r'(```|~~~)')
+_RULE = re.compile(r'([-*_])(\s*\1){2,}$')
+_BULLET = re.compile(r'[-*+]\s+(?:\[([ xX])\]\s+)?(.*)$')
+_NUMBERED = re.compile(r'\d+\.\s+')
+_TABLE_DIVIDER = re.compile(r'\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?$')
+_CELL_SPLIT = re.compile(r'(?<!\\)\|')
+_INLINE = re.compile(r'\*\*(.+?)\*\*|`([^`]+)`|\[([^\]]+)\]\([^)]*\)')
+
+def plain_text(text):
+    """Strip inline Markdown markup, keeping the visible text"""
+    return _INLINE.sub(lambda m: (m.group(1) or m.group(2) or m.group(3)).replace('`', ''), text)
+
+def add_inline(para, text):
+    """Add text to a paragraph as runs, one per inline bold/code span"""
+    pos = 0
+    for match in _INLINE.finditer(text):
+        if match.start() > pos:
+            para.add_run(text[pos:match.start()])
+        bold, code, link = match.groups()
+        if bold is not None:
+            styled_run(para, bold.replace('`', ''), 'Strong')
+        elif code is not None:
+            styled_run(para, code, 'InlineCode')
+        else:
+            para.add_run(link)
+        pos = match.end()
+    if pos < len(text):
+        para.add_run(text[pos:])
+    return para
+
+def split_row(line):
+    """Cells of a pipe-table row, with escaped pipes restored"""
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|') and not line.endswith('\\|'):
+        line = line[:-1]
+    return [plain_text(cell.strip().replace('\\|', '|')) for cell in _CELL_SPLIT.split(line)]
+
+class _LineReader:
+    """Markdown lines as (text, quoted) with blockquote markers removed"""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._pushed = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._pushed is not None:
+            line, self._pushed = self._pushed, None
+            return line
+        text = next(self._lines).rstrip('\r\n')
+        stripped = text.lstrip()
+        if stripped.startswith('>'):
+            return stripped[2:] if stripped.startswith('> ') else stripped[1:], True
+        return text, False
+
+    def push(self, line):
+        """Return a line so the next iteration yields it again"""
+        self._pushed = line
+
+class MarkdownConverter:
+    """Render Markdown lines into a document through the shared helpers
+
+    Handles headings, pipe tables, fenced code, bullet/task/numbered
+    lists, blockquotes, horizontal rules and inline bold/code/links.
+    Only the current block is held in memory.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._paragraph = []
+        self._quoted = False
+
+    def convert(self, lines):
+        """Consume lines and render every block"""
+        reader = _LineReader(lines)
+        for text, quoted in reader:
+            stripped = text.strip()
+            if not stripped:
+                self._flush()
+            elif _FENCE.match(stripped):
+                self._flush()
+                self._code_block(reader, _FENCE.match(stripped).group(1))
+            elif stripped.startswith('#') and _HEADING.match(stripped):
+                self._flush()
+                hashes, title = _HEADING.match(stripped).groups()
+                add_heading(self.doc, plain_text(title), len(hashes) - 1)
+            elif _RULE.match(stripped):
+                self._flush()
+                self.doc.add_page_break()
+            elif stripped.startswith('|'):
+                self._flush()
+                self._table(reader, stripped, quoted)
+            elif _BULLET.match(stripped):
+                self._flush()
+                checkbox, item = _BULLET.match(stripped).groups()
+                if checkbox is not None:
+                    item = ('☐ ' if checkbox == ' ' else '☑ ') + item
+                add_inline(styled_paragraph(self.doc, '', 'ListBullet'), item)
+            elif _NUMBERED.match(stripped):
+                self._flush()
+                add_inline(styled_paragraph(self.doc, '', 'Body'), stripped)
+            else:
+                if self._paragraph and quoted != self._quoted:
+                    self._flush()
+                self._paragraph.append(stripped)
+                self._quoted = quoted
+        self._flush()
+        return self.doc
+
+    def _flush(self):
+        """Emit the pending paragraph, if any"""
+        if self._paragraph:
+            style = 'Note' if self._quoted else 'Body'
+            add_inline(styled_paragraph(self.doc, '', style), ' '.join(self._paragraph))
+            self._paragraph = []
+
+    def _code_block(self, reader, fence):
+        code = []
+        for text, _quoted in reader:
+            if text.strip().startswith(fence):
+                break
+            code.append(text)
+        add_code_block(self.doc, '\n'.join(code))
+
+    def _table(self, reader, header_line, quoted):
+        divider = next(reader, None)
+        if divider is None or not _TABLE_DIVIDER.match(divider[0].strip()):
+            # A lone pipe line, not a table
+            if divider is not None:
+                reader.push(divider)
+            add_inline(styled_paragraph(self.doc, '', 'Body'), header_line)
+            return
+        headers = split_row(header_line)
+        add_table_with_header(self.doc, headers, self._table_rows(reader, len(headers), quoted))
+
+    def _table_rows(self, reader, width, quoted):
+        for text, line_quoted in reader:
+            if line_quoted != quoted or not text.strip().startswith('|'):
+                reader.push((text, line_quoted))
+                return
+            cells = split_row(text)
+            yield (cells + [''] * width)[:width]
+
+def convert_markdown(lines, doc):
+    """Render Markdown lines into doc and return it"""
+    return MarkdownConverter(doc).convert(lines)
+
+def convert_file(source, output, backend='docx'):
+    """Convert one Markdown file to a .docx file; True if the output changed"""
+    with open(source, encoding='utf-8') as f:
+        doc = StreamingDocument(output) if backend == 'stream' else new_document()
+        return save_document(convert_markdown(f, doc), output)
+
+def output_path(source, output_dir):
+    """Default .docx path for a Markdown source"""
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(output_dir, stem + '.docx')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert the Markdown runbooks to .docx')
+    parser.add_argument('sources', nargs='*', metavar='FILE.md',
+                        help='Markdown files to convert (default: all runbooks)')
+    parser.add_argument('-o', '--output-dir', default=DEFAULT_OUTPUT_DIR,
+                        help=f'directory to write the .docx files to (default: {DEFAULT_OUTPUT_DIR})')
+    parser.add_argument('--backend', choices=('docx', 'stream'), default='docx',
+                        help='python-docx object tree or streaming writer')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for source in args.sources or MARKDOWN_SOURCES:
+        output = output_path(source, args.output_dir)
+        start = time.perf_counter()
+        changed = convert_file(source, output, args.backend)
+        print(f'{time.perf_counter() - start:>7.3f}s  {source} -> {output}'
+              f"{'' if changed else ' (unchanged)'}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
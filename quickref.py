@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Emergency quick-reference commands from the runbooks, served from a precompiled data file
+"""
+
+# Startup time matters here: only sys, os and marshal are imported on the
+# normal path. Markdown parsing (compile) and argparse (--help, usage
+# errors) are imported only when needed.
+import marshal
+import os
+import sys
+
+DATA_VERSION = 1
+DEFAULT_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.quickref')
+
+# Runbook sections compiled into the data file, by heading text
+QUICKREF_SECTIONS = ('quick reference', 'monitoring and validation commands',
+                     'monitoring commands reference')
+
+# (source prefix, scenario) for each runbook kind
+SCENARIOS = (('_OS_Patching_', 'patching'), ('_Cluster_Failover_', 'failover'),
+             ('OS_Prerequisites_', 'prerequisites'))
+PRODUCTS = ('rabbitmq', 'redis')
+
+# Options inserted after these tools to point them at another node
+NODE_OPTIONS = {
+    'redis-cli': ('-h', ' -h {host}'),
+    'rabbitmqctl': ('-n', ' -n rabbit@{host}'),
+    'rabbitmq-diagnostics': ('-n', ' -n rabbit@{host}'),
+    'rabbitmq-plugins': ('-n', ' -n rabbit@{host}'),
+}
+
+# name -> (short flag, long flag, metavar or None for a switch, help)
+OPTIONS = {
+    'product': ('-p', '--product', 'PRODUCT', f"only {' or '.join(PRODUCTS)} commands"),
+    'scenario': ('-s', '--scenario', 'SCENARIO',
+                 'only commands from one kind of runbook: '
+                 + ', '.join(scenario for _prefix, scenario in SCENARIOS)),
+    'node': ('-n', '--node', 'HOST',
+             'point redis-cli and rabbitmqctl at this node; a number N means the '
+             "runbooks' <product>-nodeN"),
+    'plain': ('-1', '--plain', None, 'print only the commands, one snippet per line'),
+    'list': ('-l', '--list', None, 'list the sections in the data file'),
+    'compile': (None, '--compile', None, 'rebuild the data file from the runbooks'),
+    'data': (None, '--data', 'PATH', 'data file (default: .quickref next to this script)'),
+}
+
+def _parser():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Show the quick-reference and monitoring commands from the runbooks. '
+                    'Terms filter snippets by product, scenario, section, title or command text.')
+    parser.add_argument('terms', nargs='*', metavar='TERM', help='words every snippet must contain')
+    for name, (short, long, metavar, help_text) in OPTIONS.items():
+        flags = [flag for flag in (short, long) if flag]
+        if metavar:
+            parser.add_argument(*flags, dest=name, metavar=metavar, help=help_text)
+        else:
+            parser.add_argument(*flags, dest=name, action='store_true', help=help_text)
+    return parser
+
+def _parse_slow(argv):
+    options = vars(_parser().parse_args(argv))
+    return options, options.pop('terms')
+
+def parse_argv(argv):
+    """(options, terms) from the command line without importing argparse
+
+    Anything unusual (--help, combined short flags, errors) goes to the
+    argparse parser instead, so help and usage messages stay standard.
+    """
+    flags = {}
+    for name, (short, long, metavar, _help) in OPTIONS.items():
+        for flag in (short, long):
+            if flag:
+                flags[flag] = (name, metavar)
+    options = {name: None if metavar else False
+               for name, (_short, _long, metavar, _help) in OPTIONS.items()}
+    terms = []
+    args = iter(argv)
+    for arg in args:
+        flag, equals, value = arg.partition('=') if arg.startswith('--') else (arg, '', None)
+        if arg == '--':
+            terms.extend(args)
+        elif flag in flags:
+            name, metavar = flags[flag]
+            if not metavar:
+                if equals:
+                    return _parse_slow(argv)
+                options[name] = True
+                continue
+            if not equals:
+                value = next(args, None)
+            if value is None:
+                return _parse_slow(argv)
+            options[name] = value
+        elif arg.startswith('-') and len(arg) > 1:
+            return _parse_slow(argv)
+        else:
+            terms.append(arg)
+    return options, terms
+
+def scenario_of(source):
+    for prefix, scenario in SCENARIOS:
+        if prefix in source:
+            return scenario
+    return ''
+
+def products_of(source, subsection):
+    """Products a snippet applies to: from the file name, else the subsection"""
+    for text in (os.path.basename(source), subsection):
+        found = tuple(product for product in PRODUCTS if product in text.lower())
+        if len(found) == 1:
+            return found
+    return PRODUCTS
+
+def node_targets(command):
+    """((offset, option), ...) where a node option can be inserted, and whether any line runs locally
+
+    A line counts as local when its first tool cannot be pointed at
+    another node, e.g. df or journalctl.
+    """
+    import re
+
+    tools = '|'.join(re.escape(tool) for tool in NODE_OPTIONS)
+    pattern = re.compile(rf'(?:^|[|;&]\s*|\bsudo\s+)({tools})(?![\w-])(?P<rest>[^|;&\n]*)')
+    targets = []
+    for match in pattern.finditer(command):
+        flag, option = NODE_OPTIONS[match.group(1)]
+        if flag not in match.group('rest').split():
+            targets.append((match.end(1), option))
+    local = False
+    for line in command.splitlines():
+        words = line.split()
+        if words and words[0] == 'sudo':
+            words = words[1:]
+        if words and not words[0].startswith('#') and words[0] not in NODE_OPTIONS:
+            local = True
+    return tuple(targets), local
+
+def compile_snippets(root):
+    """Snippet tuples from the quick-reference sections of the Markdown runbooks
+
+    Each is (products, scenario, document, section, title, command,
+    expected, node targets, local, search text).
+    """
+    from doc_model import Table
+    from md_to_docx import MARKDOWN_SOURCES
+    from search_docs import document_blocks, walk_sections
+
+    snippets = []
+    for source in MARKDOWN_SOURCES:
+        scenario = scenario_of(source)
+        for _number, section, subsection, block in walk_sections(
+                document_blocks('markdown', source, root)):
+            if not any(name in section.lower() for name in QUICKREF_SECTIONS):
+                continue
+            products = products_of(source, subsection)
+            entries = []
+            if isinstance(block, Table):
+                headers = [header.lower() for header in block.headers]
+                command_column = next((i for i, header in enumerate(headers) if 'command' in header), None)
+                if command_column is None:
+                    continue
+                title_column = next((i for i, header in enumerate(headers)
+                                     if i != command_column and header not in ('#', 'step')), None)
+                expected_column = next((i for i, header in enumerate(headers) if 'expected' in header), None)
+                for row in block.rows:
+                    entries.append((row[title_column] if title_column is not None else '',
+                                    row[command_column],
+                                    row[expected_column] if expected_column is not None else ''))
+            elif getattr(block, 'style', None) == 'Code' and block.text.strip():
+                entries.append((subsection, block.text.strip('\n'), ''))
+            for title, command, expected in entries:
+                targets, local = node_targets(command)
+                text = ' '.join((' '.join(products), scenario, section, subsection, title,
+                                 command, expected)).lower()
+                snippets.append((products, scenario, source, section, title, command, expected,
+                                 targets, local, text))
+    return snippets
+
+def save_data(path, snippets, root):
+    """Write the data file for snippets compiled from the runbooks under root"""
+    from md_to_docx import MARKDOWN_SOURCES
+
+    sources = [os.path.join(root, source) for source in MARKDOWN_SOURCES]
+    sources += [os.path.join(root, 'md_to_docx.py'), os.path.abspath(__file__)]
+    data = {
+        'version': DATA_VERSION,
+        'sources': {source: os.stat(source).st_mtime_ns for source in sources},
+        'snippets': snippets,
+    }
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        marshal.dump(data, f)
+    os.replace(tmp, path)
+
+def load_data(path):
+    """(snippets, stale) from the data file, or None if it is missing or unreadable
+
+    stale is true when a source changed since the file was compiled.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = marshal.load(f)
+        if data.get('version') != DATA_VERSION:
+            return None
+        stale = False
+        for source, mtime in data['sources'].items():
+            try:
+                stale = stale or os.stat(source).st_mtime_ns != mtime
+            except OSError:
+                stale = True
+        return data['snippets'], stale
+    except (OSError, EOFError, ValueError, TypeError, KeyError):
+        return None
+
+def node_host(node, products):
+    """Host name for --node: a bare number N is the runbooks' <product>-nodeN"""
+    if node.isdigit():
+        return f'{products[0]}-node{node}' if len(products) == 1 else None
+    return node
+
+def targeted(command, targets, host):
+    """command with the node option spliced in at each target and <host> filled in"""
+    parts, pos = [], 0
+    for offset, option in targets:
+        parts.append(command[pos:offset])
+        parts.append(option.format(host=host))
+        pos = offset
+    parts.append(command[pos:])
+    return ''.join(parts).replace('<host>', host)
+
+def main(argv=None):
+    options, terms = parse_argv(sys.argv[1:] if argv is None else argv)
+    path = options['data'] or DEFAULT_DATA
+    loaded = None if options['compile'] else load_data(path)
+    if loaded is None:
+        # Compiling needs the Markdown parser and python-docx: only done on
+        # request, or when there is no data to serve at all
+        root = os.path.dirname(os.path.abspath(__file__))
+        try:
+            snippets = compile_snippets(root)
+        except ImportError as e:
+            print(f'Cannot compile {path}: {e}', file=sys.stderr)
+            return 1
+        try:
+            save_data(path, snippets, root)
+        except OSError as e:
+            if options['compile']:
+                print(f'Cannot write {path}: {e}', file=sys.stderr)
+                return 1
+            print(f'Warning: cannot save compiled snippets to {path}: {e}', file=sys.stderr)
+        else:
+            print(f'Compiled {len(snippets)} snippets into {path}', file=sys.stderr)
+        if options['compile']:
+            return 0
+    else:
+        snippets, stale = loaded
+        if stale:
+            print(f'Warning: the runbooks changed since {path} was compiled; '
+                  f'run {os.path.basename(sys.argv[0])} --compile to refresh it', file=sys.stderr)
+
+    if options['product'] and options['product'].lower() not in PRODUCTS:
+        _parser().error(f"unknown product {options['product']!r}; choose from {', '.join(PRODUCTS)}")
+    product = (options['product'] or '').lower()
+    scenario = (options['scenario'] or '').lower()
+    terms = [term.lower() for term in terms]
+    selected = [snippet for snippet in snippets
+                if (not product or product in snippet[0])
+                and (not scenario or snippet[1].startswith(scenario))
+                and all(term in snippet[9] for term in terms)]
+
+    if options['list']:
+        counts = {}
+        for products, scenario_name, source, section, *_rest in selected:
+            key = (source, section)
+            counts[key] = counts.get(key, 0) + 1
+        for (source, section), count in counts.items():
+            print(f'{count:4d}  {source} › {section}')
+        return 0 if counts else 1
+
+    write = sys.stdout.write
+    heading = None
+    for products, scenario_name, source, section, title, command, expected, targets, local, _text in selected:
+        host = node_host(options['node'], products) if options['node'] else None
+        if host:
+            command = targeted(command, targets, host)
+        if options['plain']:
+            write(command + '\n')
+            continue
+        if (source, section) != heading:
+            heading = (source, section)
+            write(f"\n== {'/'.join(products)} · {scenario_name} · {section}  ({source})\n")
+        write(f'{title}' + (f'  → expect: {expected}' if expected else '') + '\n')
+        if host and local:
+            write(f'  # run on {host}\n')
+        for line in command.splitlines():
+            write(f'  {line}\n')
+    if not selected:
+        print('No matching snippets', file=sys.stderr)
+    return 0 if selected else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
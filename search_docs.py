@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Full-text search across the Markdown runbooks and the generated guides
+"""
+
+import argparse
+import array
+import hashlib
+import importlib
+import marshal
+import math
+import os
+import re
+import sys
+import time
+
+DEFAULT_INDEX = '.search_index'
+INDEX_VERSION = 3
+
+# Every generated guide also depends on the shared helpers, model and section
+# splitting; Markdown runbooks on the parser and the helpers it calls
+GENERATOR_DEPENDENCIES = ['doc_helpers.py', 'doc_model.py', 'section_cache.py']
+MARKDOWN_DEPENDENCIES = ['md_to_docx.py', 'doc_helpers.py', 'doc_model.py']
+
+# Score multipliers by block kind
+KIND_WEIGHTS = {'heading': 3.0, 'code': 1.5, 'table': 1.2, 'item': 1.0, 'text': 1.0}
+
+# Positions skipped between table cells so phrases never span two cells
+CELL_GAP = 2
+
+FRONT_MATTER = '(front matter)'
+
+_TOKEN = re.compile(r'\w+')
+_QUERY = re.compile(r'"([^"]*)"|(\S+)')
+
+def tokenize(text):
+    """Lower-cased word tokens; punctuation separates tokens"""
+    return _TOKEN.findall(text.lower())
+
+def encode_postings(hits):
+    """Pack {block: [positions]} as uint32 block, count, positions... bytes"""
+    values = array.array('I')
+    for block, positions in hits.items():
+        values.append(block)
+        values.append(len(positions))
+        values.extend(positions)
+    return values.tobytes()
+
+def decode_postings(blob):
+    """{block: positions} from encode_postings() bytes"""
+    values = array.array('I')
+    values.frombytes(blob)
+    hits = {}
+    i = 0
+    while i < len(values):
+        count = values[i + 1]
+        hits[values[i]] = values[i + 2:i + 2 + count]
+        i += 2 + count
+    return hits
+
+def document_sources(root):
+    """name -> (kind, target, dependency paths) for every searchable document"""
+    from build_docs import GENERATORS
+    from md_to_docx import MARKDOWN_SOURCES
+
+    sources = {}
+    for source in MARKDOWN_SOURCES:
+        deps = [os.path.join(root, source)]
+        deps += [os.path.join(root, dep) for dep in MARKDOWN_DEPENDENCIES]
+        sources[source] = ('markdown', source, deps)
+    for name, (module_name, _func_name, output) in GENERATORS.items():
+        deps = [os.path.join(root, module_name + '.py')]
+        deps += [os.path.join(root, dep) for dep in GENERATOR_DEPENDENCIES]
+        sources[output] = ('generator', name, deps)
+    return sources
+
+def document_blocks(kind, target, root):
+    """Build the document model for a source and return its blocks"""
+    from doc_model import ModelDocument
+
+    model = ModelDocument()
+    if kind == 'markdown':
+        from md_to_docx import convert_markdown
+        with open(os.path.join(root, target), encoding='utf-8') as f:
+            convert_markdown(f, model)
+    else:
+        from build_docs import GENERATORS
+        module_name, func_name, _output = GENERATORS[target]
+        getattr(importlib.import_module(module_name), func_name)(doc=model)
+    model.close()
+    return model.blocks
+
+def walk_sections(blocks):
+    """Yield (section number, section title, subsection, block) for every block
+
+    Sections start at each top-level heading (Heading1, or the title);
+    deeper headings set the subsection. Section 0 is the front matter.
+    """
+    from doc_model import Table, heading_level
+
+    number, section, subsection = 0, FRONT_MATTER, ''
+    for block in blocks:
+        if not isinstance(block, Table) and block.text.strip():
+            level = heading_level(block.style)
+            if level is not None and level <= 1:
+                number, section, subsection = number + 1, block.text, ''
+            elif level is not None:
+                subsection = block.text
+        yield number, section, subsection, block
+
+def index_blocks(blocks):
+    """Sub-index of one document: sections, blocks and positional postings"""
+    from doc_model import Table, heading_level
+
+    sections = [FRONT_MATTER]
+    records = []
+    postings = {}
+
+    def add(number, subsection, kind, text, tokens):
+        block = len(records)
+        records.append((number, subsection, kind, text))
+        for position, token in tokens:
+            postings.setdefault(token, {}).setdefault(block, []).append(position)
+
+    for number, section, subsection, block in walk_sections(blocks):
+        if number == len(sections):
+            sections.append(section)
+        if isinstance(block, Table):
+            for row in [block.headers] + list(block.rows):
+                tokens, position = [], 0
+                for cell in row:
+                    for token in tokenize(cell):
+                        tokens.append((position, token))
+                        position += 1
+                    position += CELL_GAP
+                add(number, subsection, 'table', ' | '.join(row), tokens)
+            continue
+        text = block.text
+        if not text.strip():
+            continue
+        if heading_level(block.style) is not None:
+            kind = 'heading'
+        elif block.style == 'Code':
+            kind = 'code'
+        elif block.style == 'ListBullet':
+            kind = 'item'
+        else:
+            kind = 'text'
+        add(number, subsection, kind, text, enumerate(tokenize(text)))
+
+    # Postings stay packed on disk and in memory; queries decode only their terms
+    return {
+        'sections': sections,
+        'blocks': records,
+        'postings': {token: encode_postings(hits) for token, hits in postings.items()},
+    }
+
+def file_state(path):
+    """(mtime_ns, size) of a file, or None if it is missing"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def file_hash(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+class SearchIndex:
+    """Per-document positional indexes, refreshed when their sources change"""
+
+    def __init__(self, path=DEFAULT_INDEX, root=None):
+        self.path = path
+        self.root = root or os.path.dirname(os.path.abspath(__file__))
+        self.documents = {}
+        self.dirty = False
+        try:
+            with open(path, 'rb') as f:
+                data = marshal.load(f)
+            if data.get('version') == INDEX_VERSION and data.get('root') == self.root:
+                self.documents = data['documents']
+        except (FileNotFoundError, EOFError, ValueError, TypeError):
+            pass
+
+    def _stale(self, entry):
+        """Whether any dependency changed; refreshes recorded mtimes for touched but identical files"""
+        stale = False
+        for path, (state, digest) in entry['deps'].items():
+            current = file_state(path)
+            if current == state:
+                continue
+            if current is not None and file_hash(path) == digest:
+                entry['deps'][path] = (current, digest)
+                self.dirty = True
+                continue
+            stale = True
+        return stale
+
+    def update(self, sources, force=False):
+        """Re-index documents whose sources changed; returns the names re-indexed"""
+        updated = []
+        for name in list(self.documents):
+            if name not in sources:
+                del self.documents[name]
+                self.dirty = True
+        for name, (kind, target, deps) in sources.items():
+            entry = self.documents.get(name)
+            if entry is not None and not force and not self._stale(entry):
+                continue
+            if not all(os.path.exists(path) for path in deps):
+                continue
+            states = {path: (file_state(path), file_hash(path)) for path in deps}
+            entry = index_blocks(document_blocks(kind, target, self.root))
+            entry['deps'] = states
+            self.documents[name] = entry
+            updated.append(name)
+            self.dirty = True
+        return updated
+
+    def refresh(self, force=False):
+        """Bring the index up to date; the generators are only loaded if something changed"""
+        if force or not self.documents or any(self._stale(entry)
+                                              for entry in self.documents.values()):
+            return self.update(document_sources(self.root), force)
+        return []
+
+    def save(self):
+        """Write the index atomically if it changed"""
+        if not self.dirty:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            marshal.dump({'version': INDEX_VERSION, 'root': self.root,
+                          'documents': self.documents}, f)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+    def search(self, query, limit=10):
+        """Sections matching every query term or "quoted phrase", best first
+
+        Returns (score, document, section, subsection, kind, snippet) tuples.
+        """
+        elements = [tokenize(phrase or word)
+                    for phrase, word in _QUERY.findall(query)]
+        elements = [tokens for tokens in elements if tokens]
+        if not elements:
+            return []
+
+        total_blocks = sum(len(entry['blocks']) for entry in self.documents.values()) or 1
+        results = []
+        for name, entry in self.documents.items():
+            postings, blocks = entry['postings'], entry['blocks']
+            # element -> {block: occurrences}
+            matches = [phrase_matches(postings, tokens) for tokens in elements]
+            if not all(matches):
+                continue
+            section_hits = {}
+            for tokens, hits in zip(elements, matches):
+                idf = math.log(1 + total_blocks / len(hits)) * len(tokens)
+                for block, count in hits.items():
+                    section, subsection, kind, _text = blocks[block]
+                    weight = (1 + math.log(count)) * idf * KIND_WEIGHTS[kind]
+                    per_block = section_hits.setdefault(section, {})
+                    score, found = per_block.get(block, (0.0, 0))
+                    per_block[block] = (score + weight, found + 1)
+            for section, per_block in section_hits.items():
+                found_elements = sum(1 for hits in matches
+                                     if any(blocks[block][0] == section for block in hits))
+                if found_elements < len(elements):
+                    continue
+                best = max(per_block, key=lambda block: (per_block[block][1], per_block[block][0]))
+                scores = sorted((score for score, _found in per_block.values()), reverse=True)
+                score = scores[0] + 0.25 * sum(scores[1:])
+                _section, subsection, kind, text = blocks[best]
+                results.append((score, name, entry['sections'][section], subsection, kind,
+                                snippet(text, elements)))
+        results.sort(key=lambda result: -result[0])
+        return results[:limit]
+
+    def stats(self):
+        """(documents, blocks, distinct terms, postings) across the index"""
+        blocks = sum(len(entry['blocks']) for entry in self.documents.values())
+        terms = {term for entry in self.documents.values() for term in entry['postings']}
+        postings = sum(len(decode_postings(blob)) for entry in self.documents.values()
+                       for blob in entry['postings'].values())
+        return len(self.documents), blocks, len(terms), postings
+
+def phrase_matches(postings, tokens):
+    """{block: occurrences} of consecutive tokens"""
+    first = postings.get(tokens[0])
+    if not first:
+        return {}
+    candidates = {block: set(positions) for block, positions in decode_postings(first).items()}
+    for offset, token in enumerate(tokens[1:], 1):
+        following = decode_postings(postings.get(token, b''))
+        next_candidates = {}
+        for block, starts in candidates.items():
+            if block in following:
+                positions = set(following[block])
+                kept = {start for start in starts if start + offset in positions}
+                if kept:
+                    next_candidates[block] = kept
+        candidates = next_candidates
+        if not candidates:
+            return {}
+    return {block: len(starts) for block, starts in candidates.items()}
+
+def snippet(text, elements, width=100):
+    """The line of text matching the most query elements, shortened around the match"""
+    best_line, best_score, best_term = '', -1, ''
+    for line in text.splitlines():
+        tokens = tokenize(line)
+        if not tokens:
+            continue
+        joined = ' ' + ' '.join(tokens) + ' '
+        score = sum(2 if f" {' '.join(element)} " in joined else element[0] in tokens
+                    for element in elements)
+        if score > best_score:
+            best_line, best_score = line.strip(), score
+            best_term = next((element[0] for element in elements if element[0] in tokens), '')
+    at = best_line.lower().find(best_term) if best_term else 0
+    start = max(0, at - width // 3)
+    clipped = best_line[start:start + width]
+    return ('…' if start else '') + clipped + ('…' if start + width < len(best_line) else '')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Search the runbooks and generated guides')
+    parser.add_argument('query', nargs='*',
+                        help='terms that must all appear in a section; quote phrases, '
+                             "e.g. '\"forget_cluster_node\"' or '\"sentinel failover\"'")
+    parser.add_argument('-n', '--limit', type=int, default=10,
+                        help='number of sections to show (default: 10)')
+    parser.add_argument('--index', default=DEFAULT_INDEX,
+                        help=f'index file (default: {DEFAULT_INDEX})')
+    parser.add_argument('--rebuild', action='store_true', help='re-index every document')
+    parser.add_argument('--stats', action='store_true', help='print index statistics')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    index = SearchIndex(args.index)
+    updated = index.refresh(force=args.rebuild)
+    index.save()
+    if updated:
+        print(f"Indexed {', '.join(updated)} in {time.perf_counter() - start:.3f}s")
+    if args.stats:
+        documents, blocks, terms, postings = index.stats()
+        print(f'{documents} documents, {blocks} blocks, {terms} terms, {postings} postings')
+    if not args.query:
+        return 0
+
+    searched = time.perf_counter()
+    results = index.search(' '.join(args.query), args.limit)
+    elapsed = time.perf_counter() - searched
+    for score, name, section, subsection, kind, text in results:
+        where = f'{section} › {subsection}' if subsection else section
+        print(f'{score:6.1f}  {name} › {where}')
+        print(f'        {kind}: {text}')
+    print(f'{len(results)} section(s) in {elapsed * 1000:.1f}ms')
+    return 0 if results else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Section-level build cache for the document generators
+"""
+
+import hashlib
+import os
+import types
+
+import docx
+from docx.oxml import parse_xml
+from lxml import etree
+
+# Bump when the cached fragment format changes
+CACHE_VERSION = '1'
+
+DEFAULT_CACHE_DIR = '.doc_cache'
+
+def _stable_repr(value):
+    """repr() with the elements of sets sorted, so it is the same under any PYTHONHASHSEED"""
+    if isinstance(value, (set, frozenset)):
+        return f"{type(value).__name__}({{{', '.join(sorted(map(_stable_repr, value)))}}})"
+    if isinstance(value, (tuple, list)):
+        return f"{type(value).__name__}({', '.join(map(_stable_repr, value))})"
+    if isinstance(value, dict):
+        return '{' + ', '.join(f'{_stable_repr(key)}: {_stable_repr(item)}'
+                               for key, item in value.items()) + '}'
+    return repr(value)
+
+def _hash_code(code, digest):
+    """Feed a code object into digest, ignoring line-number information"""
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _hash_code(const, digest)
+        else:
+            digest.update(_stable_repr(const).encode())
+
+_CONSTANT_TYPES = (str, int, float, tuple, list, dict, set, frozenset)
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _is_project_module(module):
+    """Whether module is one of the generator modules next to this one"""
+    path = getattr(module, '__file__', None)
+    return bool(path) and os.path.dirname(os.path.abspath(path)) == _PROJECT_DIR
+
+def _function_key(func):
+    return str(func.__module__), func.__qualname__
+
+def _collect_globals(func, seen):
+    """Collect func and every function or constant it references
+
+    Entries are keyed by (module, qualified name), so same-named functions
+    and constants of different modules are all kept. Besides plain globals,
+    this follows module.NAME references into the project's own modules and
+    functions held in closures.
+    """
+    key = _function_key(func)
+    if key in seen:
+        return
+    seen[key] = func
+    namespaces = [(key[0], func.__globals__)]
+    for value in map(func.__globals__.get, func.__code__.co_names):
+        if isinstance(value, types.ModuleType) and _is_project_module(value):
+            namespaces.append((value.__name__, vars(value)))
+    for name in func.__code__.co_names:
+        for owner, namespace in namespaces:
+            value = namespace.get(name)
+            if isinstance(value, types.FunctionType):
+                _collect_globals(value, seen)
+            elif isinstance(value, _CONSTANT_TYPES):
+                seen.setdefault((owner, name), value)
+    for cell in func.__closure__ or ():
+        try:
+            value = cell.cell_contents
+        except ValueError:
+            continue
+        if isinstance(value, types.FunctionType):
+            _collect_globals(value, seen)
+
+def _hash_function(func, digest):
+    """Feed a function's code, defaults and closure values into digest"""
+    _hash_code(func.__code__, digest)
+    digest.update(_stable_repr(func.__defaults__).encode())
+    digest.update(_stable_repr(func.__kwdefaults__).encode())
+    for cell in func.__closure__ or ():
+        try:
+            value = cell.cell_contents
+        except ValueError:
+            value = '<empty cell>'
+        if isinstance(value, types.FunctionType):
+            # Collected and hashed under its own key
+            value = _function_key(value)
+        digest.update(_stable_repr(value).encode())
+
+def section_fingerprint(func):
+    """Content hash of everything that determines a section's rendered XML"""
+    seen = {}
+    _collect_globals(func, seen)
+    digest = hashlib.sha256()
+    digest.update(f'{CACHE_VERSION}\0{docx.__version__}\0'.encode())
+    for module, name in sorted(seen):
+        digest.update(f'{module}\0{name}\0'.encode())
+        value = seen[module, name]
+        if isinstance(value, types.FunctionType):
+            _hash_function(value, digest)
+        else:
+            digest.update(_stable_repr(value).encode())
+    return digest.hexdigest()
+
+class SectionCache:
+    """Content-addressed store of rendered section body fragments"""
+
+    def __init__(self, path=DEFAULT_CACHE_DIR):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._memory = {}
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.xml')
+
+    def get(self, key):
+        """Return the cached fragment for key, or None"""
+        fragment = self._memory.get(key)
+        if fragment is None:
+            try:
+                with open(self._file(key), 'rb') as f:
+                    fragment = f.read()
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            self._memory[key] = fragment
+        self.hits += 1
+        return fragment
+
+    def put(self, key, fragment):
+        """Store a rendered fragment under key"""
+        self._memory[key] = fragment
+        tmp = f'{self._file(key)}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(fragment)
+        os.replace(tmp, self._file(key))
+
+def body_end(body):
+    """Index of the trailing sectPr, i.e. where new block items are inserted"""
+    return len(body) - (1 if body.sectPr is not None else 0)
+
+def render_section(doc, func):
+    """Render a section into doc and return its serialized body fragment"""
+    body = doc.element.body
+    start = body_end(body)
+    func(doc)
+    added = body[start:body_end(body)]
+    return b'<fragment>' + b''.join(etree.tostring(el) for el in added) + b'</fragment>'
+
+def splice_section(doc, fragment):
+    """Append a cached body fragment to doc"""
+    body = doc.element.body
+    sect_pr = body.sectPr
+    for el in list(parse_xml(fragment)):
+        if sect_pr is not None:
+            sect_pr.addprevious(el)
+        else:
+            body.append(el)
+
+def _build_section(doc, func, cache):
+    """Render one section, through the cache when there is one"""
+    if cache is None:
+        func(doc)
+        return
+    key = section_fingerprint(func)
+    fragment = cache.get(key)
+    if fragment is None:
+        cache.put(key, render_section(doc, func))
+    else:
+        splice_section(doc, fragment)
+
+def find_section(sections, selector):
+    """Index of the section a selector names
+
+    A selector matches a title exactly (ignoring case), by its number
+    ('18' or '18.'), or as a substring of exactly one title.
+    """
+    key = selector.strip().lower()
+    titles = [title.lower() for title, _func in sections]
+    if key in titles:
+        return titles.index(key)
+    number = key.rstrip('.')
+    if number.isdigit():
+        matches = [i for i, title in enumerate(titles) if title.split('.', 1)[0] == number]
+    else:
+        matches = [i for i, title in enumerate(titles) if key in title]
+    if len(matches) == 1:
+        return matches[0]
+    if not matches:
+        raise ValueError(f'no section matches {selector!r}')
+    raise ValueError(f"{selector!r} matches several sections: "
+                     f"{'; '.join(sections[i][0] for i in matches)}")
+
+def select_sections(sections, selectors):
+    """The title block (the first section) plus the sections the selectors name, in order"""
+    chosen = {0} | {find_section(sections, selector) for selector in selectors}
+    return [sections[i] for i in sorted(chosen)]
+
+def build_sections(doc, sections, cache=None, profiler=None):
+    """Render each (title, func) section into doc, reusing cached fragments"""
+    for title, func in sections:
+        if profiler is None:
+            _build_section(doc, func, cache)
+        else:
+            with profiler.section(doc, title):
+                _build_section(doc, func, cache)
+    return doc
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Sequence-number stamping and gap tracking for message-loss accounting
+"""
+
+import argparse
+import base64
+import heapq
+import json
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+# magic, stream id, sequence number and send time (time.time_ns()) at the
+# start of every stamped body; the magic changed when the send time was added
+HEADER = struct.Struct('>4sIQq')
+MAGIC = b'RBS2'
+REPORT_VERSION = 2
+
+# Success criterion from the failover guide's results template, in percent
+LOSS_LIMIT = 0.1
+
+# Sequence sets are split into chunks of 2**16 values; a chunk switches from
+# runs to a bitmap once its runs would take more memory
+CHUNK_BITS = 16
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_MASK = CHUNK_SIZE - 1
+BITMAP_BYTES = CHUNK_SIZE // 8
+MAX_RUNS = BITMAP_BYTES // 8
+
+ACCOUNTING_HEADERS = ['Stream', 'Received', 'Lost', 'Duplicated', 'Out of Order', 'Loss']
+
+class SequenceStamper:
+    """Bodies of size bytes carrying a stream id, consecutive sequence numbers from 0 and send time
+
+    The filler after the header is allocated once and shared, so each body
+    costs one small concatenation.
+    """
+
+    def __init__(self, stream, size):
+        self.stream = stream
+        self.sequence = 0
+        self.filler = bytes(max(0, size - HEADER.size))
+
+    def next_body(self):
+        body = HEADER.pack(MAGIC, self.stream, self.sequence, time.time_ns()) + self.filler
+        self.sequence += 1
+        return body
+
+def read_stamp(body):
+    """(stream, sequence, sent_ns) from a stamped body, or None"""
+    if len(body) < HEADER.size or body[:4] != MAGIC:
+        return None
+    _magic, stream, sequence, sent = HEADER.unpack_from(body)
+    return stream, sequence, sent
+
+class RunSet:
+    """Sorted, disjoint [start, end) runs: the sparse form of a SequenceSet chunk
+
+    Memory grows with the number of gaps, not the number of members, and
+    adding the value just after the last run is the fast path.
+    """
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self, runs=()):
+        self.starts = array('I')
+        self.ends = array('I')
+        for start, end in runs:
+            if self.ends and start <= self.ends[-1]:
+                self.add_run(start, end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def add(self, value):
+        """Add value; False if it was already present"""
+        starts, ends = self.starts, self.ends
+        if ends and value == ends[-1]:
+            ends[-1] = value + 1
+            return True
+        if not ends or value > ends[-1]:
+            starts.append(value)
+            ends.append(value + 1)
+            return True
+        i = bisect_right(starts, value) - 1
+        if i >= 0 and value < ends[i]:
+            return False
+        join_left = i >= 0 and ends[i] == value
+        join_right = i + 1 < len(starts) and starts[i + 1] == value + 1
+        if join_left and join_right:
+            ends[i] = ends[i + 1]
+            del starts[i + 1]
+            del ends[i + 1]
+        elif join_left:
+            ends[i] = value + 1
+        elif join_right:
+            starts[i + 1] = value
+        else:
+            starts.insert(i + 1, value)
+            ends.insert(i + 1, value + 1)
+        return True
+
+    def add_run(self, start, end):
+        """Add every value in [start, end), merging with overlapping or touching runs"""
+        starts, ends = self.starts, self.ends
+        first = last = bisect_left(ends, start)
+        while last < len(starts) and starts[last] <= end:
+            start, end = min(start, starts[last]), max(end, ends[last])
+            last += 1
+        del starts[first:last]
+        del ends[first:last]
+        starts.insert(first, start)
+        ends.insert(first, end)
+
+    def update(self, other):
+        """Add every value of other, merging the two run lists in one pass"""
+        starts, ends = array('I'), array('I')
+        for start, end in heapq.merge(self.runs(), other.runs()):
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        self.starts, self.ends = starts, ends
+
+    def intersection(self, other):
+        """Values in both sets, walking the runs of each once"""
+        common = RunSet()
+        i = j = 0
+        while i < len(self.starts) and j < len(other.starts):
+            start = max(self.starts[i], other.starts[j])
+            end = min(self.ends[i], other.ends[j])
+            if start < end:
+                common.starts.append(start)
+                common.ends.append(end)
+            if self.ends[i] < other.ends[j]:
+                i += 1
+            else:
+                j += 1
+        return common
+
+    def __contains__(self, value):
+        i = bisect_right(self.starts, value) - 1
+        return i >= 0 and value < self.ends[i]
+
+    def __len__(self):
+        return sum(self.ends) - sum(self.starts)
+
+    def __bool__(self):
+        return bool(self.starts)
+
+    def runs(self):
+        return zip(self.starts, self.ends)
+
+    @property
+    def nbytes(self):
+        return (len(self.starts) + len(self.ends)) * self.starts.itemsize
+
+class Bitmap:
+    """Chunk of CHUNK_SIZE values as a fixed-size bitmap, for chunks with many gaps"""
+    __slots__ = ('bits', 'count')
+
+    def __init__(self, value=0):
+        self.bits = bytearray(value.to_bytes(BITMAP_BYTES, 'little'))
+        self.count = value.bit_count()
+
+    def add(self, value):
+        byte, bit = value >> 3, 1 << (value & 7)
+        if self.bits[byte] & bit:
+            return False
+        self.bits[byte] |= bit
+        self.count += 1
+        return True
+
+    def __contains__(self, value):
+        return bool(self.bits[value >> 3] & (1 << (value & 7)))
+
+    def __len__(self):
+        return self.count
+
+    def __int__(self):
+        return int.from_bytes(self.bits, 'little')
+
+    def runs(self):
+        value = int(self)
+        while value:
+            start = (value & -value).bit_length() - 1
+            rest = ~(value >> start)
+            length = (rest & -rest).bit_length() - 1
+            yield start, start + length
+            value &= ~(((1 << length) - 1) << start)
+
+    @property
+    def nbytes(self):
+        return BITMAP_BYTES
+
+def _chunk_int(chunk):
+    if isinstance(chunk, Bitmap):
+        return int(chunk)
+    value = 0
+    for start, end in chunk.runs():
+        value |= ((1 << (end - start)) - 1) << start
+    return value
+
+def _compact(chunk):
+    """The chunk as runs or as a bitmap, whichever is smaller"""
+    if isinstance(chunk, RunSet):
+        return Bitmap(_chunk_int(chunk)) if len(chunk.starts) > MAX_RUNS else chunk
+    value = int(chunk)
+    if (value & ~(value << 1)).bit_count() <= MAX_RUNS // 2:
+        return RunSet(chunk.runs())
+    return chunk
+
+class SequenceSet:
+    """Roaring-style set of sequence numbers with bounded memory
+
+    Values are split into chunks of CHUNK_SIZE. A chunk holds runs while
+    that is smaller, so long unbroken stretches cost a few bytes, and
+    becomes a bitmap once gaps make runs more expensive, so no chunk ever
+    needs more than BITMAP_BYTES however the values arrive.
+    """
+    __slots__ = ('chunks', '_key', '_chunk', '_tail')
+
+    def __init__(self):
+        self.chunks = {}
+        self._key = None
+        self._chunk = None
+        self._tail = None
+
+    def add(self, value):
+        """Add value; False if it was already present"""
+        key = value >> CHUNK_BITS
+        if key == self._key:
+            # Fast path: the value right after the last run of the current chunk
+            tail = self._tail
+            if tail and tail[-1] == value & CHUNK_MASK:
+                tail[-1] += 1
+                return True
+        else:
+            chunk = self.chunks.get(key)
+            if chunk is None:
+                chunk = self.chunks[key] = RunSet()
+            self._key, self._chunk = key, chunk
+            self._tail = chunk.ends if isinstance(chunk, RunSet) else None
+        chunk = self._chunk
+        if not chunk.add(value & CHUNK_MASK):
+            return False
+        if isinstance(chunk, RunSet) and len(chunk.starts) > MAX_RUNS:
+            self._set(key, chunk)
+        return True
+
+    def __contains__(self, value):
+        chunk = self.chunks.get(value >> CHUNK_BITS)
+        return chunk is not None and (value & CHUNK_MASK) in chunk
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self.chunks.values())
+
+    def __bool__(self):
+        return any(self.chunks.values())
+
+    def runs(self):
+        """[start, end) runs in order, joined across chunk boundaries"""
+        pending = None
+        for key in sorted(self.chunks):
+            base = key << CHUNK_BITS
+            for start, end in self.chunks[key].runs():
+                start, end = base + start, base + end
+                if pending and pending[1] == start:
+                    pending = (pending[0], end)
+                    continue
+                if pending:
+                    yield pending
+                pending = (start, end)
+        if pending:
+            yield pending
+
+    def gaps(self, start=0):
+        """Runs missing between start and the end of the last run"""
+        for run_start, run_end in self.runs():
+            if run_start > start:
+                yield start, run_start
+            start = max(start, run_end)
+
+    def _set(self, key, chunk):
+        self.chunks[key] = _compact(chunk)
+        self._key = None
+
+    def update(self, other):
+        for key, chunk in other.chunks.items():
+            mine = self.chunks.get(key)
+            if mine is None:
+                merged = RunSet(chunk.runs()) if isinstance(chunk, RunSet) else Bitmap(int(chunk))
+            elif isinstance(mine, RunSet) and isinstance(chunk, RunSet):
+                mine.update(chunk)
+                merged = mine
+            else:
+                merged = Bitmap(_chunk_int(mine) | _chunk_int(chunk))
+            self._set(key, merged)
+
+    def intersection(self, other):
+        common = SequenceSet()
+        for key, chunk in self.chunks.items():
+            theirs = other.chunks.get(key)
+            if theirs is None:
+                continue
+            if isinstance(chunk, RunSet) and isinstance(theirs, RunSet):
+                both = chunk.intersection(theirs)
+            else:
+                both = Bitmap(_chunk_int(chunk) & _chunk_int(theirs))
+            if both:
+                common._set(key, both)
+        return common
+
+    @property
+    def nbytes(self):
+        return sum(chunk.nbytes for chunk in self.chunks.values())
+
+    def to_json(self):
+        """{chunk: [[start, end], ...] or base64 bitmap}"""
+        return {str(key): (base64.b64encode(chunk.bits).decode() if isinstance(chunk, Bitmap)
+                           else [list(run) for run in chunk.runs()])
+                for key, chunk in sorted(self.chunks.items())}
+
+    @classmethod
+    def from_json(cls, data):
+        sequences = cls()
+        for key, chunk in data.items():
+            if isinstance(chunk, str):
+                sequences.chunks[int(key)] = Bitmap(int.from_bytes(base64.b64decode(chunk), 'little'))
+            else:
+                sequences.chunks[int(key)] = RunSet(chunk)
+        return sequences
+
+class StreamTracker:
+    """Received, duplicated and out-of-order sequences of one stream"""
+    __slots__ = ('received', 'duplicates', 'duplicate_count', 'reordered', 'highest')
+
+    def __init__(self):
+        self.received = SequenceSet()
+        self.duplicates = SequenceSet()
+        self.duplicate_count = 0
+        self.reordered = SequenceSet()
+        self.highest = -1
+
+    def record(self, sequence):
+        if not self.received.add(sequence):
+            self.duplicates.add(sequence)
+            self.duplicate_count += 1
+        elif sequence < self.highest:
+            self.reordered.add(sequence)
+        else:
+            self.highest = sequence
+
+    @property
+    def lost(self):
+        return self.highest + 1 - len(self.received)
+
+    @property
+    def nbytes(self):
+        return self.received.nbytes + self.duplicates.nbytes + self.reordered.nbytes
+
+    def to_json(self):
+        return {
+            'received': self.received.to_json(),
+            'duplicates': self.duplicates.to_json(),
+            'duplicate_count': self.duplicate_count,
+            'reordered': self.reordered.to_json(),
+            'highest': self.highest,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        tracker = cls()
+        tracker.received = SequenceSet.from_json(data['received'])
+        tracker.duplicates = SequenceSet.from_json(data['duplicates'])
+        tracker.duplicate_count = data['duplicate_count']
+        tracker.reordered = SequenceSet.from_json(data['reordered'])
+        tracker.highest = data['highest']
+        return tracker
+
+    def merge(self, other):
+        """Fold in what another consumer of the same stream received"""
+        overlap = self.received.intersection(other.received)
+        self.received.update(other.received)
+        self.duplicates.update(other.duplicates)
+        self.duplicates.update(overlap)
+        self.duplicate_count += other.duplicate_count + len(overlap)
+        self.reordered.update(other.reordered)
+        self.highest = max(self.highest, other.highest)
+
+class SequenceTracker:
+    """Per-stream gap tracking for stamped message bodies"""
+
+    def __init__(self):
+        self.streams = {}
+        self.unstamped = 0
+
+    def record(self, body):
+        """Record a delivered body, returning its send time, or None if it is not stamped"""
+        # read_stamp() and the stream lookup inlined: this runs for every delivery
+        if len(body) < HEADER.size or body[:4] != MAGIC:
+            self.unstamped += 1
+            return None
+        _magic, stream, sequence, sent = HEADER.unpack_from(body)
+        tracker = self.streams.get(stream)
+        if tracker is None:
+            tracker = self.streams[stream] = StreamTracker()
+        tracker.record(sequence)
+        return sent
+
+    def merge(self, other):
+        for stream, tracker in other.streams.items():
+            if stream in self.streams:
+                self.streams[stream].merge(tracker)
+            else:
+                self.streams[stream] = tracker
+        self.unstamped += other.unstamped
+
+    def totals(self):
+        """(received, lost, duplicated, out of order) across every stream"""
+        streams = self.streams.values()
+        return (sum(len(tracker.received) for tracker in streams),
+                sum(tracker.lost for tracker in streams),
+                sum(tracker.duplicate_count for tracker in streams),
+                sum(len(tracker.reordered) for tracker in streams))
+
+    def loss_percent(self):
+        received, lost, _duplicated, _reordered = self.totals()
+        return lost * 100 / (received + lost) if received + lost else 0.0
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'version': REPORT_VERSION, 'unstamped': self.unstamped,
+                       'streams': {str(stream): tracker.to_json()
+                                   for stream, tracker in sorted(self.streams.items())}}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('version') != REPORT_VERSION:
+            raise ValueError(f'{path}: not a version {REPORT_VERSION} sequence report')
+        tracker = cls()
+        tracker.unstamped = data['unstamped']
+        tracker.streams = {int(stream): StreamTracker.from_json(stream_data)
+                           for stream, stream_data in data['streams'].items()}
+        return tracker
+
+    def format(self, limit=5):
+        lines = []
+        for stream, tracker in sorted(self.streams.items()):
+            lines.append(f'stream {stream:#010x}: {len(tracker.received)} received up to '
+                         f'#{tracker.highest}, {tracker.lost} lost, {tracker.duplicate_count} '
+                         f'duplicated, {len(tracker.reordered)} out of order '
+                         f'({tracker.nbytes} bytes of runs)')
+            for label, runs in (('lost', list(tracker.received.gaps())),
+                                ('duplicated', list(tracker.duplicates.runs())),
+                                ('out of order', list(tracker.reordered.runs()))):
+                if runs:
+                    shown = ', '.join(format_run(start, end) for start, end in runs[:limit])
+                    more = f' and {len(runs) - limit} more range(s)' if len(runs) > limit else ''
+                    lines.append(f'  {label}: {shown}{more}')
+        received, lost, duplicated, reordered = self.totals()
+        loss = self.loss_percent()
+        lines.append(f'{len(self.streams)} stream(s): {received} received, {lost} lost '
+                     f'({loss:.4f}%, {"within" if loss < LOSS_LIMIT else "over"} the '
+                     f'{LOSS_LIMIT:g}% limit), {duplicated} duplicated, {reordered} out of order'
+                     + (f', {self.unstamped} without a sequence stamp' if self.unstamped else ''))
+        lines.append('Loss after the last received message of a stream cannot be seen here; '
+                     "compare with the producer's confirmed count")
+        return '\n'.join(lines)
+
+    def accounting_table(self):
+        """Message Loss Accounting rows for the results template, header first"""
+        rows = [ACCOUNTING_HEADERS]
+        for stream, tracker in sorted(self.streams.items()):
+            total = len(tracker.received) + tracker.lost
+            rows.append([f'{stream:#010x}', str(len(tracker.received)), str(tracker.lost),
+                         str(tracker.duplicate_count), str(len(tracker.reordered)),
+                         f'{tracker.lost * 100 / total:.4f}%' if total else '-'])
+        received, lost, duplicated, reordered = self.totals()
+        rows.append(['Total', str(received), str(lost), str(duplicated), str(reordered),
+                     f'{self.loss_percent():.4f}%'])
+        return rows
+
+def format_run(start, end):
+    return f'#{start}' if end - start == 1 else f'#{start}-#{end - 1}'
+
+def load_reports(paths):
+    """One tracker merged from saved reports, e.g. from several consumers"""
+    tracker = SequenceTracker()
+    for path in paths:
+        tracker.merge(SequenceTracker.load(path))
+    return tracker
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Merge and show sequence reports saved by load_consumer.py --track')
+    parser.add_argument('reports', nargs='+', metavar='REPORT', help='saved sequence report (JSON)')
+    parser.add_argument('-n', '--limit', type=int, default=5,
+                        help='ranges to show per kind and stream (default: 5)')
+    args = parser.parse_args(argv)
+
+    try:
+        tracker = load_reports(args.reports)
+    except (OSError, ValueError, KeyError) as e:
+        parser.error(str(e))
+    print(tracker.format(args.limit))
+    return 0 if tracker.loss_percent() < LOSS_LIMIT else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
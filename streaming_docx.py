@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Streaming .docx writer backend for very large generated documents
+"""
+
+import copy
+import io
+import zipfile
+
+from lxml import etree
+
+from doc_helpers import column_width, iter_table_xml, new_document, run_content_xml
+from doc_model import BlockDocument, Table
+from docx_package import COMPRESS_LEVEL, part_order, replace_if_changed, zip_info
+
+DOCUMENT_PART = 'word/document.xml'
+
+# Buffered body XML is compressed into the zip entry once it reaches this size
+FLUSH_SIZE = 64 * 1024
+
+def run_xml(run):
+    """Serialize a model Run as w:r"""
+    props = ''
+    if run.style:
+        props += f'<w:rStyle w:val="{run.style}"/>'
+    if run.b is not None:
+        props += '<w:b/>' if run.b else '<w:b w:val="0"/>'
+    if run.i is not None:
+        props += '<w:i/>' if run.i else '<w:i w:val="0"/>'
+    content = run_content_xml(run.text) if run.text else ''
+    if run.br:
+        content += '<w:br w:type="page"/>' if run.br == 'page' else '<w:br/>'
+    props = f'<w:rPr>{props}</w:rPr>' if props else ''
+    return f'<w:r>{props}{content}</w:r>' if props or content else '<w:r/>'
+
+def paragraph_xml(para):
+    """Serialize a model Paragraph as w:p"""
+    props = ''
+    if para.style:
+        props += f'<w:pStyle w:val="{para.style}"/>'
+    if para.jc:
+        props += f'<w:jc w:val="{para.jc}"/>'
+    props = f'<w:pPr>{props}</w:pPr>' if props else ''
+    runs = ''.join(run_xml(run) for run in para.runs)
+    return f'<w:p>{props}{runs}</w:p>' if props or runs else '<w:p/>'
+
+class PreparedBase:
+    """A base document split for streaming: everything but the body, serialized once"""
+
+    def __init__(self, element, style_ids, head, tail, prefix):
+        self.element = element
+        self.style_ids = style_ids
+        self.head = head
+        self.tail = tail
+        self.prefix = prefix
+
+def prepare_base(base):
+    """Serialize a base document around its body and compress its other parts"""
+    # Split a copy of the base document.xml around its body content
+    root = copy.deepcopy(base.element)
+    body = root.body
+    sect_pr = etree.tostring(body.sectPr) if body.sectPr is not None else b''
+    for child in list(body):
+        body.remove(child)
+    head, tail = etree.tostring(root, xml_declaration=True, encoding='UTF-8',
+                                standalone=True).split(b'<w:body/>')
+
+    # Every other part of the base package, as a zip that document.xml is appended to
+    package = io.BytesIO()
+    base.save(package)
+    prefix = io.BytesIO()
+    with zipfile.ZipFile(package) as source, zipfile.ZipFile(prefix, 'w') as target:
+        for name in part_order(source.namelist()):
+            if name != DOCUMENT_PART:
+                target.writestr(zip_info(name), source.read(name), compresslevel=COMPRESS_LEVEL)
+
+    return PreparedBase(base.element, {style.name: style.style_id for style in base.styles},
+                        head + b'<w:body>', sect_pr + b'</w:body>' + tail, prefix.getvalue())
+
+# Prepared new_document() base, built once per process by _default_base()
+_default = None
+
+def _default_base():
+    global _default
+    if _default is None:
+        _default = prepare_base(new_document())
+    return _default
+
+class StreamingDocument(BlockDocument):
+    """Write-only document that streams body XML into the .docx zip entry
+
+    Each block is serialized as soon as the next one is started; tables are
+    written row by row, and write_xml appends pre-serialized block items.
+    The package is written next to path and only replaces it on close if
+    the bytes differ; changed tells which happened.
+    """
+
+    def __init__(self, path, base=None):
+        super().__init__()
+        prepared = prepare_base(base) if base is not None else _default_base()
+        self.path = path
+        self.changed = None
+        self.element = prepared.element
+        self._style_ids = prepared.style_ids
+        self._tail = prepared.tail
+        self._buffer = []
+        self._buffered = 0
+
+        # Start from the precompressed parts, then stream document.xml after them
+        with open(path + '.tmp', 'wb') as f:
+            f.write(prepared.prefix)
+        self._zip = zipfile.ZipFile(path + '.tmp', 'a', zipfile.ZIP_DEFLATED)
+        self._stream = self._zip.open(zip_info(DOCUMENT_PART), 'w', force_zip64=True)
+        self._stream.write(prepared.head)
+
+    def style_id(self, name):
+        """Map a style name to the id used in styles.xml"""
+        return self._style_ids[name] if name else None
+
+    def write_xml(self, xml):
+        """Append serialized block-level XML to the body"""
+        self._flush_pending()
+        self._write(xml)
+
+    def _write(self, xml):
+        self._buffer.append(xml)
+        self._buffered += len(xml)
+        if self._buffered >= FLUSH_SIZE:
+            self._flush_buffer()
+
+    def _flush_buffer(self):
+        self._stream.write(''.join(self._buffer).encode('utf-8'))
+        self._buffer = []
+        self._buffered = 0
+
+    def emit(self, block):
+        if isinstance(block, Table):
+            col_width = column_width(self, len(block.headers))
+            for chunk in iter_table_xml(block.headers, block.rows, col_width):
+                self._write(chunk)
+        else:
+            self._write(paragraph_xml(block))
+
+    def close(self):
+        """Finish document.xml and the zip archive"""
+        if self._zip is None:
+            return
+        self._flush_pending()
+        self._flush_buffer()
+        self._stream.write(self._tail)
+        self._stream.close()
+        self._zip.close()
+        self._zip = None
+        self.changed = replace_if_changed(self.path + '.tmp', self.path)
+
+    def save(self, path=None):
+        """Finish the document; it is always written to the path it was opened with"""
+        if path is not None and path != self.path:
+            raise ValueError(f'streaming document is written to {self.path}, not {path}')
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Unit tests for latency_histogram.py
+"""
+
+import os
+import random
+import tempfile
+import unittest
+
+from latency_histogram import (HIGHEST, PRECISION_BITS, LatencyHistogram, SlicedLatency,
+                               read_slices)
+
+SECOND = 10**9
+
+class LatencyHistogramTest(unittest.TestCase):
+
+    def test_buckets_cover_every_value_once(self):
+        histogram = LatencyHistogram()
+        previous = -1
+        for value in list(range(4096)) + [random.Random(1).randrange(HIGHEST) for _ in range(2000)]:
+            index = histogram.index(value)
+            self.assertLessEqual(histogram.lowest_equivalent(index), value)
+            self.assertLessEqual(value, histogram.highest_equivalent(index))
+        for index in range(len(histogram.counts)):
+            self.assertEqual(histogram.lowest_equivalent(index), previous + 1)
+            previous = histogram.highest_equivalent(index)
+
+    def test_bucket_width_is_within_precision(self):
+        histogram = LatencyHistogram()
+        for index in range(len(histogram.counts)):
+            low, high = histogram.lowest_equivalent(index), histogram.highest_equivalent(index)
+            self.assertLessEqual(high - low + 1, max(1, low >> PRECISION_BITS))
+
+    def test_percentiles_are_within_precision_of_exact(self):
+        rng = random.Random(2)
+        values = sorted(int(rng.lognormvariate(14, 1.5)) for _ in range(20000))
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+        for fraction in (0.5, 0.99, 0.999):
+            exact = values[max(1, int(fraction * len(values) + 0.5)) - 1]
+            estimate = histogram.percentile(fraction)
+            self.assertGreaterEqual(estimate, exact)
+            self.assertLessEqual(estimate, exact + (exact >> PRECISION_BITS))
+        self.assertEqual(histogram.percentile(1.0), values[-1])
+        self.assertEqual(histogram.max, values[-1])
+        self.assertEqual(histogram.total, len(values))
+
+    def test_out_of_range_values_are_clamped(self):
+        histogram = LatencyHistogram()
+        histogram.record(-5)
+        histogram.record(HIGHEST * 10)
+        self.assertEqual(histogram.counts[0], 1)
+        self.assertEqual(histogram.counts[-1], 1)
+        self.assertEqual(histogram.percentile(0.0), 0)
+        self.assertEqual(histogram.max, HIGHEST * 10)
+
+    def test_empty(self):
+        self.assertEqual(LatencyHistogram().summary(), (0, 0, 0, 0, 0))
+
+    def test_add(self):
+        first, second, both = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+        for value in range(0, 10**6, 997):
+            (first if value % 2 else second).record(value)
+            both.record(value)
+        first.add(second)
+        self.assertEqual(first.counts, both.counts)
+        self.assertEqual(first.summary(), both.summary())
+
+class SlicedLatencyTest(unittest.TestCase):
+
+    def test_slices_and_total(self):
+        sliced = SlicedLatency(1.0)
+        for at, latency in ((10.1, 1000), (10.9, 3000), (11.5, 2000)):
+            sliced.record(int(at * SECOND), latency)
+        rows = sliced.finish()
+        self.assertEqual([(start // SECOND, count) for start, _length, count, *_ in rows],
+                         [(10, 2), (11, 1)])
+        self.assertEqual(rows[0][-1], 3000)
+        self.assertEqual(sliced.total.total, 3)
+
+    def test_empty_slices_get_rows(self):
+        sliced = SlicedLatency(1.0)
+        for at in (100.2, 105.4):
+            sliced.record(int(at * SECOND), 1000)
+        rows = sliced.finish()
+        self.assertEqual([(start // SECOND, count) for start, _length, count, *_ in rows],
+                         [(100, 1), (101, 0), (102, 0), (103, 0), (104, 0), (105, 1)])
+
+    def test_negative_latency_is_counted(self):
+        sliced = SlicedLatency(1.0)
+        sliced.record(SECOND, -50)
+        self.assertEqual(sliced.negative, 1)
+        self.assertEqual(sliced.finish()[0][2], 1)
+
+    def test_csv_round_trip(self):
+        sliced = SlicedLatency(0.5)
+        for at in (1.0, 1.1, 2.6):
+            sliced.record(int(at * SECOND), 2 * 10**6)
+        sliced.finish()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'slices.csv')
+            sliced.write_csv(path)
+            rows = read_slices(path)
+        self.assertEqual([row['count'] for row in rows], [2, 0, 0, 1])
+        self.assertEqual(rows[0]['seconds'], 0.5)
+        self.assertAlmostEqual(rows[0]['p99'], 2.0, places=1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Unit tests for sequence_tracker.py
+"""
+
+import os
+import random
+import tempfile
+import unittest
+
+from sequence_tracker import (CHUNK_SIZE, MAX_RUNS, Bitmap, RunSet, SequenceSet, SequenceStamper,
+                              SequenceTracker, StreamTracker, _chunk_int, _compact, read_stamp)
+
+def runs_of(values):
+    """Sorted [start, end) runs of a Python set"""
+    runs = []
+    for value in sorted(values):
+        if runs and runs[-1][1] == value:
+            runs[-1][1] = value + 1
+        else:
+            runs.append([value, value + 1])
+    return [tuple(run) for run in runs]
+
+def alternating(start, count):
+    """count values with a gap after each: the worst case for runs"""
+    return range(start, start + 2 * count, 2)
+
+class RunSetTest(unittest.TestCase):
+
+    def test_add_matches_set(self):
+        rng = random.Random(1)
+        runs, expected = RunSet(), set()
+        for _ in range(3000):
+            value = rng.randrange(500)
+            self.assertEqual(runs.add(value), value not in expected)
+            expected.add(value)
+        self.assertEqual(list(runs.runs()), runs_of(expected))
+        self.assertEqual(len(runs), len(expected))
+        self.assertTrue(all((value in runs) == (value in expected) for value in range(510)))
+
+    def test_add_run_merges_overlapping_and_touching(self):
+        runs = RunSet([(0, 5), (10, 15), (20, 25)])
+        runs.add_run(5, 10)
+        self.assertEqual(list(runs.runs()), [(0, 15), (20, 25)])
+        runs.add_run(12, 22)
+        self.assertEqual(list(runs.runs()), [(0, 25)])
+
+    def test_update_and_intersection_match_set(self):
+        rng = random.Random(2)
+        for _ in range(20):
+            left = {rng.randrange(300) for _ in range(150)}
+            right = {rng.randrange(300) for _ in range(150)}
+            a, b = RunSet(runs_of(left)), RunSet(runs_of(right))
+            self.assertEqual(list(a.intersection(b).runs()), runs_of(left & right))
+            a.update(b)
+            self.assertEqual(list(a.runs()), runs_of(left | right))
+
+class BitmapTest(unittest.TestCase):
+
+    def test_runs_round_trip(self):
+        rng = random.Random(3)
+        values = {rng.randrange(CHUNK_SIZE) for _ in range(2000)} | set(range(CHUNK_SIZE - 10, CHUNK_SIZE))
+        runs = RunSet(runs_of(values))
+        bitmap = Bitmap(_chunk_int(runs))
+        self.assertEqual(len(bitmap), len(values))
+        self.assertEqual(list(bitmap.runs()), runs_of(values))
+        self.assertEqual(list(RunSet(bitmap.runs()).runs()), list(runs.runs()))
+
+    def test_add(self):
+        bitmap = Bitmap()
+        self.assertTrue(bitmap.add(7))
+        self.assertFalse(bitmap.add(7))
+        self.assertIn(7, bitmap)
+        self.assertNotIn(8, bitmap)
+        self.assertEqual(len(bitmap), 1)
+
+    def test_compact_picks_the_smaller_form(self):
+        sparse = RunSet(runs_of(alternating(0, MAX_RUNS + 1)))
+        self.assertIsInstance(_compact(sparse), Bitmap)
+        dense = Bitmap(_chunk_int(RunSet([(0, 1000), (2000, 3000)])))
+        compacted = _compact(dense)
+        self.assertIsInstance(compacted, RunSet)
+        self.assertEqual(list(compacted.runs()), [(0, 1000), (2000, 3000)])
+
+class SequenceSetTest(unittest.TestCase):
+
+    def check(self, sequences, expected):
+        self.assertEqual(list(sequences.runs()), runs_of(expected))
+        self.assertEqual(len(sequences), len(expected))
+
+    def test_matches_set(self):
+        rng = random.Random(4)
+        sequences, expected = SequenceSet(), set()
+        # In order with losses, then interleaved, then stragglers across chunks
+        for value in range(CHUNK_SIZE + 100):
+            if rng.random() > 0.01:
+                self.assertTrue(sequences.add(value))
+                expected.add(value)
+        for value in alternating(2 * CHUNK_SIZE, MAX_RUNS + 50):
+            sequences.add(value)
+            expected.add(value)
+        for _ in range(2000):
+            value = rng.randrange(3 * CHUNK_SIZE)
+            self.assertEqual(sequences.add(value), value not in expected)
+            expected.add(value)
+        self.check(sequences, expected)
+        for value in rng.sample(range(3 * CHUNK_SIZE + 10), 2000):
+            self.assertEqual(value in sequences, value in expected)
+
+    def test_interleaved_values_switch_to_a_bitmap(self):
+        sequences = SequenceSet()
+        for value in alternating(0, CHUNK_SIZE // 2):
+            sequences.add(value)
+        self.assertIsInstance(sequences.chunks[0], Bitmap)
+        self.assertLessEqual(sequences.nbytes, Bitmap().nbytes)
+        self.assertEqual(len(sequences), CHUNK_SIZE // 2)
+
+    def test_runs_join_across_chunks(self):
+        sequences = SequenceSet()
+        for value in range(CHUNK_SIZE - 5, CHUNK_SIZE + 5):
+            sequences.add(value)
+        self.assertEqual(list(sequences.runs()), [(CHUNK_SIZE - 5, CHUNK_SIZE + 5)])
+
+    def test_gaps(self):
+        sequences = SequenceSet()
+        for value in (2, 3, 7, 10):
+            sequences.add(value)
+        self.assertEqual(list(sequences.gaps()), [(0, 2), (4, 7), (8, 10)])
+
+    def test_update_and_intersection_match_set(self):
+        rng = random.Random(5)
+        left = set(alternating(0, MAX_RUNS + 10)) | {rng.randrange(2 * CHUNK_SIZE) for _ in range(500)}
+        right = set(range(1000, 5000)) | {rng.randrange(2 * CHUNK_SIZE) for _ in range(500)}
+        a, b = SequenceSet(), SequenceSet()
+        for value in left:
+            a.add(value)
+        for value in right:
+            b.add(value)
+        self.check(a.intersection(b), left & right)
+        a.update(b)
+        self.check(a, left | right)
+
+    def test_json_round_trip(self):
+        sequences = SequenceSet()
+        for value in list(alternating(0, MAX_RUNS + 10)) + list(range(CHUNK_SIZE, CHUNK_SIZE + 50)):
+            sequences.add(value)
+        loaded = SequenceSet.from_json(sequences.to_json())
+        self.assertEqual(list(loaded.runs()), list(sequences.runs()))
+
+class StreamTrackerTest(unittest.TestCase):
+
+    def test_record(self):
+        tracker = StreamTracker()
+        for sequence in (0, 1, 3, 2, 2, 6):
+            tracker.record(sequence)
+        self.assertEqual(tracker.lost, 2)
+        self.assertEqual(tracker.duplicate_count, 1)
+        self.assertEqual(list(tracker.reordered.runs()), [(2, 3)])
+        self.assertEqual(list(tracker.received.gaps()), [(4, 6)])
+
+    def test_merge_counts_the_overlap_as_duplicates(self):
+        first, second = StreamTracker(), StreamTracker()
+        for sequence in range(0, 60):
+            first.record(sequence)
+        for sequence in list(range(50, 100)) + [55]:
+            second.record(sequence)
+        first.merge(second)
+        self.assertEqual(len(first.received), 100)
+        self.assertEqual(first.lost, 0)
+        # 50-59 were seen by both consumers, and 55 a second time by one
+        self.assertEqual(first.duplicate_count, 11)
+        self.assertEqual(list(first.duplicates.runs()), [(50, 60)])
+
+class SequenceTrackerTest(unittest.TestCase):
+
+    def test_stamps_and_tracks_bodies(self):
+        stamper = SequenceStamper(42, 64)
+        bodies = [stamper.next_body() for _ in range(10)]
+        self.assertEqual(len(bodies[0]), 64)
+        self.assertEqual(read_stamp(bodies[3])[:2], (42, 3))
+        self.assertIsNone(read_stamp(b'x' * 64))
+
+        tracker = SequenceTracker()
+        for body in bodies[:4] + bodies[6:] + [b'unstamped']:
+            tracker.record(body)
+        self.assertEqual(tracker.totals(), (8, 2, 0, 0))
+        self.assertEqual(tracker.unstamped, 1)
+        self.assertAlmostEqual(tracker.loss_percent(), 20.0)
+
+    def test_save_load_and_merge_reports(self):
+        first, second = SequenceTracker(), SequenceTracker()
+        stamper = SequenceStamper(7, 32)
+        for index in range(100):
+            (first if index % 2 else second).record(stamper.next_body())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.json')
+            first.save(path)
+            loaded = SequenceTracker.load(path)
+        self.assertEqual(loaded.totals(), first.totals())
+        loaded.merge(second)
+        self.assertEqual(loaded.totals(), (100, 0, 0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Watch the generators and Markdown runbooks and rebuild changed outputs in a warm process
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import importlib
+import os
+import select
+import struct
+import sys
+import time
+import traceback
+
+import build_docs
+import md_to_docx
+
+# Shared modules, in import order: a change reloads these and rebuilds everything
+LIBRARY_MODULES = ['docx_package', 'doc_helpers', 'doc_model', 'streaming_docx', 'section_cache',
+                   'section_profile', 'md_to_docx', 'build_telemetry', 'doc_drift', 'build_docs']
+
+# Quiet period that ends a burst of saves
+DEBOUNCE = 0.1
+POLL_INTERVAL = 0.25
+
+# inotify(7): IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE
+_IN_MASK = 0x00000002 | 0x00000008 | 0x00000080 | 0x00000100
+_EVENT = struct.Struct('iIII')
+
+class InotifyWatcher:
+    """Report changed file names in one directory using Linux inotify"""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), _IN_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f'cannot watch {directory}')
+
+    def wait(self, timeout=None):
+        """Names changed before timeout seconds pass (None waits indefinitely)"""
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        names = set()
+        offset = 0
+        while offset < len(data):
+            _wd, _mask, _cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self._fd)
+
+class PollingWatcher:
+    """Report changed file names by polling modification times"""
+
+    def __init__(self, directory, names):
+        self._paths = {name: os.path.join(directory, name) for name in names}
+        self._mtimes = self._snapshot()
+
+    def _snapshot(self):
+        mtimes = {}
+        for name, path in self._paths.items():
+            try:
+                mtimes[name] = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                mtimes[name] = None
+        return mtimes
+
+    def wait(self, timeout=None):
+        """Names changed before timeout seconds pass (None waits indefinitely)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            mtimes = self._snapshot()
+            changed = {name for name, mtime in mtimes.items() if mtime != self._mtimes[name]}
+            self._mtimes = mtimes
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(POLL_INTERVAL if deadline is None
+                       else min(POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+
+    def close(self):
+        pass
+
+def open_watcher(directory, names):
+    """inotify where available, mtime polling otherwise"""
+    try:
+        return InotifyWatcher(directory)
+    except (OSError, AttributeError):
+        return PollingWatcher(directory, names)
+
+def bursts(watcher, debounce=DEBOUNCE):
+    """Yield (first change time, names) once each burst of changes goes quiet"""
+    while True:
+        names = watcher.wait()
+        if not names:
+            continue
+        first = time.perf_counter()
+        while True:
+            more = watcher.wait(debounce)
+            if not more:
+                break
+            names |= more
+        yield first, names
+
+def watch_targets(names, sources):
+    """File name -> (kind, target) for everything that triggers a rebuild"""
+    targets = {f'{module}.py': ('library', module) for module in LIBRARY_MODULES}
+    for name in names:
+        targets[build_docs.GENERATORS[name][0] + '.py'] = ('generator', name)
+    for source in sources:
+        targets[os.path.basename(source)] = ('markdown', source)
+    return targets
+
+def reload_module(name):
+    """Re-execute a module, importing it if it was never loaded"""
+    module = sys.modules.get(name)
+    return importlib.reload(module) if module else importlib.import_module(name)
+
+class Rebuilder:
+    """Rebuild the outputs affected by a set of changed files"""
+
+    def __init__(self, names, sources, output_dir='.', cache_dir=None, backend='docx',
+                 formats=('docx',), compression='default',
+                 runbook_dir=md_to_docx.DEFAULT_OUTPUT_DIR, check_drift=None, drifted=0):
+        self.names = names
+        self.sources = sources
+        self.output_dir = output_dir
+        self.cache_dir = cache_dir
+        self.backend = backend
+        self.formats = formats
+        self.compression = compression
+        self.runbook_dir = runbook_dir
+        # None, 'content' or 'structure', as for build_docs.py --check-drift
+        self.check_drift = check_drift
+        # Guides that drifted at the last check
+        self.drifted = drifted
+        self.targets = watch_targets(names, sources)
+
+    def affected(self, changed):
+        """(generator names, Markdown sources) to rebuild, reloading changed modules"""
+        hits = [self.targets[name] for name in changed if name in self.targets]
+        if any(kind == 'library' for kind, _target in hits):
+            for module in LIBRARY_MODULES:
+                reload_module(module)
+            for name in self.names:
+                reload_module(build_docs.GENERATORS[name][0])
+            return list(self.names), list(self.sources)
+        generators = [target for kind, target in hits if kind == 'generator']
+        for name in generators:
+            reload_module(build_docs.GENERATORS[name][0])
+        return generators, [target for kind, target in hits if kind == 'markdown']
+
+    def rebuild(self, changed, first):
+        """Rebuild and report; errors are printed so the watcher keeps running"""
+        try:
+            generators, sources = self.affected(changed)
+        except Exception:
+            traceback.print_exc()
+            return
+        # Look the build functions up again in case build_docs was reloaded
+        builder = sys.modules['build_docs']
+        converter = sys.modules['md_to_docx']
+        for name in generators:
+            self._report(name, first, builder.build_one, name, self.output_dir, self.cache_dir,
+                         self.backend, False, self.formats, self.compression)
+        for source in sources:
+            output = converter.output_path(source, self.runbook_dir)
+            self._report(source, first, converter.convert_file, source, output, self.backend)
+        if self.check_drift and (generators or sources):
+            self._check_drift(builder)
+
+    def _check_drift(self, builder):
+        """Compare the watched guides with their runbooks and report how many drifted"""
+        drift = sys.modules['doc_drift']
+        built = {os.path.join(self.output_dir, builder.GENERATORS[name][2]) for name in self.names}
+        pairs = [pair for pair in drift.document_pairs(self.output_dir) if pair[1] in built]
+        try:
+            self.drifted = drift.check_drift(pairs, structure_only=self.check_drift == 'structure')
+        except Exception:
+            traceback.print_exc()
+            print(f'{time.strftime("%H:%M:%S")} drift check failed')
+            return
+        print(f'{time.strftime("%H:%M:%S")} {self.drifted} of {len(pairs)} guide(s) drifted '
+              'from their runbooks')
+
+    def _report(self, label, first, func, *args):
+        start = time.perf_counter()
+        try:
+            func(*args)
+        except Exception:
+            traceback.print_exc()
+            print(f'{time.strftime("%H:%M:%S")} {label}: build failed')
+            return
+        done = time.perf_counter()
+        print(f'{time.strftime("%H:%M:%S")} {label}: rebuilt in {done - start:.3f}s '
+              f'({done - first:.3f}s after the change)')
+
+def watch(names=None, sources=None, output_dir='.', cache_dir=None, backend='docx',
+          formats=('docx',), compression='default', runbook_dir=md_to_docx.DEFAULT_OUTPUT_DIR,
+          check_drift=None, drifted=0, directory=None):
+    """Rebuild affected outputs whenever a watched file changes, until interrupted
+
+    With check_drift, the guides are compared with their runbooks after
+    every rebuild; the result is 1 if they drifted at the last check.
+    """
+    names = list(names or build_docs.GENERATORS)
+    sources = list(md_to_docx.MARKDOWN_SOURCES if sources is None else sources)
+    directory = directory or os.path.dirname(os.path.abspath(__file__))
+    rebuilder = Rebuilder(names, sources, output_dir, cache_dir, backend, formats, compression,
+                          runbook_dir, check_drift, drifted)
+    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(runbook_dir, exist_ok=True)
+
+    watcher = open_watcher(directory, list(rebuilder.targets))
+    print(f'Watching {directory} with {type(watcher).__name__} (Ctrl-C to stop)')
+    try:
+        for first, changed in bursts(watcher):
+            if any(name in rebuilder.targets for name in changed):
+                rebuilder.rebuild(changed, first)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+    return 1 if rebuilder.drifted else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rebuild documents when their sources change')
+    parser.add_argument('documents', nargs='*', metavar='DOCUMENT',
+                        help=f"generated documents to watch: {', '.join(build_docs.GENERATORS)} "
+                             '(default: all)')
+    parser.add_argument('-o', '--output-dir', default='.',
+                        help='directory to write the generated documents to')
+    parser.add_argument('--runbook-dir', default=md_to_docx.DEFAULT_OUTPUT_DIR,
+                        help=f'directory for converted Markdown runbooks '
+                             f'(default: {md_to_docx.DEFAULT_OUTPUT_DIR})')
+    parser.add_argument('--cache-dir', default=build_docs.DEFAULT_CACHE_DIR,
+                        help=f'section cache directory (default: {build_docs.DEFAULT_CACHE_DIR})')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='render every section from scratch')
+    parser.add_argument('--backend', choices=build_docs.BACKENDS, default='docx',
+                        help='python-docx object tree or streaming writer')
+    parser.add_argument('--formats', default='docx',
+                        help='comma-separated output formats: docx, md, html (default: docx)')
+    parser.add_argument('--compression', choices=list(build_docs.COMPRESSION_PROFILES),
+                        default='default',
+                        help='per-part deflate levels for the generated documents '
+                             '(docx backend only; default: default)')
+    parser.add_argument('--check-drift', nargs='?', const='content', choices=('content', 'structure'),
+                        help='after each rebuild, compare each guide with the Markdown runbook of '
+                             'the same name, and exit 1 if they differed at the last check; '
+                             'structure ignores changes within sections (default: content)')
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.documents if name not in build_docs.GENERATORS]
+    if unknown:
+        parser.error(f"unknown document(s): {', '.join(unknown)}")
+    formats = tuple(fmt for fmt in args.formats.split(',') if fmt)
+    unknown = [fmt for fmt in formats if fmt not in build_docs.FORMATS]
+    if unknown or not formats:
+        parser.error(f"unknown format(s): {', '.join(unknown) or args.formats!r}")
+    if args.compression != 'default' and args.backend != 'docx':
+        parser.error('--compression requires the docx backend')
+    if args.check_drift and 'docx' not in formats:
+        parser.error('--check-drift compares the .docx outputs')
+    return watch(args.documents, None, args.output_dir,
+                 None if args.no_cache else args.cache_dir, args.backend, formats,
+                 args.compression, args.runbook_dir, args.check_drift)
+
+if __name__ == '__main__':
+    sys.exit(main())